@@ -0,0 +1,58 @@
+"""
+Microbenchmark for compiled codecs.
+
+Compares the dynamic `dump_value`/`parse_value` against `ValueCodec` on a large list of pydantic
+models, i.e. what a replay does with every recorded workflow result. Run it from `pylibs/chat`:
+
+    python -m benchmarks.bench_codec
+"""
+
+from timeit import timeit
+from typing import List
+from typing import Optional
+
+from pydantic import BaseModel
+
+from socratic.chat.utils.codec import get_codec
+from socratic.chat.utils.typing import dump_value
+from socratic.chat.utils.typing import parse_value
+
+
+class Item(BaseModel):
+    """A moderately nested item."""
+
+    name: str
+    score: float
+    tags: List[str]
+    parent: Optional[str] = None
+
+
+ITEM_COUNT = 1000
+REPEAT = 50
+
+ResultType = Optional[List[Item]]
+
+
+def main():
+    """Runs the benchmark and prints the results."""
+    value = [
+        Item(name=f"item-{i}", score=i / 7, tags=["a", "b"], parent=None if i % 2 else "root")
+        for i in range(ITEM_COUNT)
+    ]
+    dumped = dump_value(ResultType, value)
+    codec = get_codec(ResultType)
+
+    timings = {
+        "dump_value": timeit(lambda: dump_value(ResultType, value), number=REPEAT),
+        "codec.dump": timeit(lambda: codec.dump(value), number=REPEAT),
+        "parse_value": timeit(lambda: parse_value(ResultType, dumped), number=REPEAT),
+        "codec.parse": timeit(lambda: codec.parse(dumped), number=REPEAT),
+    }
+    for name, seconds in timings.items():
+        print(f"{name:12} {seconds / REPEAT * 1e3:8.3f} ms per call")
+    print(f"parse speedup: {timings['parse_value'] / timings['codec.parse']:.2f}x")
+    print(f"dump speedup: {timings['dump_value'] / timings['codec.dump']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Benchmarks the overhead of the framework itself, without any LLM call.
+
+It measures:
+
+- the cost of one `StepExecutor` step as the conversation grows, both replayed and kept alive,
+  on the prime counter and on synthetic models with nested chains or large pydantic results;
+- the overhead of a workflow call and of its parts;
+- the throughput of `ContinuousExecutor`.
+
+Results are printed as JSON. Given a baseline produced earlier, it exits with an error when any
+benchmark regresses beyond a tolerance. Run it from `pylibs/chat`:
+
+    python -m benchmarks.bench_framework --output current.json
+    python -m benchmarks.bench_framework --baseline current.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+from time import perf_counter
+from time import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import List
+from typing import Optional
+
+from pydantic import BaseModel
+
+from socratic.chat import ContinuousExecutor
+from socratic.chat import ConversationModel
+from socratic.chat import StepExecutor
+from socratic.chat import get_user_reply
+from socratic.chat import post_assistant_reply
+from socratic.chat.generation_scope import new_generation_scope
+from socratic.chat.generation_scope import reset_generation_scope
+from socratic.chat.generation_scope import with_new_call
+from socratic.chat.utils.typing import dump_value
+from tests.model_prime_counter import model as prime_counter
+
+nested = ConversationModel("bench-nested", lambda: None)
+
+FAN_OUT = 3
+
+
+@nested.chain
+async def leaf(x: int) -> int:
+    """Increments the input."""
+    return x + 1
+
+
+@nested.chain
+async def middle(x: int) -> int:
+    """Sums several leaves."""
+    return sum([await leaf(x + i) for i in range(FAN_OUT)])
+
+
+@nested.chain
+async def top(x: int) -> int:
+    """Sums several middles, i.e. 13 workflow calls in total."""
+    return sum([await middle(x + i) for i in range(FAN_OUT)])
+
+
+@nested.entry
+async def nested_entry() -> None:
+    """Replies with the result of nested chains for every user reply."""
+    await post_assistant_reply("Go.")
+    while True:
+        reply = await get_user_reply()
+        await post_assistant_reply(str(await top(len(reply))))
+
+
+large = ConversationModel("bench-large", lambda: None)
+
+REPORT_SIZE = 200
+
+
+class Finding(BaseModel):
+    """A finding within a report."""
+
+    title: str
+    score: float
+    tags: List[str]
+    note: Optional[str] = None
+
+
+class Report(BaseModel):
+    """A large structured result, like an evaluation."""
+
+    turn: int
+    findings: List[Finding]
+
+
+def make_findings(turn: int) -> Report:
+    """Builds a report without any framework involvement."""
+    findings = [
+        Finding(title=f"finding {turn}/{i}", score=i / 3, tags=["x", "y"], note=None)
+        for i in range(REPORT_SIZE)
+    ]
+    return Report(turn=turn, findings=findings)
+
+
+@large.chain
+async def make_report(turn: int) -> Report:
+    """Makes a large report."""
+    return make_findings(turn)
+
+
+@large.entry
+async def large_entry() -> None:
+    """Replies with a summary of a large report for every user reply."""
+    await post_assistant_reply("Go.")
+    turn = 0
+    while True:
+        await get_user_reply()
+        turn += 1
+        report = await make_report(turn)
+        await post_assistant_reply(f"{len(report.findings)} findings.")
+
+
+PRIME_COUNTER_REPLIES = ["2", "4", "7", "x"]
+
+
+def _reply(turn: int) -> str:
+    return PRIME_COUNTER_REPLIES[turn % len(PRIME_COUNTER_REPLIES)]
+
+
+async def _time_async(func: Callable[[], Awaitable[Any]], number: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            await func()
+        best = min(best, (perf_counter() - start) / number)
+    return best
+
+
+def _time_sync(func: Callable[[], Any], number: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (perf_counter() - start) / number)
+    return best
+
+
+def _result(name: str, seconds: float, **params: Any) -> dict[str, Any]:
+    return {"name": name, "params": params, "seconds_per_op": seconds}
+
+
+async def _record(model: ConversationModel, turns: int) -> StepExecutor:
+    executor = StepExecutor(model, [], [], {})
+    await executor.run()
+    for turn in range(turns):
+        executor.chat_history.append(_reply(turn))
+        await executor.run()
+    return executor
+
+
+async def bench_step_replay(
+    model: ConversationModel, lengths: list[int], repeat: int
+) -> list[dict[str, Any]]:
+    """Measures a replayed step, after the given numbers of turns."""
+    results = []
+    for length in lengths:
+        recorded = await _record(model, length)
+        chat_history = recorded.chat_history + [_reply(length)]
+
+        async def step():
+            executor = StepExecutor(
+                model, recorded.scope_ids, chat_history, recorded.workflow_results
+            )
+            await executor.run()
+
+        seconds = await _time_async(step, number=max(1, 200 // (length + 1)), repeat=repeat)
+        results.append(_result("step_replay", seconds, model=model.name, turns=length))
+    return results
+
+
+async def bench_step_keep_alive(
+    model: ConversationModel, turns: int, repeat: int
+) -> list[dict[str, Any]]:
+    """Measures a step resumed by a kept-alive executor."""
+    best = float("inf")
+    for _ in range(repeat):
+        executor = StepExecutor(model, [], [], {}, keep_alive=True)
+        await executor.run()
+        start = perf_counter()
+        for turn in range(turns):
+            executor.chat_history.append(_reply(turn))
+            await executor.run()
+        best = min(best, (perf_counter() - start) / turns)
+        executor.close()
+    return [_result("step_keep_alive", best, model=model.name, turns=turns)]
+
+
+async def bench_workflow_overhead(repeat: int) -> list[dict[str, Any]]:
+    """Measures a workflow call and its parts, outside of any executor."""
+    number = 10_000
+    check_prime = prime_counter.definitions[0].workflow_model
+    report = make_findings(0)
+    report_codec = large.definitions[0].workflow_model.codec
+
+    def enter_call():
+        with with_new_call():
+            pass
+
+    new_generation_scope()
+    try:
+        with_new_call_seconds = _time_sync(enter_call, number, repeat)
+    finally:
+        reset_generation_scope()
+
+    return [
+        _result("with_new_call", with_new_call_seconds),
+        _result(
+            "build_input_request",
+            _time_sync(lambda: check_prime.build_input_request((7,), {}), number, repeat),
+        ),
+        _result(
+            "dump_value",
+            _time_sync(lambda: dump_value(Report, report), number // 100, repeat),
+            type="Report",
+        ),
+        _result(
+            "codec_dump",
+            _time_sync(lambda: report_codec.dump(report), number // 100, repeat),
+            type="Report",
+        ),
+        _result("raw_call", await _time_async(lambda: check_prime.func(7), number, repeat)),
+        _result(
+            "workflow_call",
+            await _time_async(lambda: check_prime.async_call(7), number, repeat),
+        ),
+    ]
+
+
+async def bench_continuous_executor(turns: int, repeat: int) -> list[dict[str, Any]]:
+    """Measures the time per turn of a continuous conversation."""
+
+    async def converse():
+        replies = [_reply(turn) for turn in range(turns)] + ["End"]
+        async with ContinuousExecutor(prime_counter, {}) as executor:
+            async for _ in executor.assistant_messages():
+                if executor.has_ended:
+                    break
+                await executor.post_reply(replies.pop(0))
+
+    seconds = await _time_async(converse, number=1, repeat=repeat) / (turns + 1)
+    return [_result("continuous_turn", seconds, model=prime_counter.name, turns=turns)]
+
+
+async def run_all(quick: bool) -> list[dict[str, Any]]:
+    """Runs every benchmark."""
+    lengths = [1, 10, 50] if quick else [1, 10, 50, 100, 200]
+    repeat = 2 if quick else 5
+    results = []
+    for model in (prime_counter, nested, large):
+        results.extend(await bench_step_replay(model, lengths, repeat))
+        results.extend(await bench_step_keep_alive(model, max(lengths), repeat))
+    results.extend(await bench_workflow_overhead(repeat))
+    results.extend(await bench_continuous_executor(max(lengths), repeat))
+    return results
+
+
+def _key(result: dict[str, Any]) -> str:
+    return json.dumps([result["name"], result["params"]], sort_keys=True)
+
+
+def find_regressions(
+    results: list[dict[str, Any]], baseline: list[dict[str, Any]], tolerance: float
+) -> list[str]:
+    """Lists the benchmarks slower than the baseline by more than the tolerance."""
+    baseline_seconds = {_key(x): x["seconds_per_op"] for x in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_seconds.get(_key(result))
+        if previous is None or previous <= 0:
+            continue
+        ratio = result["seconds_per_op"] / previous
+        if ratio > 1 + tolerance:
+            regressions.append(f"{_key(result)}: {ratio:.2f}x slower")
+    return regressions
+
+
+def main():
+    """Runs the benchmarks and prints the results as JSON."""
+    parser = argparse.ArgumentParser(description="Framework overhead benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Use fewer turns and repeats.")
+    parser.add_argument("--output", help="Also write the results to this file.")
+    parser.add_argument("--baseline", help="Compare against results written earlier.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown ratio.")
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": time(),
+        "python": platform.python_version(),
+        "results": asyncio.run(run_all(args.quick)),
+    }
+    formatted = json.dumps(report, indent=2)
+    print(formatted)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(formatted)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = find_regressions(report["results"], baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
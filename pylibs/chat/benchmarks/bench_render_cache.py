@@ -0,0 +1,80 @@
+"""
+Microbenchmark for incremental JSON list serialization.
+
+Replays how dfs_v2 serializes its previous segments: the list grows by one segment at a time, and
+is serialized on every turn of the next segment. Like in replayed steps, every turn gets new copies
+of the segments. Compares `json.dumps` of the dumped models against `JSONListSerializer`, for one
+conversation, and for conversations interleaving their turns, which share the serializer like
+dfs_v2 does. Run it from `pylibs/chat`:
+
+    python -m benchmarks.bench_render_cache
+"""
+
+import json
+from timeit import timeit
+from typing import Callable
+from typing import List
+from typing import Sequence
+
+from pydantic import BaseModel
+
+from socratic.chat.utils.render_cache import JSONListSerializer
+
+
+class SegmentResult(BaseModel):
+    """A segment result, like those of dfs_v2."""
+
+    segment: str
+    summary: str
+    evidences: List[str]
+
+
+SEGMENTS = 8
+TURNS_PER_SEGMENT = 6
+CONVERSATIONS = 4
+REPEAT = 20
+
+
+def _segment(conversation: int, i: int) -> SegmentResult:
+    return SegmentResult(
+        segment=f"direction-{conversation}-{i}",
+        summary="The candidate explained their reasoning. " * 8,
+        evidences=[f"Evidence {j}. " * 6 for j in range(4)],
+    )
+
+
+def _dumps(items: Sequence[BaseModel]) -> str:
+    return json.dumps([x.model_dump() for x in items])
+
+
+def _turns(conversations: int) -> list[list[SegmentResult]]:
+    # Returns the lists serialized by every turn, in order, as new copies.
+    turns = []
+    for i in range(SEGMENTS):
+        for _ in range(TURNS_PER_SEGMENT):
+            for conversation in range(conversations):
+                turns.append([_segment(conversation, j) for j in range(i)])
+    return turns
+
+
+def _run(serialize: Callable[[Sequence[BaseModel]], str], turns: list[list[SegmentResult]]):
+    for segments in turns:
+        serialize(segments)
+
+
+def main():
+    """Runs the benchmark and prints the results."""
+    for conversations in [1, CONVERSATIONS]:
+        turns = _turns(conversations)
+        baseline = timeit(lambda: _run(_dumps, turns), number=REPEAT)
+        serializer = JSONListSerializer()
+        assert all(serializer(x) == _dumps(x) for x in turns)
+        incremental = timeit(lambda: _run(serializer, turns), number=REPEAT)
+        print(f"{conversations} conversation(s):")
+        print(f"  json.dumps           {baseline / REPEAT * 1e3:8.3f} ms per run")
+        print(f"  JSONListSerializer   {incremental / REPEAT * 1e3:8.3f} ms per run")
+        print(f"  speedup: {baseline / incremental:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from .continuous_executor import ContinuousExecutor
 from .conversation_model import ConversationModel
+from .generation_scope import gather
 from .interface import get_user_reply
 from .interface import post_assistant_reply
+from .step_executor import StepEvent
 from .step_executor import StepExecutor
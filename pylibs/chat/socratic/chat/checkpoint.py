@@ -0,0 +1,89 @@
+"""Provides checkpoint-related API."""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Any
+from typing import Callable
+from typing import Iterator
+
+from socratic.chat.utils.codec import get_codec
+from socratic.chat.utils.typing import get_return_type
+
+_enter_checkpoint_var = ContextVar[Callable[[], tuple[bool, Any]]](
+    "_enter_checkpoint", default=lambda: (False, None)
+)
+
+
+@contextmanager
+def with_enter_checkpoint(impl: Callable[[], tuple[bool, Any]]) -> Iterator[None]:
+    """
+    Temporarily injects a custom implementation called when entering a checkpoint.
+
+    The implementation returns whether the checkpoint has already completed, along with its
+    dumped result. When it has, the implementation is also responsible for fast-forwarding the
+    executor to where the checkpoint ended.
+
+    Args:
+        impl: The implementation to be injected.
+
+    Yields:
+        None
+    """
+
+    saved_token = _enter_checkpoint_var.set(impl)
+    try:
+        yield
+    finally:
+        _enter_checkpoint_var.reset(saved_token)
+
+
+_exit_checkpoint_var = ContextVar[Callable[[Any], None]](
+    "_exit_checkpoint", default=lambda _: None
+)
+
+
+@contextmanager
+def with_exit_checkpoint(impl: Callable[[Any], None]) -> Iterator[None]:
+    """
+    Temporarily injects a custom implementation called when a checkpoint completes.
+
+    Args:
+        impl: The implementation to be injected. It receives the dumped result.
+
+    Yields:
+        None
+    """
+
+    saved_token = _exit_checkpoint_var.set(impl)
+    try:
+        yield
+    finally:
+        _exit_checkpoint_var.reset(saved_token)
+
+
+def checkpoint(func):
+    """
+    A decorator for declaring a resumable boundary in a conversation model.
+
+    A checkpoint is an async function that may post and receive replies, like a minibot. Once it
+    returns, an executor may skip it entirely on later replays and reuse its recorded result.
+    Therefore, its return value must be JSON safe, and it must not communicate with the caller
+    through anything other than its return value (e.g. by mutating its arguments).
+    """
+
+    if not iscoroutinefunction(func):
+        raise ValueError("A checkpoint must be async.")
+    codec = get_codec(get_return_type(func))
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        fetched, result = _enter_checkpoint_var.get()()
+        if fetched:
+            return codec.parse(result)
+        result = await func(*args, **kwargs)
+        _exit_checkpoint_var.get()(codec.dump(result))
+        return result
+
+    return wrapper
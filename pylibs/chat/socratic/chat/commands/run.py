@@ -10,6 +10,8 @@ from langchain.schema import SystemMessage
 
 from ..continuous_executor import ContinuousExecutor
 from ..conversation_model import ConversationModel
+from ..utils.rate_limiter import Priority
+from ..utils.rate_limiter import with_llm_priority
 
 
 async def _run_model(model: ConversationModel, unknown_args: dict):
@@ -53,6 +55,8 @@ async def _autorun_model(model: ConversationModel, unknown_args: dict):
 
 def autorun_model(model: ConversationModel, unknown_args: dict):
     """
-    Runs the conversation model automatically.
+    Runs the conversation model automatically, yielding to interactive conversations when rate
+    limited.
     """
-    run(_autorun_model(model, unknown_args))
+    with with_llm_priority(Priority.BATCH):
+        run(_autorun_model(model, unknown_args))
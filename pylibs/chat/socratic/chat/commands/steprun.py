@@ -10,8 +10,10 @@ async def _steprun_model(model: ConversationModel):
     executor = StepExecutor(model, [], [], {})
 
     while True:
-        message = await executor.run()
-        print(f"Assistant: {message}")
+        print("Assistant: ", end="", flush=True)
+        async for chunk in executor.stream():
+            print(chunk, end="", flush=True)
+        print()
         if executor.has_ended:
             break
         user_reply = input("User: ")
@@ -3,6 +3,9 @@
 from asyncio import create_task
 from contextlib import ExitStack
 from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
 from typing import Optional
 
 from aiochannel import Channel
@@ -11,6 +14,7 @@ from aiochannel import ChannelClosed
 from .conversation_model import ConversationModel
 from .interface import with_get_user_reply
 from .interface import with_post_assistant_reply
+from .interface import with_stream_assistant_reply
 
 
 class ContinuousExecutor:
@@ -21,6 +25,9 @@ class ContinuousExecutor:
     its associated input to start a conversation. It asynchronously runs the model and provides
     the generated assistant messages through the  `assistant_messages` method. The context manager
     should be used to properly initiate and handle the conversation lifecycle.
+
+    Streamed assistant messages are still provided as a whole once complete. To receive their
+    chunks as they arrive, pass `on_assistant_chunk`.
     """
 
     _assistant_message_channel: Channel[str]
@@ -31,8 +38,14 @@ class ContinuousExecutor:
     _input: dict[str, Any]
     _has_ended = False
     _output: Optional[Any]
-
-    def __init__(self, model: ConversationModel, args: dict[str, Any]):
+    _on_assistant_chunk: Optional[Callable[[str], Awaitable[None]]]
+
+    def __init__(
+        self,
+        model: ConversationModel,
+        args: dict[str, Any],
+        on_assistant_chunk: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
         self._assistant_message_channel = Channel()
         self._user_message_channel = Channel()
         self._stack = ExitStack()
@@ -41,6 +54,7 @@ class ContinuousExecutor:
         self._input = args
 
         self._output = None
+        self._on_assistant_chunk = on_assistant_chunk
 
     async def __aenter__(self):
         async def get_user_reply() -> str:
@@ -49,8 +63,19 @@ class ContinuousExecutor:
         async def post_assistant_reply(message: str):
             await self._assistant_message_channel.put(message)
 
+        async def stream_assistant_reply(chunks: AsyncIterator[str]) -> str:
+            parts: list[str] = []
+            async for chunk in chunks:
+                parts.append(chunk)
+                if self._on_assistant_chunk is not None:
+                    await self._on_assistant_chunk(chunk)
+            message = "".join(parts)
+            await self._assistant_message_channel.put(message)
+            return message
+
         self._stack.enter_context(with_get_user_reply(get_user_reply))
         self._stack.enter_context(with_post_assistant_reply(post_assistant_reply))
+        self._stack.enter_context(with_stream_assistant_reply(stream_assistant_reply))
 
         async def task():
             result = await self._model.run(**self._input)
@@ -15,8 +15,11 @@ from typing import get_type_hints
 
 from pydantic import BaseModel
 
+from .checkpoint import checkpoint
+from .utils.model_routing import with_model_tier
 from .utils.typing import is_json_safe
 from .utils.typing import request_model_from_function
+from .workflow_cache import WorkflowCache
 from .workflow_model import WorkflowModel
 
 
@@ -91,27 +94,50 @@ class ConversationModel(Generic[ConfigT]):
         """Returns the current model config. Only use inside a conversation model."""
         return _model_config_var.get()
 
-    def chain(self, func):
+    def chain(
+        self, func=None, *, cache: Optional[WorkflowCache] = None, tier: Optional[str] = None
+    ):
         """
         A decorator for defining a chain.
+
+        Use it either bare, as @model.chain, or as @model.chain(cache=...) to share results of
+        identical calls across conversations. See `socratic.chat.workflow_cache` for when it is
+        safe to do so. Use @model.chain(tier=...) to route its LLM calls to another model tier,
+        see `socratic.chat.utils.model_routing`.
         """
 
-        workflow = WorkflowModel(func)
+        if func is None:
+            return lambda f: self.chain(f, cache=cache, tier=tier)
+
+        workflow = WorkflowModel(func, cache=cache)
         definition = ChainDefinition(workflow_model=workflow)
         self.definitions.append(definition)
 
         @wraps(func)
         def wrapper(*args, **kwargs):
-            return workflow.call(*args, **kwargs)
+            with with_model_tier(tier):
+                return workflow.call(*args, **kwargs)
 
         @wraps(func)
         async def awrapper(*args, **kwargs):
-            return await workflow.async_call(*args, **kwargs)
+            with with_model_tier(tier):
+                return await workflow.async_call(*args, **kwargs)
 
         if workflow.is_async:
             return awrapper
         return wrapper
 
+    def checkpoint(self, func):
+        """
+        A decorator for defining a checkpoint, i.e. a resumable boundary.
+
+        See `socratic.chat.checkpoint.checkpoint` for the requirements on the function.
+        """
+        if not iscoroutinefunction(func):
+            raise ChainDefinitionError("A checkpoint must be async.")
+        self._analyze_output(func, "checkpoint")
+        return checkpoint(func)
+
     def entry(self, func):
         """
         A decorator for defining the entry point.
@@ -9,6 +9,7 @@ from .commands.run import autorun_model
 from .commands.run import run_model
 from .commands.steprun import steprun_model
 from .conversation_model import ConversationModel
+from .event_sink import configure_event_logging_from_env
 
 
 def main(model: ConversationModel):
@@ -28,6 +29,7 @@ def main(model: ConversationModel):
     unknown_args = {k.lstrip("-"): v for k, v in unknown_args.items()}
 
     dotenv.load_dotenv()
+    configure_event_logging_from_env()
 
     if args.command == "docs":
         print_docs(model)
@@ -2,15 +2,21 @@
 Defines event logging API.
 """
 
+import json
+import os
+import zlib
 from datetime import UTC
 from datetime import datetime
 from enum import Enum
 from time import time
+from typing import Any
 from typing import Callable
 from typing import Optional
 from typing import TypeVar
 
 from pydantic import BaseModel
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
 
 
 class EventPhase(Enum):
@@ -29,6 +35,72 @@ class EventPhase(Enum):
         return self.value.upper()
 
 
+class PayloadPolicy(BaseModel):
+    """
+    Governs the lazy payloads of an event type, see `LazyPayload`.
+
+    Payloads are kept for a `sample_rate` fraction of events, chosen by id so that the start and
+    end events of an activity are sampled together. Payloads serialized to more than `max_bytes`
+    of JSON are replaced by a truncated prefix.
+    """
+
+    sample_rate: float = 1.0
+    max_bytes: Optional[int] = None
+
+
+class LazyPayload:
+    """
+    A heavyweight event field, e.g. a whole prompt, computed only when the event is serialized.
+
+    Handlers ignoring the field never pay for it. Payloads not sampled by the `PayloadPolicy` of
+    their event type are discarded when the event is logged, and serialize as None.
+    """
+
+    max_bytes: Optional[int]
+
+    _compute: Optional[Callable[[], Any]]
+    _value: Any
+
+    def __init__(self, compute: Optional[Callable[[], Any]] = None, value: Any = None):
+        self.max_bytes = None
+        self._compute = compute
+        self._value = value
+
+    @property
+    def value(self) -> Any:
+        """Computes the payload once, capped to `max_bytes`."""
+        if self._compute is not None:
+            value = self._compute()
+            self._compute = None
+            if self.max_bytes is not None:
+                dumped = json.dumps(value, default=str)
+                if len(dumped) > self.max_bytes:
+                    prefix = dumped[: self.max_bytes]
+                    value = {"truncated": True, "size": len(dumped), "prefix": prefix}
+            self._value = value
+        return self._value
+
+    def discard(self):
+        """Drops the payload without computing it."""
+        self._compute = None
+        self._value = None
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, LazyPayload) and self.value == other.value
+
+    def __repr__(self) -> str:
+        return "LazyPayload(...)" if self._compute is not None else f"LazyPayload({self._value!r})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, _source_type: Any, _handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            lambda value: value if isinstance(value, LazyPayload) else cls(value=value),
+            serialization=core_schema.plain_serializer_function_ser_schema(lambda x: x.value),
+        )
+
+
 class Event(BaseModel):
     """
     Represents a particular event.
@@ -63,11 +135,11 @@ class Event(BaseModel):
         scoped_id = f"{self.scope}/{self.id}" if self.scope else self.id
         formatted_event = " ".join([f"[{iso_timestamp}]", str(self.phase), scoped_id, self.type])
 
-        # Other attributes, excluding the ones already included.
+        # Other attributes, excluding the ones already included. Ignored fields are never
+        # dumped, so that their lazy payloads are not computed.
         other_attrs = " ".join(
             f"{key}={value}"
-            for key, value in self.model_dump().items()
-            if key not in self.ignored_fields_for_str()
+            for key, value in self.model_dump(exclude=set(self.ignored_fields_for_str())).items()
         )
 
         return f"{formatted_event}: {other_attrs}"
@@ -135,6 +207,41 @@ def parse_event_model(data: dict) -> Event:
     return event_model_cls.model_validate(data)
 
 
+_payload_policies: Optional[dict[str, PayloadPolicy]] = None
+
+
+def _get_payload_policies() -> dict[str, PayloadPolicy]:
+    global _payload_policies  # pylint: disable=global-statement
+    if _payload_policies is None:
+        # A JSON object mapping event types to payload policies.
+        config = json.loads(os.getenv("SOCRATIC_EVENT_PAYLOADS", "{}"))
+        _payload_policies = {k: PayloadPolicy.model_validate(v) for k, v in config.items()}
+    return _payload_policies
+
+
+def set_payload_policy(type_key: str, policy: PayloadPolicy):
+    """
+    Sets the payload policy of an event type, overriding SOCRATIC_EVENT_PAYLOADS, a JSON object
+    mapping event types to policies, e.g. '{"chatgpt_call_start": {"sample_rate": 0.1}}'.
+    """
+    _get_payload_policies()[type_key] = policy
+
+
+def _apply_payload_policy(event: Event):
+    policy = _get_payload_policies().get(event.type)
+    if policy is None:
+        return
+    sampled = zlib.crc32(event.id.encode("utf-8")) < policy.sample_rate * 2**32
+    for name in type(event).model_fields:
+        payload = getattr(event, name)
+        if not isinstance(payload, LazyPayload):
+            continue
+        if sampled:
+            payload.max_bytes = policy.max_bytes
+        else:
+            payload.discard()
+
+
 def _fill_event_metadata(event: Event):
     event.type = _event_model_reverse_registry[event.__class__]
     if event.timestamp == -1:
@@ -143,6 +250,7 @@ def _fill_event_metadata(event: Event):
     preferred_phase = _event_model_phases.get(event.type)
     if preferred_phase is not None:
         event.phase = preferred_phase
+    _apply_payload_policy(event)
 
 
 EventLoggingHandler = Callable[[Event], None]
@@ -159,6 +267,7 @@ def set_event_logging_handler(handler: EventLoggingHandler):
     """
     Sets a new event logging handler.
     """
+    global _current_event_logging_handler  # pylint: disable=global-statement
     _current_event_logging_handler = handler
 
 
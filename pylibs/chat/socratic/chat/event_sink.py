@@ -0,0 +1,311 @@
+"""
+Provides batched event logging in the background, to rotating JSONL or SQLite files.
+
+The default handler prints every event as it is logged, in the middle of LLM calls. A
+`BatchedEventLogger` only enqueues events instead: a background thread formats and writes them in
+batches, off the event loop. The queue is bounded, and once full, events are dropped or the caller
+waits, depending on the policy. Dropped events are counted.
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import sys
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Thread
+from time import monotonic
+from typing import Any
+from typing import Literal
+from typing import Optional
+from typing import TextIO
+from typing import cast
+
+from .event_logging import Event
+from .event_logging import set_event_logging_handler
+
+DropPolicy = Literal["drop_newest", "drop_oldest", "block"]
+
+
+class EventSink:
+    """Writes batches of events. Only called from the writer thread."""
+
+    def write(self, events: list[Event]):
+        """Writes a batch of events."""
+        raise NotImplementedError
+
+    def close(self):
+        """Releases resources."""
+
+
+class StreamEventSink(EventSink):
+    """Writes events as formatted lines, like the default handler."""
+
+    stream: TextIO
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stdout
+
+    def write(self, events: list[Event]):
+        self.stream.write("".join(f"{event}\n" for event in events))
+        self.stream.flush()
+
+
+def _rotate(path: Path, backup_count: int):
+    # Shifts path.1 to path.2 and so on, and path to path.1, dropping the oldest.
+    for i in range(backup_count - 1, 0, -1):
+        source = path.with_name(f"{path.name}.{i}")
+        if source.exists():
+            source.replace(path.with_name(f"{path.name}.{i + 1}"))
+    if backup_count > 0:
+        path.replace(path.with_name(f"{path.name}.1"))
+    else:
+        path.unlink()
+
+
+class JSONLEventSink(EventSink):
+    """
+    Appends events as JSON lines to a file, rotated once it exceeds `max_bytes`, keeping
+    `backup_count` previous files.
+    """
+
+    path: Path
+    max_bytes: int
+    backup_count: int
+
+    _file: TextIO
+
+    def __init__(self, path: str, max_bytes: int = 64 << 20, backup_count: int = 5):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def write(self, events: list[Event]):
+        self._file.write("".join(f"{event.model_dump_json()}\n" for event in events))
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._file.close()
+            _rotate(self.path, self.backup_count)
+            self._file = self.path.open("a", encoding="utf-8")
+
+    def close(self):
+        self._file.close()
+
+
+class SQLiteEventSink(EventSink):
+    """
+    Inserts events into a SQLite file, with their metadata in columns and the whole event as
+    JSON. The file is rotated once it exceeds `max_bytes`, keeping `backup_count` previous files.
+    """
+
+    path: Path
+    max_bytes: int
+    backup_count: int
+
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str, max_bytes: int = 256 << 20, backup_count: int = 5):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._connection = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Created by the caller, then only used by the writer thread.
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS events "
+            "(id TEXT, type TEXT, scope TEXT, timestamp REAL, phase TEXT, data TEXT)"
+        )
+        return connection
+
+    def write(self, events: list[Event]):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (x.id, x.type, x.scope, x.timestamp, x.phase.value, x.model_dump_json())
+                    for x in events
+                ],
+            )
+        if self.path.stat().st_size >= self.max_bytes:
+            self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._connection.close()
+            _rotate(self.path, self.backup_count)
+            self._connection = self._connect()
+
+    def close(self):
+        self._connection.close()
+
+
+@dataclass
+class EventLoggerStats:
+    """Counts events through a `BatchedEventLogger`."""
+
+    enqueued: int = 0
+    written: int = 0
+    dropped: int = 0
+    batches: int = 0
+    write_errors: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        """Returns the counts."""
+        return asdict(self)
+
+
+_STOP = object()
+
+
+class BatchedEventLogger:
+    """
+    An event logging handler enqueuing events, for a background thread writing them to a sink.
+
+    The thread writes up to `batch_size` events at once, waiting up to `flush_interval` seconds
+    for a batch to fill. When `max_queue` events are pending, "drop_newest" drops the event being
+    logged, "drop_oldest" drops the oldest pending one, and "block" makes the caller wait up to
+    `block_timeout` seconds for room before dropping it. Events must not be modified once logged.
+
+    Events are logged synchronously, so "block" stalls the calling thread, i.e. the event loop and
+    every conversation on it, for up to `block_timeout` seconds per event. Only use it for offline
+    runs, where losing events is worse than slowing down.
+    """
+
+    sink: EventSink
+    batch_size: int
+    flush_interval: float
+    policy: DropPolicy
+    block_timeout: float
+    stats: EventLoggerStats
+
+    _queue: queue.Queue
+    _thread: Thread
+
+    def __init__(
+        self,
+        sink: EventSink,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        policy: DropPolicy = "drop_newest",
+        block_timeout: float = 0.1,
+    ):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.stats = EventLoggerStats()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = Thread(target=self._run, name="event-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __call__(self, event: Event):
+        try:
+            if self.policy == "block":
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            if self.policy != "drop_oldest" or not self._replace_oldest(event):
+                self.stats.dropped += 1
+                return
+        self.stats.enqueued += 1
+
+    def _replace_oldest(self, event: Event) -> bool:
+        try:
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self.stats.dropped += 1
+            self._queue.put_nowait(event)
+        except (queue.Empty, queue.Full):
+            return False
+        return True
+
+    def flush(self):
+        """Waits until every event enqueued so far is written."""
+        self._queue.join()
+
+    def close(self):
+        """Writes pending events, then stops the thread and closes the sink."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.sink.close()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = monotonic() + self.flush_interval
+            while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - monotonic())))
+                except queue.Empty:
+                    break
+            events = [x for x in batch if x is not _STOP]
+            if events:
+                self._write(events)
+            for _ in batch:
+                self._queue.task_done()
+            if len(events) < len(batch):
+                return
+
+    def _write(self, events: list[Event]):
+        try:
+            self.sink.write(events)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            self.stats.write_errors += 1
+            self.stats.dropped += len(events)
+            print(f"Failed to write {len(events)} events: {exc}", file=sys.stderr)
+            return
+        self.stats.written += len(events)
+        self.stats.batches += 1
+
+
+def _sink_from_url(url: str) -> EventSink:
+    max_bytes = os.getenv("SOCRATIC_EVENT_LOG_MAX_BYTES")
+    backup_count = int(os.getenv("SOCRATIC_EVENT_LOG_BACKUPS", "5"))
+    kwargs: dict[str, Any] = {"backup_count": backup_count}
+    if max_bytes is not None:
+        kwargs["max_bytes"] = int(max_bytes)
+    if url == "stdout":
+        return StreamEventSink()
+    if url.startswith("jsonl:///"):
+        return JSONLEventSink(url.removeprefix("jsonl://"), **kwargs)
+    if url.startswith("sqlite:///"):
+        return SQLiteEventSink(url.removeprefix("sqlite://"), **kwargs)
+    raise ValueError(f"Unknown event log {url}.")
+
+
+def configure_event_logging_from_env() -> Optional[BatchedEventLogger]:
+    """
+    Installs a `BatchedEventLogger` configured by the environment, and returns it. Events keep
+    being printed as they are logged if SOCRATIC_EVENT_LOG is unset. Configured by:
+
+    - SOCRATIC_EVENT_LOG, "stdout", "jsonl:///path/to/events.jsonl" or
+      "sqlite:///path/to/events.db";
+    - SOCRATIC_EVENT_LOG_MAX_BYTES and SOCRATIC_EVENT_LOG_BACKUPS, the size of files before
+      rotation and the number of previous files kept;
+    - SOCRATIC_EVENT_LOG_QUEUE, the maximum number of pending events;
+    - SOCRATIC_EVENT_LOG_POLICY, "drop_newest", "drop_oldest" or "block", once the queue is full.
+      "block" stalls the event loop while waiting, see `BatchedEventLogger`.
+    """
+    url = os.getenv("SOCRATIC_EVENT_LOG")
+    if not url:
+        return None
+    policy = os.getenv("SOCRATIC_EVENT_LOG_POLICY", "drop_newest")
+    if policy not in ("drop_newest", "drop_oldest", "block"):
+        raise ValueError(f"Unknown event log policy {policy}.")
+    logger = BatchedEventLogger(
+        _sink_from_url(url),
+        max_queue=int(os.getenv("SOCRATIC_EVENT_LOG_QUEUE", "10000")),
+        policy=cast(DropPolicy, policy),
+    )
+    set_event_logging_handler(logger)
+    return logger
@@ -1,7 +1,10 @@
 """Provides generation scope related API."""
 
+import asyncio
 from contextlib import contextmanager
 from contextvars import ContextVar
+from typing import Any
+from typing import Awaitable
 from typing import Iterator
 from typing import Optional
 from uuid import UUID
@@ -28,6 +31,11 @@ class GenerationScope:
         componenets = [str(self.scope_id)] + [str(x) for x in self.call_stack]
         return "/".join(componenets)
 
+    @property
+    def current_call_path(self) -> tuple[int, ...]:
+        """Returns the current call path, i.e. the call id within this scope."""
+        return tuple(self.call_stack)
+
     def push_call(self):
         """Enters a new call."""
         self.call_stack.append(self.next_counter)
@@ -38,16 +46,33 @@ class GenerationScope:
         current_counter = self.call_stack.pop()
         self.next_counter = current_counter + 1
 
+    def fork(self, branch: int) -> "GenerationScope":
+        """
+        Creates a child scope for a concurrent branch of the current call.
+
+        The child shares the scope id, and its calls are nested under the current call and the
+        branch index. Hence, call ids do not depend on how concurrent branches interleave.
+        """
+        child = GenerationScope(self.scope_id)
+        child.call_stack = self.call_stack + [branch]
+        return child
+
 
 _generation_scope_var = ContextVar[Optional[GenerationScope]]("_generation_scope", default=None)
 
 
-def new_generation_scope(scope_id: Optional[UUID] = None):
+def new_generation_scope(scope_id: Optional[UUID] = None) -> GenerationScope:
     """Creates a new generation scope."""
     if scope_id is None:
         scope_id = uuid4()
     scope = GenerationScope(scope_id)
     _generation_scope_var.set(scope)
+    return scope
+
+
+def current_generation_scope() -> Optional[GenerationScope]:
+    """Returns the current generation scope, if any."""
+    return _generation_scope_var.get()
 
 
 def reset_generation_scope():
@@ -78,6 +103,31 @@ def pop_call():
     scope.pop_call()
 
 
+async def _run_in_scope(scope: Optional[GenerationScope], awaitable: Awaitable[Any]) -> Any:
+    # Runs in its own task, so setting the variable does not leak into other branches.
+    _generation_scope_var.set(scope)
+    return await awaitable
+
+
+async def gather(*awaitables: Awaitable[Any]) -> list[Any]:
+    """
+    Runs workflows concurrently, like `asyncio.gather`, while keeping call ids deterministic.
+
+    The gather itself takes up one call in the current scope. Each branch then runs in its own
+    child scope, so replays find the same ids no matter how the branches interleave. Branches
+    must only call workflows; they cannot post or receive replies.
+    """
+    scope = _generation_scope_var.get()
+    if scope is None:
+        return list(await asyncio.gather(*awaitables))
+
+    with with_new_call():
+        branches = [
+            _run_in_scope(scope.fork(i), awaitable) for i, awaitable in enumerate(awaitables)
+        ]
+        return list(await asyncio.gather(*branches))
+
+
 @contextmanager
 def with_new_call() -> Iterator[None]:
     """Enters a new call and returns automatically."""
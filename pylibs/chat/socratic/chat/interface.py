@@ -2,6 +2,7 @@
 
 from contextlib import contextmanager
 from contextvars import ContextVar
+from typing import AsyncIterator
 from typing import Awaitable
 from typing import Callable
 from typing import Iterator
@@ -60,12 +61,60 @@ def with_post_assistant_reply(impl: Callable[[str], Awaitable[None]]) -> Iterato
         _post_assistant_reply_var.reset(saved_token)
 
 
-async def post_assistant_reply(message: str):
+_stream_assistant_reply_var = ContextVar[Callable[[AsyncIterator[str]], Awaitable[str]]](
+    "_stream_assistant_reply"
+)
+
+
+@contextmanager
+def with_stream_assistant_reply(
+    impl: Callable[[AsyncIterator[str]], Awaitable[str]]
+) -> Iterator[None]:
+    """
+    Temporarily injects a custom implementation for posting an assistant reply in chunks.
+
+    The implementation consumes the chunks, forwarding them as they arrive, and returns the whole
+    reply. It may also skip consuming them, e.g. when replaying a reply posted earlier.
+
+    Args:
+        impl: The implementation to be injected.
+
+    Yields:
+        None
+    """
+    saved_token = _stream_assistant_reply_var.set(impl)
+    try:
+        yield
+    finally:
+        _stream_assistant_reply_var.reset(saved_token)
+
+
+async def post_assistant_reply(message: str | AsyncIterator[str]) -> str:
     """
     Post the next assistant reply.
 
+    The reply may be streamed as an async iterator of chunks, e.g. from
+    `SocraticChatModel.stream_string`. Executors forward the chunks to clients as they arrive.
+    When replaying, the recorded reply is returned instead and the chunks are never consumed,
+    so the iterator must not start any work before it is iterated, as with async generators.
+
     Args:
-        message: The assistant reply.
+        message: The assistant reply, or its chunks.
+
+    Returns:
+        The whole assistant reply.
     """
+    if isinstance(message, str):
+        impl = _post_assistant_reply_var.get()
+        await impl(message)
+        return message
+
+    stream_impl = _stream_assistant_reply_var.get(None)
+    if stream_impl is not None:
+        return await stream_impl(message)
+
+    # Without streaming support, the reply is posted once complete.
+    whole_message = "".join([chunk async for chunk in message])
     impl = _post_assistant_reply_var.get()
-    await impl(message)
+    await impl(whole_message)
+    return whole_message
@@ -1,9 +1,19 @@
 """Provide common utilites used for conversation."""
 
+from dataclasses import dataclass
 from typing import List
+from typing import Optional
+from uuid import uuid4
 
 from pydantic import BaseModel
 
+from .event_logging import Event
+from .event_logging import event_model
+from .event_logging import log_event
+from .utils.tokens import DEFAULT_MODEL
+from .utils.tokens import count_tokens
+from .utils.tokens import truncate_tokens
+
 
 class Message(BaseModel):
     """Represents a message in the conversation."""
@@ -12,20 +22,134 @@ class Message(BaseModel):
     message: str
 
 
+@event_model("history_rendered")
+class HistoryRenderedEvent(Event):
+    """
+    An event to track the size of a history rendered within a token budget. Sizes only cover the
+    history, not the rest of the prompt it is rendered into.
+    """
+
+    history_tokens: int
+    history_budget: int
+    verbatim_messages: int
+    clipped_messages: int
+    elided_messages: int
+
+
+@dataclass
+class RenderedHistory:
+    """A rendered history, with how much of it was kept."""
+
+    text: str
+    tokens: int
+    verbatim_messages: int
+    clipped_messages: int
+    elided_messages: int
+
+
 class MessageFormatter:
-    """Format conversation messages."""
+    """
+    Format conversation messages.
+
+    Given a token budget, recent messages are kept verbatim, and older ones are clipped to their
+    first `clipped_message_tokens` tokens, or elided once even that does not fit. The most recent
+    message is always kept, clipped to the budget if it alone exceeds it.
+    """
 
     human_name: str
     assistant_name: str
+    clipped_message_tokens: int
+    model: str
 
-    def __init__(self, human_name: str, assistant_name: str) -> None:
+    def __init__(
+        self,
+        human_name: str,
+        assistant_name: str,
+        clipped_message_tokens: int = 40,
+        model: str = DEFAULT_MODEL,
+    ) -> None:
         self.human_name = human_name
         self.assistant_name = assistant_name
+        self.clipped_message_tokens = clipped_message_tokens
+        self.model = model
+
+    def __call__(self, messages: List[Message], max_tokens: Optional[int] = None) -> str:
+        """Turn a list of messages into string, within `max_tokens` if given."""
+        if max_tokens is None:
+            return "".join(self._format(message) for message in messages)
+        return self.render(messages, max_tokens).text
+
+    def render(self, messages: List[Message], max_tokens: int) -> RenderedHistory:
+        """Turn a list of messages into string within the given budget, and log its size."""
+        lines = [self._format(message) for message in messages]
+        counts = [count_tokens(line, self.model) for line in lines]
+        if sum(counts) <= max_tokens:
+            rendered = RenderedHistory("".join(lines), sum(counts), len(lines), 0, 0)
+            self._log(rendered, max_tokens)
+            return rendered
+
+        # Walk back from the most recent message: keep messages verbatim while they fit, then clip
+        # them while they fit, always leaving room for the marker of the messages before them.
+        kept: List[str] = []
+        tokens = 0
+        verbatim = 0
+        clipped = 0
+        for i in range(len(lines) - 1, -1, -1):
+            remaining = max_tokens - tokens
+            if i > 0:
+                remaining -= count_tokens(self._elision_marker(i), self.model)
+            if clipped == 0 and counts[i] <= remaining:
+                kept.append(lines[i])
+                tokens += counts[i]
+                verbatim += 1
+                continue
+            # The most recent message is always kept, clipped to whatever is left.
+            if kept:
+                line = self._clip(messages[i], min(self.clipped_message_tokens, remaining))
+            else:
+                line = self._clip(messages[i], max(1, remaining))
+            line_tokens = count_tokens(line, self.model)
+            if kept and line_tokens > remaining:
+                break
+            kept.append(line)
+            tokens += line_tokens
+            clipped += 1
+
+        elided = len(lines) - len(kept)
+        if elided > 0:
+            kept.append(self._elision_marker(elided))
+        text = "".join(reversed(kept))
+        rendered = RenderedHistory(text, count_tokens(text, self.model), verbatim, clipped, elided)
+        self._log(rendered, max_tokens)
+        return rendered
+
+    def _format(self, message: Message) -> str:
+        role = self.assistant_name if message.is_assistant else self.human_name
+        return f"{role}: {message.message}\n"
+
+    def _clip(self, message: Message, max_tokens: int) -> str:
+        role = self.assistant_name if message.is_assistant else self.human_name
+        prefix = f"{role}: "
+        suffix = "...\n"
+        content_tokens = (
+            max_tokens - count_tokens(prefix, self.model) - count_tokens(suffix, self.model)
+        )
+        content = truncate_tokens(message.message, max(1, content_tokens), self.model)
+        return f"{prefix}{content.rstrip()}{suffix}"
+
+    def _elision_marker(self, count: int) -> str:
+        if count == 1:
+            return "(1 earlier message omitted)\n"
+        return f"({count} earlier messages omitted)\n"
 
-    def __call__(self, messages: List[Message]) -> str:
-        """Turn a list of messages into string."""
-        formatted_messages = []
-        for message in messages:
-            role = self.assistant_name if message.is_assistant else self.human_name
-            formatted_messages.append(f"{role}: {message.message}\n")
-        return "".join(formatted_messages)
+    def _log(self, rendered: RenderedHistory, max_tokens: int):
+        log_event(
+            HistoryRenderedEvent(
+                id=str(uuid4()),
+                history_tokens=rendered.tokens,
+                history_budget=max_tokens,
+                verbatim_messages=rendered.verbatim_messages,
+                clipped_messages=rendered.clipped_messages,
+                elided_messages=rendered.elided_messages,
+            )
+        )
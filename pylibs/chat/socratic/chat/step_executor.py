@@ -1,86 +1,316 @@
 """Provides StepExecutor."""
 
+from asyncio import Future
+from asyncio import Queue
+from asyncio import Task
+from asyncio import create_task
+from asyncio import get_running_loop
 from contextlib import ExitStack
-import traceback
+from dataclasses import dataclass
 from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Literal
+from typing import Optional
 from uuid import UUID
 from uuid import uuid4
 
+from pydantic import BaseModel
+from pydantic import ValidationError
+
+from socratic.chat.checkpoint import with_enter_checkpoint
+from socratic.chat.checkpoint import with_exit_checkpoint
 from socratic.chat.conversation_model import ConversationModel
-from socratic.chat.generation_scope import current_call_id
+from socratic.chat.event_logging import Event
+from socratic.chat.event_logging import event_model
+from socratic.chat.event_logging import log_event
+from socratic.chat.generation_scope import GenerationScope
+from socratic.chat.generation_scope import current_generation_scope
 from socratic.chat.generation_scope import new_generation_scope
 from socratic.chat.generation_scope import reset_generation_scope
 from socratic.chat.interface import with_get_user_reply
 from socratic.chat.interface import with_post_assistant_reply
+from socratic.chat.interface import with_stream_assistant_reply
 from socratic.chat.workflow_model import with_get_workflow_cache
 from socratic.chat.workflow_model import with_on_workflow_done
+from socratic.chat.workflow_results import CallPath
+from socratic.chat.workflow_results import DumpedWorkflowResults
+from socratic.chat.workflow_results import WorkflowResults
 
 
 class StepCompleteError(Exception):
     """An error to denote that the current step has completed."""
 
 
+class CheckpointRecord(BaseModel):
+    """
+    Records a completed checkpoint, so that later replays can skip it.
+
+    Besides the result, it captures where the checkpoint ended: the index of the generation scope
+    and the state of its call stack. Replays restore this state to keep call ids stable.
+    """
+
+    result: Any
+    turn: int
+    call_stack: list[int]
+    next_counter: int
+
+
+def checkpoint_path(call_path: CallPath, ordinal: int) -> CallPath:
+    """
+    Returns the key of a checkpoint record, given the path of the next call when the checkpoint is
+    entered, and the number of checkpoints entered before it at that same path.
+
+    Keys end with a negative index, which call paths never contain. Hence, records never collide
+    with workflow results, and entering a checkpoint does not shift call ids, so recordings made
+    before a checkpoint was declared still replay.
+    """
+    return (*call_path, -1 - ordinal)
+
+
+@event_model("checkpoint_record_ignored")
+class CheckpointRecordIgnoredEvent(Event):
+    """
+    An event to track an invalid checkpoint record, e.g. from an older version. The checkpoint
+    body runs again, and its record is replaced.
+    """
+
+    call_id: str
+    error: str
+
+
+@dataclass
+class StepEvent:
+    """
+    Reports progress within a step.
+
+    A "workflow_done" event carries the name of a workflow which just ran, excluding replayed ones.
+    A "chunk" event carries a chunk of the new assistant reply.
+    """
+
+    kind: Literal["workflow_done", "chunk"]
+    data: str
+
+
 class StepExecutor:
     """
     Manages one step execution of a conversation model.
+
+    By default, every step replays the conversation from the beginning. With `keep_alive`, the
+    executor instead keeps the conversation running in a background task between steps.
     """
 
     model: ConversationModel
     scope_ids: list[UUID]
     next_scope_id: UUID
     chat_history: list[str] = []
-    workflow_results: dict[str, Any] = {}
+    workflow_results: WorkflowResults
+    new_workflow_results: WorkflowResults
 
+    keep_alive: bool
     has_ended = False
 
+    _task: Optional[Task[None]]
+    _step_done: Optional[Future[None]]
+    _resume: Optional[Future[None]]
+    _on_step_event: Optional[Callable[[StepEvent], None]]
+
     def __init__(
         self,
         model: ConversationModel,
         scope_ids: list[UUID],
         chat_history: list[str],
-        workflow_results: dict[str, Any],
+        workflow_results: WorkflowResults | DumpedWorkflowResults,
+        keep_alive: bool = False,
     ):
         self.model = model
+        self.keep_alive = keep_alive
         self.scope_ids = scope_ids.copy()
         self.chat_history = chat_history.copy()
-        self.workflow_results = workflow_results.copy()
+        if isinstance(workflow_results, WorkflowResults):
+            self.workflow_results = workflow_results.copy()
+        else:
+            self.workflow_results = WorkflowResults(workflow_results)
+        self.new_workflow_results = WorkflowResults()
         self.next_scope_id = uuid4()
 
         self._output = None
+        self._task = None
+        self._step_done = None
+        self._resume = None
+        self._on_step_event = None
 
     async def run(self, *args, **kwargs) -> str:
         """
         Runs the conversation for one step.
-        """
-        i = 0
 
+        With `keep_alive`, the conversation is parked on the next user reply instead of being
+        discarded. After the caller appends the user reply to `chat_history`, the next call
+        resumes it directly without any replay. Arguments are only used by the first call.
+        """
+        self.new_workflow_results = WorkflowResults()
         self.scope_ids.append(self.next_scope_id)
         self.next_scope_id = uuid4()
 
+        if not self.keep_alive:
+            await self._execute(args, kwargs)
+            return self.chat_history[-1]
+
+        self._step_done = get_running_loop().create_future()
+        if self._task is None:
+            self._task = create_task(self._execute_alive(args, kwargs))
+        else:
+            assert self.is_parked and len(self.chat_history) % 2 == 0
+            assert self._resume is not None
+            self._resume.set_result(None)
+        await self._step_done
+        return self.chat_history[-1]
+
+    async def stream(self, *args, **kwargs) -> AsyncIterator[str]:
+        """
+        Runs the conversation for one step like `run`, yielding the new assistant reply in chunks.
+
+        Replies posted as a whole are yielded as a single chunk. Once the iteration completes, the
+        whole reply is available as the last message of `chat_history`.
+        """
+        async for event in self.stream_events(*args, **kwargs):
+            if event.kind == "chunk":
+                yield event.data
+
+    async def stream_events(self, *args, **kwargs) -> AsyncIterator[StepEvent]:
+        """
+        Runs the conversation for one step like `stream`, also yielding workflow progress.
+        """
+        events = Queue[Optional[StepEvent]]()
+        self._on_step_event = events.put_nowait
+        step = create_task(self.run(*args, **kwargs))
+        step.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            await step
+        finally:
+            self._on_step_event = None
+            step.cancel()
+
+    @property
+    def is_parked(self) -> bool:
+        """
+        Indicates if a kept-alive conversation is parked, waiting for the next user reply.
+        """
+        return self._task is not None and not self._task.done()
+
+    def close(self):
+        """
+        Discards a parked conversation. Its recorded results remain valid for replays.
+        """
+        if self.is_parked:
+            assert self._task is not None
+            self._task.cancel()
+
+    async def _park(self):
+        assert self._step_done is not None
+        self._resume = get_running_loop().create_future()
+        self._step_done.set_result(None)
+        await self._resume
+
+    async def _execute_alive(self, args: tuple[Any, ...], kwargs: dict[str, Any]):
+        try:
+            await self._execute(args, kwargs)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            assert self._step_done is not None
+            self._step_done.set_exception(exc)
+            return
+        assert self._step_done is not None
+        self._step_done.set_result(None)
+
+    async def _execute(self, args: tuple[Any, ...], kwargs: dict[str, Any]):
+        i = 0
+
         recording = len(self.chat_history) == 0
         new_generation_scope(self.scope_ids[i])
+        checkpoint_keys: list[tuple[UUID, CallPath]] = []
+        checkpoint_ordinals: dict[tuple[UUID, CallPath], int] = {}
+
+        def emit(kind: Literal["workflow_done", "chunk"], data: str):
+            if self._on_step_event is not None:
+                self._on_step_event(StepEvent(kind, data))
+
+        def current_scope() -> GenerationScope:
+            scope = current_generation_scope()
+            assert scope is not None
+            return scope
+
+        def record(scope_id: UUID, path: CallPath, result: Any):
+            self.workflow_results.set(scope_id, path, result)
+            self.new_workflow_results.set(scope_id, path, result)
 
         def get_workflow_cache() -> tuple[bool, Any]:
             if recording:
                 return False, None
-            try:
-                result = self.workflow_results[current_call_id()]
-                return True, result
-            except KeyError as e:
-                print(f"Failed to get workflow cache entry, key={current_call_id()}")
-                traceback.print_exc()
-                return False, None
+            scope = current_scope()
+            fetched, result = self.workflow_results.get(scope.scope_id, scope.current_call_path)
+            if not fetched:
+                print(f"Failed to get workflow cache entry, key={scope.current_call_id}")
+            return fetched, result
 
-        def on_workflow_done(_workflow, _input, result: Any):
+        def on_workflow_done(workflow, _input, result: Any):
             if not recording:
                 return
-            self.workflow_results[current_call_id()] = result
+            scope = current_scope()
+            record(scope.scope_id, scope.current_call_path, result)
+            emit("workflow_done", workflow.name)
+
+        def enter_checkpoint() -> tuple[bool, Any]:
+            nonlocal i, recording
+            scope = current_scope()
+            next_call = (scope.scope_id, (*scope.call_stack, scope.next_counter))
+            ordinal = checkpoint_ordinals.get(next_call, 0)
+            checkpoint_ordinals[next_call] = ordinal + 1
+            key = (scope.scope_id, checkpoint_path(next_call[1], ordinal))
+            fetched, raw_record = self.workflow_results.get(*key)
+            checkpoint_record = None
+            if fetched:
+                try:
+                    checkpoint_record = CheckpointRecord.model_validate(raw_record)
+                except ValidationError as exc:
+                    log_event(
+                        CheckpointRecordIgnoredEvent(
+                            id=str(uuid4()), call_id=scope.current_call_id, error=str(exc)
+                        )
+                    )
+            if checkpoint_record is None:
+                # Run the body, replaying its workflows if they were recorded.
+                checkpoint_keys.append(key)
+                return False, None
+
+            i = checkpoint_record.turn
+            recording = recording or i * 2 >= len(self.chat_history)
+            scope = new_generation_scope(self.scope_ids[i])
+            scope.call_stack = checkpoint_record.call_stack.copy()
+            scope.next_counter = checkpoint_record.next_counter
+            return True, checkpoint_record.result
+
+        def exit_checkpoint(result: Any):
+            # The record was missing or invalid, since the body ran. It is recorded even when the
+            # body was replayed, e.g. if the checkpoint was declared after the recording.
+            key = checkpoint_keys.pop()
+            scope = current_scope()
+            checkpoint_record = CheckpointRecord(
+                result=result,
+                turn=i,
+                call_stack=scope.call_stack.copy(),
+                next_counter=scope.next_counter,
+            )
+            record(*key, checkpoint_record.model_dump())
 
         async def get_user_reply() -> str:
             nonlocal i, recording
             offset = i * 2 + 1
             if offset == len(self.chat_history):
-                raise StepCompleteError()
+                if not self.keep_alive:
+                    raise StepCompleteError()
+                await self._park()
             if offset == len(self.chat_history) - 1:
                 recording = True
             i += 1
@@ -91,22 +321,40 @@ class StepExecutor:
             offset = i * 2
             if offset < len(self.chat_history):
                 return
+            emit("chunk", message)
+            self.chat_history.append(message)
+
+        async def stream_assistant_reply(chunks: AsyncIterator[str]) -> str:
+            offset = i * 2
+            if offset < len(self.chat_history):
+                aclose = getattr(chunks, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+                return self.chat_history[offset]
+            parts: list[str] = []
+            async for chunk in chunks:
+                parts.append(chunk)
+                emit("chunk", chunk)
+            message = "".join(parts)
             self.chat_history.append(message)
+            return message
 
         with ExitStack() as stack:
             stack.enter_context(with_get_workflow_cache(get_workflow_cache))
             stack.enter_context(with_on_workflow_done(on_workflow_done))
+            stack.enter_context(with_enter_checkpoint(enter_checkpoint))
+            stack.enter_context(with_exit_checkpoint(exit_checkpoint))
             stack.enter_context(with_get_user_reply(get_user_reply))
             stack.enter_context(with_post_assistant_reply(post_assistant_reply))
+            stack.enter_context(with_stream_assistant_reply(stream_assistant_reply))
             try:
                 self._output = await self.model.run(*args, **kwargs)
             except StepCompleteError:
-                return self.chat_history[-1]
+                return
             finally:
                 reset_generation_scope()
 
         self.has_ended = True
-        return self.chat_history[-1]
 
     def get_result(self):
         """
@@ -1,7 +1,12 @@
 """Provides BasePrompts."""
 
 import os
+from dataclasses import dataclass
+from hashlib import sha256
+from threading import Lock
+from typing import Optional
 from typing import Self
+from typing import TypeVar
 
 import yaml
 from pydantic import BaseModel
@@ -12,9 +17,77 @@ class BasePrompts(BaseModel):
 
     @classmethod
     def load_prompt(cls, filename: str) -> Self:
-        """Load prompts."""
+        """
+        Load prompts, from the YAML file next to the given module.
+
+        Files are only parsed again after they change, see `PromptStore`. Each call returns its own
+        copy, so a conversation may assign fields without affecting others.
+        """
         no_ext, _ = os.path.splitext(filename)
-        path = no_ext + ".yml"
-        with open(path, "r", encoding="utf-8") as file:
-            raw_dict = yaml.safe_load(file)
-            return cls(**raw_dict)
+        return prompt_store.load(cls, no_ext + ".yml")
+
+
+PromptsT = TypeVar("PromptsT", bound=BasePrompts)
+
+
+@dataclass
+class _StoredPrompts:
+    stat_key: tuple[int, int]
+    digest: bytes
+    prompts: BasePrompts
+
+
+class PromptStore:
+    """
+    Loads prompt files once, and reloads them when they change on disk.
+
+    A file is stat-ed on every load. When its mtime or size changed, its content is hashed, and
+    only parsed and validated again if the hash changed too.
+
+    Loads return shallow copies of the stored prompts: fields are shared until they are assigned,
+    which makes copies cheap. Assign fields rather than mutating nested values in place.
+    """
+
+    _entries: dict[tuple[type, str], _StoredPrompts]
+    _lock: Lock
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = Lock()
+
+    def load(self, cls: type[PromptsT], path: str) -> PromptsT:
+        """Returns a copy of the prompts in the given YAML file."""
+        stat = os.stat(path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        key = (cls, os.path.abspath(path))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.stat_key != stat_key:
+                entry = self._reload(cls, path, stat_key, entry)
+                self._entries[key] = entry
+        prompts = entry.prompts
+        assert isinstance(prompts, cls)
+        return prompts.model_copy()
+
+    def clear(self):
+        """Forgets every loaded file."""
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _reload(
+        prompts_cls: type[BasePrompts],
+        path: str,
+        stat_key: tuple[int, int],
+        previous: Optional[_StoredPrompts],
+    ) -> _StoredPrompts:
+        with open(path, "rb") as file:
+            content = file.read()
+        digest = sha256(content).digest()
+        if previous is not None and previous.digest == digest:
+            return _StoredPrompts(stat_key, digest, previous.prompts)
+        raw_dict = yaml.safe_load(content)
+        return _StoredPrompts(stat_key, digest, prompts_cls(**raw_dict))
+
+
+prompt_store = PromptStore()
@@ -0,0 +1,216 @@
+"""
+Provides deadlines, retries and hedged requests for LLM calls.
+
+A few slow responses dominate the tail latency of a turn, and a single malformed JSON output used
+to fail a whole request. A `CallPolicy` bounds each attempt, retries transport errors and
+validation failures with exponential backoff, and optionally sends a duplicate request when an
+attempt takes longer than usual, keeping whichever finishes first. Retries bypass the response
+cache and single-flight coalescing, so that they sample a new output.
+"""
+
+import asyncio
+import os
+from collections import deque
+from contextlib import ExitStack
+from random import random
+from time import perf_counter
+from typing import Awaitable
+from typing import Callable
+from typing import Optional
+from typing import TypeVar
+from uuid import uuid4
+
+import httpx
+import openai
+from pydantic import BaseModel
+from pydantic import ValidationError
+
+from ..event_logging import Event
+from ..event_logging import event_model
+from ..event_logging import log_event
+from .llm_cache import without_cached_responses
+from .partial_json import PartialJSONError
+from .single_flight import without_single_flight
+
+T = TypeVar("T")
+
+TRANSPORT_ERRORS: tuple[type[BaseException], ...] = (
+    asyncio.TimeoutError,
+    httpx.TransportError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+@event_model("llm_call_attempt_failed")
+class LLMCallAttemptFailedEvent(Event):
+    """
+    An event to track a failed attempt of an LLM call, which may be retried.
+    """
+
+    attempt: int
+    error: str
+    will_retry: bool
+
+
+class CallPolicy(BaseModel):
+    """
+    Configures how LLM calls are attempted. Durations are in seconds.
+
+    - `timeout` bounds each attempt, including its hedged duplicate.
+    - `max_attempts` counts the first attempt. Retries wait `backoff_initial`, multiplied by
+      `backoff_multiplier` after each retry up to `backoff_max`, with up to `backoff_jitter` of
+      relative random jitter.
+    - `hedge_quantile` sends a duplicate request once an attempt exceeds that quantile of recent
+      latencies, e.g. 0.95. Until enough latencies are known, `hedge_after` is used if set.
+
+    The default policy makes a single attempt without deadline, like a plain call.
+    """
+
+    timeout: Optional[float] = None
+    max_attempts: int = 1
+    backoff_initial: float = 0.5
+    backoff_multiplier: float = 2.0
+    backoff_max: float = 8.0
+    backoff_jitter: float = 0.1
+    retry_on_validation_error: bool = True
+    hedge_after: Optional[float] = None
+    hedge_quantile: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "CallPolicy":
+        """
+        Reads the policy from SOCRATIC_LLM_TIMEOUT, SOCRATIC_LLM_MAX_ATTEMPTS,
+        SOCRATIC_LLM_HEDGE_AFTER and SOCRATIC_LLM_HEDGE_QUANTILE, using defaults for unset ones.
+        """
+        timeout = os.getenv("SOCRATIC_LLM_TIMEOUT")
+        hedge_after = os.getenv("SOCRATIC_LLM_HEDGE_AFTER")
+        hedge_quantile = os.getenv("SOCRATIC_LLM_HEDGE_QUANTILE")
+        return cls(
+            timeout=None if timeout is None else float(timeout),
+            max_attempts=int(os.getenv("SOCRATIC_LLM_MAX_ATTEMPTS", "1")),
+            hedge_after=None if hedge_after is None else float(hedge_after),
+            hedge_quantile=None if hedge_quantile is None else float(hedge_quantile),
+        )
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        """Returns whether a failed attempt may be retried."""
+        if isinstance(exc, TRANSPORT_ERRORS):
+            return True
+        return self.retry_on_validation_error and isinstance(
+            exc, (ValidationError, PartialJSONError)
+        )
+
+    def backoff(self, retry: int) -> float:
+        """Returns the delay before the given retry, counting from 0."""
+        delay = min(self.backoff_max, self.backoff_initial * self.backoff_multiplier**retry)
+        return delay * (1 + self.backoff_jitter * (2 * random() - 1))
+
+
+class LatencyTracker:
+    """Keeps a window of recent latencies of successful attempts."""
+
+    min_samples: int
+
+    _latencies: deque[float]
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        """Records a latency."""
+        self._latencies.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Returns the given quantile, or None until enough latencies are recorded."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def call_with_policy(
+    policy: CallPolicy,
+    attempt: Callable[[], Awaitable[T]],
+    tracker: Optional[LatencyTracker] = None,
+) -> T:
+    """
+    Runs `attempt` under the given policy, and returns the first successful result.
+
+    `attempt` is called once per attempt, and once more per hedged duplicate. It must include
+    validation, so that invalid outputs are retried.
+    """
+    call_id = str(uuid4())
+    for attempt_index in range(policy.max_attempts):
+        try:
+            with ExitStack() as stack:
+                if attempt_index > 0:
+                    stack.enter_context(without_cached_responses())
+                    stack.enter_context(without_single_flight())
+                async with asyncio.timeout(policy.timeout):
+                    return await _hedged(policy, attempt, tracker)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            will_retry = attempt_index + 1 < policy.max_attempts and policy.is_retryable(exc)
+            log_event(
+                LLMCallAttemptFailedEvent(
+                    id=call_id,
+                    attempt=attempt_index,
+                    error=f"{type(exc).__name__}: {exc}",
+                    will_retry=will_retry,
+                )
+            )
+            if not will_retry:
+                raise
+        await asyncio.sleep(policy.backoff(attempt_index))
+    raise AssertionError("A call policy must allow at least one attempt.")
+
+
+def _hedge_delay(policy: CallPolicy, tracker: Optional[LatencyTracker]) -> Optional[float]:
+    if policy.hedge_quantile is not None and tracker is not None:
+        delay = tracker.quantile(policy.hedge_quantile)
+        if delay is not None:
+            return delay
+    return policy.hedge_after
+
+
+async def _timed(attempt: Callable[[], Awaitable[T]], tracker: Optional[LatencyTracker]) -> T:
+    start = perf_counter()
+    result = await attempt()
+    if tracker is not None:
+        tracker.add(perf_counter() - start)
+    return result
+
+
+async def _duplicate(attempt: Callable[[], Awaitable[T]], tracker: Optional[LatencyTracker]) -> T:
+    with without_single_flight():
+        return await _timed(attempt, tracker)
+
+
+async def _hedged(
+    policy: CallPolicy, attempt: Callable[[], Awaitable[T]], tracker: Optional[LatencyTracker]
+) -> T:
+    delay = _hedge_delay(policy, tracker)
+    if delay is None:
+        return await _timed(attempt, tracker)
+
+    tasks = {asyncio.ensure_future(_timed(attempt, tracker))}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.add(asyncio.ensure_future(_duplicate(attempt, tracker)))
+        # Keep the first success. A failure only counts once every request has failed.
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not pending:
+                exc = next(iter(done)).exception()
+                assert exc is not None
+                raise exc
+    finally:
+        for task in tasks:
+            task.cancel()
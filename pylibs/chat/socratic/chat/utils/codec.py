@@ -0,0 +1,232 @@
+"""
+Provides codecs compiled per type.
+
+A codec behaves like `dump_value` and `parse_value`, but inspects the type only once, when it is
+compiled. Converting a value then runs a tree of prebuilt closures, which matters on hot paths
+like replaying recorded workflow results.
+"""
+
+from enum import Enum
+from functools import lru_cache
+from types import UnionType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Union
+from typing import get_args
+from typing import get_origin
+
+from pydantic import BaseModel
+from pydantic import TypeAdapter
+
+from .typing import is_atomic_type
+
+Converter = Callable[[Any], Any]
+Predicate = Callable[[Any], bool]
+
+_UNION_ERRORS = (AssertionError, ValueError, TypeError)
+
+
+class ValueCodec:
+    """Dumps values of a type to JSON and parses them back."""
+
+    type_: Any
+    dump: Converter
+    parse: Converter
+
+    def __init__(self, type_: Any):
+        self.type_ = type_
+        self.dump = _compile_dump(type_)
+        self.parse = _compile_parse(type_)
+
+
+@lru_cache(maxsize=None)
+def get_codec(type_: Any) -> ValueCodec:
+    """Returns the codec for the given type, compiling it on first use."""
+    return ValueCodec(type_)
+
+
+def _is_model_type(type_: Any) -> bool:
+    return isinstance(type_, type) and issubclass(type_, BaseModel)
+
+
+def _is_enum_type(type_: Any) -> bool:
+    return isinstance(type_, type) and issubclass(type_, Enum)
+
+
+def _list_item_type(type_: Any) -> Any:
+    args = get_args(type_)
+    if get_origin(type_) in (list, List) and len(args) == 1:
+        return args[0]
+    return None
+
+
+def _dict_value_type(type_: Any) -> Any:
+    args = get_args(type_)
+    if get_origin(type_) in (dict, Dict) and args[0] == str:
+        return args[1]
+    return None
+
+
+def _isinstance_of(type_: Any) -> Predicate:
+    return lambda value: isinstance(value, type_)
+
+
+def _compile_union(
+    args: tuple[Any, ...], compile_member: Callable[[Any], tuple[Predicate, Converter]]
+) -> Converter:
+    # Members are tried in order. Predicates cheaply rule out most mismatches, so exceptions are
+    # only raised when a member passes its predicate but still fails to convert.
+    members = [compile_member(t) for t in args]
+
+    def convert(value: Any) -> Any:
+        for accepts, convert_member in members:
+            if not accepts(value):
+                continue
+            try:
+                return convert_member(value)
+            except _UNION_ERRORS:
+                continue
+        raise ValueError(f"Value {value} is not valid for union types {args}")
+
+    return convert
+
+
+def _compile_dump(type_: Any) -> Converter:
+    if is_atomic_type(type_):
+
+        def dump_atomic(value: Any) -> Any:
+            assert isinstance(value, type_)
+            return value
+
+        return dump_atomic
+
+    if _is_enum_type(type_):
+
+        def dump_enum(value: Any) -> Any:
+            assert isinstance(value, type_)
+            return value.value
+
+        return dump_enum
+
+    if _is_model_type(type_):
+
+        def dump_model(value: Any) -> Any:
+            assert isinstance(value, type_)
+            return value.model_dump()
+
+        return dump_model
+
+    item_type = _list_item_type(type_)
+    if item_type is not None:
+        if is_atomic_type(item_type):
+
+            def dump_atomic_list(value: Any) -> Any:
+                assert isinstance(value, list)
+                for item in value:
+                    assert isinstance(item, item_type)
+                return list(value)
+
+            return dump_atomic_list
+
+        dump_item = _compile_dump(item_type)
+
+        def dump_list(value: Any) -> Any:
+            assert isinstance(value, list)
+            return [dump_item(x) for x in value]
+
+        return dump_list
+
+    value_type = _dict_value_type(type_)
+    if value_type is not None:
+        dump_dict_value = _compile_dump(value_type)
+
+        def dump_dict(value: Any) -> Any:
+            assert isinstance(value, dict)
+            return {k: dump_dict_value(v) for k, v in value.items()}
+
+        return dump_dict
+
+    if get_origin(type_) in (Union, UnionType):
+        return _compile_union(get_args(type_), _compile_dump_member)
+
+    def dump_unknown(value: Any) -> Any:
+        raise ValueError(f"Cannot dump {value} as {type_}.")
+
+    return dump_unknown
+
+
+def _compile_dump_member(type_: Any) -> tuple[Predicate, Converter]:
+    if is_atomic_type(type_) or _is_enum_type(type_) or _is_model_type(type_):
+        return _isinstance_of(type_), _compile_dump(type_)
+    if _list_item_type(type_) is not None:
+        return _isinstance_of(list), _compile_dump(type_)
+    if _dict_value_type(type_) is not None:
+        return _isinstance_of(dict), _compile_dump(type_)
+    return lambda _: True, _compile_dump(type_)
+
+
+def _compile_parse(type_: Any) -> Converter:
+    if is_atomic_type(type_):
+
+        def parse_atomic(value: Any) -> Any:
+            assert isinstance(value, type_)
+            return value
+
+        return parse_atomic
+
+    if _is_enum_type(type_):
+        return type_
+
+    if _is_model_type(type_):
+        return type_.model_validate
+
+    item_type = _list_item_type(type_)
+    if item_type is not None:
+        if _is_model_type(item_type):
+            validate_list = TypeAdapter(type_).validate_python
+
+            def parse_model_list(value: Any) -> Any:
+                assert isinstance(value, list)
+                return validate_list(value)
+
+            return parse_model_list
+
+        parse_item = _compile_parse(item_type)
+
+        def parse_list(value: Any) -> Any:
+            assert isinstance(value, list)
+            return [parse_item(x) for x in value]
+
+        return parse_list
+
+    value_type = _dict_value_type(type_)
+    if value_type is not None:
+        parse_dict_value = _compile_parse(value_type)
+
+        def parse_dict(value: Any) -> Any:
+            assert isinstance(value, dict)
+            return {k: parse_dict_value(v) for k, v in value.items()}
+
+        return parse_dict
+
+    if get_origin(type_) in (Union, UnionType):
+        return _compile_union(get_args(type_), _compile_parse_member)
+
+    def parse_unknown(value: Any) -> Any:
+        raise ValueError(f"Cannot parse {value} as {type_}.")
+
+    return parse_unknown
+
+
+def _compile_parse_member(type_: Any) -> tuple[Predicate, Converter]:
+    if is_atomic_type(type_):
+        return _isinstance_of(type_), _compile_parse(type_)
+    if _is_model_type(type_):
+        return _isinstance_of((dict, type_)), _compile_parse(type_)
+    if _list_item_type(type_) is not None:
+        return _isinstance_of(list), _compile_parse(type_)
+    if _dict_value_type(type_) is not None:
+        return _isinstance_of(dict), _compile_parse(type_)
+    return lambda _: True, _compile_parse(type_)
@@ -0,0 +1,195 @@
+"""
+Provides a deterministic fake chat backend, which runs without network.
+
+It is meant for load tests and benchmarks, to measure the costs of replays, storage and
+serialization in isolation. Enable it for every `SocraticChatModel` by setting
+SOCRATIC_LLM_BACKEND=fake, and optionally configure it with a JSON file of `FakeChatConfig`
+passed in SOCRATIC_FAKE_LLM_CONFIG.
+"""
+
+import json
+import os
+from asyncio import sleep
+from enum import Enum
+from hashlib import sha256
+from random import Random
+from types import UnionType
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TypeVar
+from typing import Union
+from typing import get_args
+from typing import get_origin
+
+from langchain.prompts import ChatPromptTemplate
+from pydantic import BaseModel
+from pydantic import ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+_WORDS = (
+    "the question of how we know what we know is older than any answer we have given to it "
+    "and every answer opens another question about evidence reasons and trust"
+).split()
+
+
+class FakeChatConfig(BaseModel):
+    """
+    Configures `FakeChatBackend`. Latencies are in seconds, and token counts are in words.
+
+    `responses` fixes fields of generated JSON, keyed by the name of the pydantic model. Use it
+    when a chain checks more than its model validates, e.g. for dfs_v2:
+
+        {"responses": {"PlanUpdate": {"should_update": false, "updated_plan": null}}}
+    """
+
+    seed: int = 0
+    latency_mean: float = 0.0
+    latency_stddev: float = 0.0
+    tokens_mean: float = 50
+    tokens_stddev: float = 0.0
+    string_field_tokens: int = 8
+    list_length: int = 3
+    max_attempts: int = 200
+    responses: dict[str, dict[str, Any]] = {}
+
+
+class FakeChatBackend:
+    """
+    Generates canned strings, and JSON built from the requested pydantic model.
+
+    Results only depend on the seed and the rendered prompt, so identical calls get identical
+    results. Booleans are drawn at random, and optional fields are filled. Until the model
+    validators accept the result, both are drawn again, with optional fields left empty at
+    random. Lists of models with enum fields enumerate the enum in order, which is how the zoo
+    models express plans.
+    """
+
+    config: FakeChatConfig
+
+    def __init__(self, config: Optional[FakeChatConfig] = None):
+        self.config = config or FakeChatConfig()
+
+    async def gen_string(self, prompt: ChatPromptTemplate, **kwargs) -> str:
+        """Generate a string."""
+        rng = self._rng(prompt, kwargs, "string")
+        await self._sleep(rng)
+        return " ".join(self._words(rng, self._token_count(rng)))
+
+    async def stream_string(self, prompt: ChatPromptTemplate, **kwargs) -> AsyncIterator[str]:
+        """Generate a string, yielding one word at a time."""
+        rng = self._rng(prompt, kwargs, "string")
+        words = self._words(rng, self._token_count(rng))
+        delay = self._latency(rng) / len(words)
+        for i, word in enumerate(words):
+            await sleep(delay)
+            yield word if i == 0 else " " + word
+
+    async def gen_json(self, prompt: ChatPromptTemplate, model_cls: type[T], **kwargs) -> T:
+        """Generate a JSON."""
+        rng = self._rng(prompt, kwargs, model_cls.__name__)
+        await self._sleep(rng)
+        fixed = self.config.responses.get(model_cls.__name__, {})
+        for attempt in range(self.config.max_attempts):
+            raw = {**self._gen_model(rng, model_cls, fill=attempt == 0), **fixed}
+            try:
+                # Round-trip through text, as real responses do.
+                return model_cls.model_validate_json(json.dumps(raw))
+            except ValidationError:
+                continue
+        raise ValueError(f"Failed to generate a valid {model_cls.__name__}.")
+
+    def _rng(self, prompt: ChatPromptTemplate, kwargs: dict[str, Any], salt: str) -> Random:
+        rendered = "\n".join(str(x.content) for x in prompt.format_messages(**kwargs))
+        digest = sha256(f"{self.config.seed}\n{salt}\n{rendered}".encode("utf-8")).digest()
+        return Random(digest)
+
+    def _latency(self, rng: Random) -> float:
+        return max(0.0, rng.gauss(self.config.latency_mean, self.config.latency_stddev))
+
+    async def _sleep(self, rng: Random):
+        latency = self._latency(rng)
+        if latency > 0:
+            await sleep(latency)
+
+    def _token_count(self, rng: Random) -> int:
+        return max(1, round(rng.gauss(self.config.tokens_mean, self.config.tokens_stddev)))
+
+    def _words(self, rng: Random, count: int) -> list[str]:
+        return [rng.choice(_WORDS) for _ in range(count)]
+
+    def _gen_model(
+        self, rng: Random, model_cls: type[BaseModel], fill: bool, index: int = -1
+    ) -> dict:
+        return {
+            name: self._gen_value(rng, field.annotation, fill, index)
+            for name, field in model_cls.model_fields.items()
+        }
+
+    def _gen_value(self, rng: Random, type_: Any, fill: bool, index: int = -1) -> Any:
+        # Values at `index` of a list take the enum member at the same position. With `fill`,
+        # optional values are never None.
+        if type_ is str:
+            return " ".join(self._words(rng, self.config.string_field_tokens))
+        if type_ is bool:
+            return rng.random() < 0.5
+        if type_ is int:
+            return rng.randint(0, 10)
+        if type_ is float:
+            return rng.random()
+        if type_ is type(None):
+            return None
+        if isinstance(type_, type) and issubclass(type_, Enum):
+            members = list(type_)
+            member = members[index % len(members)] if index >= 0 else rng.choice(members)
+            return member.value
+        if isinstance(type_, type) and issubclass(type_, BaseModel):
+            return self._gen_model(rng, type_, fill, index)
+
+        origin = get_origin(type_)
+        args = get_args(type_)
+        if origin in (list, List):
+            length = _enum_size(args[0]) or self.config.list_length
+            return [self._gen_value(rng, args[0], fill, i) for i in range(length)]
+        if origin in (dict, Dict):
+            return {
+                rng.choice(_WORDS): self._gen_value(rng, args[1], fill)
+                for _ in range(self.config.list_length)
+            }
+        if origin in (Union, UnionType):
+            if fill:
+                args = tuple(x for x in args if x is not type(None)) or args
+            return self._gen_value(rng, rng.choice(args), fill, index)
+        raise ValueError(f"Cannot generate a value of {type_}.")
+
+
+def _enum_size(type_: Any) -> int:
+    # Returns the size of the largest enum among the fields of a model, or 0 if there is none.
+    if not (isinstance(type_, type) and issubclass(type_, BaseModel)):
+        return 0
+    sizes = [
+        len(field.annotation)
+        for field in type_.model_fields.values()
+        if isinstance(field.annotation, type) and issubclass(field.annotation, Enum)
+    ]
+    return max(sizes, default=0)
+
+
+def fake_chat_backend_from_env() -> Optional[FakeChatBackend]:
+    """
+    Returns a fake backend if SOCRATIC_LLM_BACKEND is "fake", or None for the real one.
+    """
+    backend = os.getenv("SOCRATIC_LLM_BACKEND", "openai")
+    if backend == "openai":
+        return None
+    if backend != "fake":
+        raise ValueError(f"Unknown LLM backend {backend}.")
+
+    config_path = os.getenv("SOCRATIC_FAKE_LLM_CONFIG")
+    if not config_path:
+        return FakeChatBackend()
+    with open(config_path, "r", encoding="utf-8") as file:
+        return FakeChatBackend(FakeChatConfig.model_validate_json(file.read()))
@@ -0,0 +1,206 @@
+"""
+Provides a cache of LLM responses, keyed by the exact request sent to the API.
+
+It sits below the workflow cache: any two calls with the same rendered messages, model and
+parameters share a response, whichever workflow made them. It makes repeated runs near-instant,
+and recorded responses can be replayed offline, e.g. for regression and performance tests.
+
+Outputs parsed by the caller, e.g. JSON ones, must only be recorded once they are valid, or a
+malformed output would be served to every identical request. Such calls run within
+`defer_response_writes`, and commit the responses once parsed. Retries run within
+`without_cached_responses`, so that they get a new output.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import sha256
+from typing import Any
+from typing import Iterator
+from typing import Literal
+from typing import Optional
+
+from langchain.schema.messages import messages_from_dict
+from langchain.schema.messages import messages_to_dict
+from langchain.schema.output import ChatGeneration
+from langchain.schema.output import ChatResult
+
+from ..workflow_cache import WorkflowCacheBackend
+from ..workflow_cache import cache_backend_from_url
+
+LLMCacheMode = Literal["readwrite", "replay"]
+
+
+def llm_request_key(message_dicts: list[dict[str, Any]], params: dict[str, Any]) -> str:
+    """
+    Returns the key of a request, given its messages and its API parameters, which include the
+    model name, the temperature and the model kwargs.
+    """
+    payload = json.dumps(["llm", message_dicts, params], sort_keys=True, default=str)
+    return sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseMissError(LookupError):
+    """Raised in replay mode when a response was never recorded."""
+
+
+class LLMResponseCache:
+    """
+    Stores chat results in a workflow cache backend, keyed by `llm_request_key`.
+
+    In "replay" mode, misses raise `LLMResponseMissError` instead of calling the API, which
+    guarantees that a run is served entirely from recorded responses.
+    """
+
+    backend: WorkflowCacheBackend
+    ttl: Optional[float]
+    mode: LLMCacheMode
+
+    def __init__(
+        self,
+        backend: WorkflowCacheBackend,
+        ttl: Optional[float] = None,
+        mode: LLMCacheMode = "readwrite",
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.mode = mode
+
+    def get(self, key: str) -> Optional[ChatResult]:
+        """Returns the recorded result, if any, and None within `without_cached_responses`."""
+        if self._is_bypassed():
+            return None
+        return self._parse(key, *self.backend.get(key))
+
+    async def aget(self, key: str) -> Optional[ChatResult]:
+        """Same as `get`, without blocking the event loop."""
+        if self._is_bypassed():
+            return None
+        return self._parse(key, *await self.backend.aget(key))
+
+    def set(self, key: str, result: ChatResult):
+        """Records a result."""
+        self.backend.set(key, self._dump(result), self.ttl)
+
+    async def aset(self, key: str, result: ChatResult):
+        """
+        Same as `set`, without blocking the event loop. Within `defer_response_writes`, the result
+        is only recorded once committed.
+        """
+        deferred = _deferred_writes_var.get()
+        if deferred is not None:
+            deferred.add(self.backend, key, self._dump(result), self.ttl)
+            return
+        await self.backend.aset(key, self._dump(result), self.ttl)
+
+    def _is_bypassed(self) -> bool:
+        # Replay mode must never call the API, so it always reads.
+        return _bypass_var.get() and self.mode != "replay"
+
+    def _parse(self, key: str, found: bool, value: Any) -> Optional[ChatResult]:
+        if not found:
+            if self.mode == "replay":
+                raise LLMResponseMissError(f"No recorded LLM response for {key}.")
+            return None
+        messages = messages_from_dict(value["messages"])
+        generations = [
+            ChatGeneration(message=message, generation_info=info)
+            for message, info in zip(messages, value["generation_info"])
+        ]
+        return ChatResult(generations=generations, llm_output=value["llm_output"])
+
+    def _dump(self, result: ChatResult) -> dict[str, Any]:
+        return {
+            "messages": messages_to_dict([x.message for x in result.generations]),
+            "generation_info": [x.generation_info for x in result.generations],
+            "llm_output": result.llm_output,
+        }
+
+
+_bypass_var = ContextVar[bool]("_llm_response_cache_bypass", default=False)
+
+
+@contextmanager
+def without_cached_responses() -> Iterator[None]:
+    """
+    Temporarily makes calls within ignore recorded responses, e.g. for retries, which must sample a
+    new output rather than get the rejected one again. Their responses are still recorded.
+
+    Yields:
+        None
+    """
+
+    saved_token = _bypass_var.set(True)
+    try:
+        yield
+    finally:
+        _bypass_var.reset(saved_token)
+
+
+class DeferredResponseWrites:
+    """Responses held back by `defer_response_writes`."""
+
+    _writes: list[tuple[WorkflowCacheBackend, str, Any, Optional[float]]]
+
+    def __init__(self):
+        self._writes = []
+
+    def add(self, backend: WorkflowCacheBackend, key: str, value: Any, ttl: Optional[float]):
+        """Holds back a dumped response."""
+        self._writes.append((backend, key, value, ttl))
+
+    async def commit(self):
+        """Records the responses held back so far."""
+        writes, self._writes = self._writes, []
+        for backend, key, value, ttl in writes:
+            await backend.aset(key, value, ttl)
+
+
+_deferred_writes_var = ContextVar[Optional[DeferredResponseWrites]](
+    "_deferred_llm_response_writes", default=None
+)
+
+
+@contextmanager
+def defer_response_writes(
+    deferred: Optional[DeferredResponseWrites] = None,
+) -> Iterator[DeferredResponseWrites]:
+    """
+    Temporarily holds back the responses recorded by calls within, until they are committed, e.g.
+    once their output is validated. Uncommitted responses are dropped.
+
+    Args:
+        deferred: Where to hold back responses, to share it between blocks. New by default.
+
+    Yields:
+        The responses held back.
+    """
+
+    if deferred is None:
+        deferred = DeferredResponseWrites()
+    saved_token = _deferred_writes_var.set(deferred)
+    try:
+        yield deferred
+    finally:
+        _deferred_writes_var.reset(saved_token)
+
+
+def llm_response_cache_from_env() -> Optional[LLMResponseCache]:
+    """
+    Returns the cache configured by SOCRATIC_LLM_CACHE, or None if caching is disabled.
+
+    SOCRATIC_LLM_CACHE takes the same URLs as SOCRATIC_WORKFLOW_CACHE, see
+    `socratic.chat.workflow_cache.cache_backend_from_url`. The TTL in seconds is configured by
+    SOCRATIC_LLM_CACHE_TTL, and SOCRATIC_LLM_CACHE_MODE may be set to "replay".
+    """
+    url = os.getenv("SOCRATIC_LLM_CACHE")
+    if not url:
+        return None
+    ttl = os.getenv("SOCRATIC_LLM_CACHE_TTL")
+    mode = os.getenv("SOCRATIC_LLM_CACHE_MODE", "readwrite")
+    if mode not in ("readwrite", "replay"):
+        raise ValueError(f"Unknown LLM cache mode {mode}.")
+    return LLMResponseCache(
+        cache_backend_from_url(url), ttl=None if ttl is None else float(ttl), mode=mode
+    )
@@ -0,0 +1,311 @@
+"""
+Provides model tiers, routing the LLM calls of each chain to a model fitting its difficulty.
+
+Cheap classifications running on every turn do not need the model used for evaluations. A chain
+picks a tier with `@model.chain(tier=...)`, and the `ModelRouter` maps each tier to a ladder of
+models, cheapest first. Calls use the first model, and JSON outputs failing validation escalate to
+the next one.
+
+The router also tracks the latency and errors of each model. When a model with a fallback breaches
+its SLO, i.e. its p95 latency exceeds `slo` or its error rate exceeds `max_error_rate`, traffic is
+diverted to the fallback, and one call every `probe_interval` seconds probes the model to recover.
+Calls still in flight count with their current age, so hanging calls divert traffic too.
+"""
+
+import json
+import os
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from time import monotonic
+from typing import Any
+from typing import Iterator
+from typing import Optional
+from uuid import uuid4
+
+from ..event_logging import Event
+from ..event_logging import event_model
+from ..event_logging import log_event
+from .call_policy import TRANSPORT_ERRORS
+
+DEFAULT_TIER = "default"
+FAST_TIER = "fast"
+
+DEFAULT_TIERS: dict[str, list[str]] = {
+    DEFAULT_TIER: ["gpt-4-turbo-preview"],
+    FAST_TIER: ["gpt-3.5-turbo-0125", "gpt-4-turbo-preview"],
+}
+
+_tier_var = ContextVar[Optional[str]]("_model_tier", default=None)
+
+
+@contextmanager
+def with_model_tier(tier: Optional[str]) -> Iterator[None]:
+    """
+    Temporarily sets the model tier of the LLM calls made within. Chains set it for their own
+    calls, see `socratic.chat.conversation_model.ConversationModel.chain`.
+
+    Args:
+        tier: The tier, or None for the default one.
+
+    Yields:
+        None
+    """
+
+    saved_token = _tier_var.set(tier)
+    try:
+        yield
+    finally:
+        _tier_var.reset(saved_token)
+
+
+def current_model_tier() -> str:
+    """Returns the model tier of the current context."""
+    return _tier_var.get() or DEFAULT_TIER
+
+
+@event_model("llm_model_escalated")
+class LLMModelEscalatedEvent(Event):
+    """
+    An event to track an output failing validation, and the call being escalated to a stronger
+    model.
+    """
+
+    tier: str
+    from_model: str
+    to_model: str
+    error: str
+
+
+@event_model("llm_model_route_changed")
+class LLMModelRouteChangedEvent(Event):
+    """
+    An event to track traffic of a model being diverted to its fallback, or restored.
+    """
+
+    model: str
+    fallback: str
+    diverted: bool
+    reason: str
+
+
+def _p95(latencies: list[float]) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class ModelHealth:
+    """Keeps a window of recent latencies and failures of a model, and its calls in flight."""
+
+    min_samples: int
+    diverted: bool
+    next_probe: float
+
+    _samples: deque[tuple[float, bool]]
+    _in_flight: dict[int, float]
+    _ids: Iterator[int]
+
+    def __init__(self, window: int = 100, min_samples: int = 10):
+        self.min_samples = min_samples
+        self.diverted = False
+        self.next_probe = 0.0
+        self._samples = deque(maxlen=window)
+        self._in_flight = {}
+        self._ids = count()
+
+    def start(self) -> int:
+        """Records the start of a call, and returns its id."""
+        call_id = next(self._ids)
+        self._in_flight[call_id] = monotonic()
+        return call_id
+
+    def finish(self, call_id: int, failed: bool) -> float:
+        """Records the end of a call, and returns its latency."""
+        latency = monotonic() - self._in_flight.pop(call_id)
+        self._samples.append((latency, failed))
+        return latency
+
+    def reset(self):
+        """Forgets completed calls, e.g. once a probe succeeded."""
+        self._samples.clear()
+
+    def breach(self, slo: Optional[float], max_error_rate: float) -> Optional[str]:
+        """Returns why the model breaches its SLO, or None if it does not, or is unknown."""
+        now = monotonic()
+        latencies = [latency for latency, _ in self._samples]
+        if slo is not None:
+            latencies.extend(now - x for x in self._in_flight.values() if now - x > slo)
+        if len(latencies) < self.min_samples:
+            return None
+        if slo is not None:
+            p95 = _p95(latencies)
+            if p95 > slo:
+                return f"p95 latency {p95:.1f}s exceeds {slo:.1f}s"
+        if self._samples:
+            error_rate = sum(failed for _, failed in self._samples) / len(self._samples)
+            if error_rate > max_error_rate:
+                return f"error rate {error_rate:.0%} exceeds {max_error_rate:.0%}"
+        return None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Returns the recent latencies and failures, summarized."""
+        latencies = [latency for latency, _ in self._samples]
+        return {
+            "samples": len(latencies),
+            "p95": _p95(latencies) if latencies else None,
+            "errors": sum(failed for _, failed in self._samples),
+            "in_flight": len(self._in_flight),
+            "diverted": self.diverted,
+        }
+
+
+class ModelRouter:
+    """
+    Maps model tiers to ladders of models, cheapest first, diverting models breaching their SLO to
+    their fallbacks. Durations are in seconds.
+    """
+
+    tiers: dict[str, list[str]]
+    fallbacks: dict[str, str]
+    slo: Optional[float]
+    max_error_rate: float
+    probe_interval: float
+
+    _health: dict[str, ModelHealth]
+
+    def __init__(
+        self,
+        tiers: Optional[dict[str, list[str]]] = None,
+        fallbacks: Optional[dict[str, str]] = None,
+        slo: Optional[float] = None,
+        max_error_rate: float = 0.5,
+        probe_interval: float = 30.0,
+    ):
+        self.tiers = dict(DEFAULT_TIERS if tiers is None else tiers)
+        for tier, models in self.tiers.items():
+            if not models:
+                raise ValueError(f"Tier {tier} has no models.")
+        self.fallbacks = fallbacks or {}
+        self.slo = slo
+        self.max_error_rate = max_error_rate
+        self.probe_interval = probe_interval
+        self._health = {}
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """
+        Reads the configuration from the environment:
+
+        - SOCRATIC_LLM_TIERS, a JSON object mapping tier names to lists of models, overriding the
+          default tiers, e.g. '{"fast": ["gpt-3.5-turbo-0125"]}';
+        - SOCRATIC_LLM_FALLBACKS, a JSON object mapping models to their fallbacks;
+        - SOCRATIC_LLM_SLO, the p95 latency in seconds above which a model is diverted;
+        - SOCRATIC_LLM_MAX_ERROR_RATE, the error rate above which a model is diverted;
+        - SOCRATIC_LLM_PROBE_INTERVAL, the seconds between probes of a diverted model.
+        """
+        tiers = dict(DEFAULT_TIERS)
+        overrides = os.getenv("SOCRATIC_LLM_TIERS")
+        if overrides:
+            tiers.update(json.loads(overrides))
+        fallbacks = os.getenv("SOCRATIC_LLM_FALLBACKS")
+        slo = os.getenv("SOCRATIC_LLM_SLO")
+        return cls(
+            tiers,
+            fallbacks=json.loads(fallbacks) if fallbacks else None,
+            slo=None if slo is None else float(slo),
+            max_error_rate=float(os.getenv("SOCRATIC_LLM_MAX_ERROR_RATE", "0.5")),
+            probe_interval=float(os.getenv("SOCRATIC_LLM_PROBE_INTERVAL", "30")),
+        )
+
+    def models(self, tier: Optional[str] = None) -> list[str]:
+        """
+        Returns the models to use for a tier, or for the current one, cheapest first. Diverted
+        models are replaced by their fallbacks, except for probes.
+        """
+        tier = tier or current_model_tier()
+        models = self.tiers.get(tier)
+        if models is None:
+            raise ValueError(f"Unknown model tier {tier}.")
+        if not self.fallbacks:
+            return models
+        routed: list[str] = []
+        for model in models:
+            model = self._route(model)
+            if model not in routed:
+                routed.append(model)
+        return routed
+
+    @contextmanager
+    def track(self, model: str) -> Iterator[None]:
+        """
+        Records the latency of a call to the given model, and whether it failed with a transport
+        error. Other errors, e.g. invalid outputs, are not the provider's fault.
+        """
+        health = self._get_health(model)
+        call_id = health.start()
+        succeeded = False
+        failed = False
+        try:
+            yield
+            succeeded = True
+        except TRANSPORT_ERRORS:
+            failed = True
+            raise
+        finally:
+            latency = health.finish(call_id, failed)
+            if health.diverted and succeeded and (self.slo is None or latency <= self.slo):
+                self._restore(model, health, f"probe succeeded in {latency:.1f}s")
+
+    def as_dict(self) -> dict[str, Any]:
+        """Returns the health of each model called."""
+        return {model: health.as_dict() for model, health in self._health.items()}
+
+    def _get_health(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = ModelHealth()
+        return health
+
+    def _route(self, model: str) -> str:
+        fallback = self.fallbacks.get(model)
+        if fallback is None:
+            return model
+        health = self._get_health(model)
+        if not health.diverted:
+            reason = health.breach(self.slo, self.max_error_rate)
+            if reason is None:
+                return model
+            health.diverted = True
+            health.next_probe = monotonic() + self.probe_interval
+            self._log_route(model, fallback, True, reason)
+            return fallback
+        if monotonic() >= health.next_probe:
+            health.next_probe = monotonic() + self.probe_interval
+            return model
+        return fallback
+
+    def _restore(self, model: str, health: ModelHealth, reason: str):
+        health.diverted = False
+        health.reset()
+        fallback = self.fallbacks.get(model)
+        if fallback is not None:
+            self._log_route(model, fallback, False, reason)
+
+    def _log_route(self, model: str, fallback: str, diverted: bool, reason: str):
+        log_event(
+            LLMModelRouteChangedEvent(
+                id=str(uuid4()), model=model, fallback=fallback, diverted=diverted, reason=reason
+            )
+        )
+
+
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Returns the process-wide router, configured from the environment."""
+    global _model_router  # pylint: disable=global-statement
+    if _model_router is None:
+        _model_router = ModelRouter.from_env()
+    return _model_router
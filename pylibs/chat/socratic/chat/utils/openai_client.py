@@ -0,0 +1,157 @@
+"""
+Provides OpenAI clients shared by every chat model in the process.
+
+An httpx client, and thus its connection pool, is bound to the event loop it was first used in.
+The pool therefore keeps one async client per event loop, so that connections are kept alive and
+reused across calls instead of paying a TLS handshake every time.
+"""
+
+import os
+from asyncio import AbstractEventLoop
+from asyncio import get_running_loop
+from typing import Any
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+import httpx
+import openai
+from pydantic import BaseModel
+
+
+class OpenAIClientConfig(BaseModel):
+    """
+    Configures the HTTP connection pool of the shared clients. HTTP/2 requires the h2 package.
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls) -> "OpenAIClientConfig":
+        """
+        Reads the config from SOCRATIC_HTTP_MAX_CONNECTIONS, SOCRATIC_HTTP_MAX_KEEPALIVE,
+        SOCRATIC_HTTP_KEEPALIVE_EXPIRY and SOCRATIC_HTTP2, using defaults for unset ones.
+        """
+        config = cls()
+        return cls(
+            max_connections=int(
+                os.getenv("SOCRATIC_HTTP_MAX_CONNECTIONS", str(config.max_connections))
+            ),
+            max_keepalive_connections=int(
+                os.getenv("SOCRATIC_HTTP_MAX_KEEPALIVE", str(config.max_keepalive_connections))
+            ),
+            keepalive_expiry=float(
+                os.getenv("SOCRATIC_HTTP_KEEPALIVE_EXPIRY", str(config.keepalive_expiry))
+            ),
+            http2=os.getenv("SOCRATIC_HTTP2", "") == "1",
+        )
+
+
+class OpenAIClientStats:
+    """
+    Counts requests and connections, to verify that connections are reused.
+
+    A request either opens a new connection or reuses a kept-alive one. Chain counters track the
+    reuse of chains by `SocraticChatModel`.
+    """
+
+    requests: int
+    connections_opened: int
+    tls_handshakes: int
+    chain_hits: int
+    chain_misses: int
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.chain_hits = 0
+        self.chain_misses = 0
+
+    @property
+    def connections_reused(self) -> int:
+        """Returns the number of requests sent over a kept-alive connection."""
+        return self.requests - self.connections_opened
+
+    def as_dict(self) -> dict[str, int]:
+        """Returns all counters."""
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "tls_handshakes": self.tls_handshakes,
+            "chain_hits": self.chain_hits,
+            "chain_misses": self.chain_misses,
+        }
+
+
+class OpenAIClientPool:
+    """Creates the shared clients lazily, one async client per event loop."""
+
+    config: OpenAIClientConfig
+    stats: OpenAIClientStats
+
+    _async_clients: WeakKeyDictionary[AbstractEventLoop, openai.AsyncOpenAI]
+    _sync_client: Optional[openai.OpenAI]
+
+    def __init__(self, config: OpenAIClientConfig):
+        self.config = config
+        self.stats = OpenAIClientStats()
+        self._async_clients = WeakKeyDictionary()
+        self._sync_client = None
+
+    def async_client(self) -> openai.AsyncOpenAI:
+        """Returns the async client of the running event loop."""
+        loop = get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=self._limits(),
+                http2=self.config.http2,
+                event_hooks={"request": [self._trace_request]},
+            )
+            client = openai.AsyncOpenAI(
+                base_url=os.getenv("OPENAI_API_BASE") or None, http_client=http_client
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def sync_client(self) -> openai.OpenAI:
+        """Returns the sync client. Chat models require one, although only async calls are made."""
+        if self._sync_client is None:
+            http_client = httpx.Client(limits=self._limits(), http2=self.config.http2)
+            self._sync_client = openai.OpenAI(
+                base_url=os.getenv("OPENAI_API_BASE") or None, http_client=http_client
+            )
+        return self._sync_client
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.config.max_connections,
+            max_keepalive_connections=self.config.max_keepalive_connections,
+            keepalive_expiry=self.config.keepalive_expiry,
+        )
+
+    async def _trace_request(self, request: httpx.Request):
+        self.stats.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, _info: dict[str, Any]):
+        # See the "trace" request extension of httpcore.
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            self.stats.tls_handshakes += 1
+
+
+_pool: Optional[OpenAIClientPool] = None
+
+
+def get_openai_client_pool() -> OpenAIClientPool:
+    """Returns the process-wide pool, configured from the environment on first use."""
+    global _pool  # pylint: disable=global-statement
+    if _pool is None:
+        _pool = OpenAIClientPool(OpenAIClientConfig.from_env())
+    return _pool
@@ -0,0 +1,152 @@
+"""
+Provides incremental validation of JSON outputs against a pydantic model, while they stream.
+
+A response going off-schema in its first tokens is detected there, instead of after the whole
+generation. Validation is conservative: the last entry of every unfinished object or list may
+still change, so it is only checked for what it can still become, e.g. a string must remain a
+prefix of an enum value. Everything else is validated as soon as it is complete. Model validators
+only run on complete objects.
+"""
+
+from enum import Enum
+from functools import lru_cache
+from types import UnionType
+from typing import Any
+from typing import Generic
+from typing import TypeVar
+from typing import Union
+from typing import get_args
+from typing import get_origin
+
+from pydantic import BaseModel
+from pydantic import TypeAdapter
+from pydantic import ValidationError
+from pydantic_core import from_json
+
+T = TypeVar("T", bound=BaseModel)
+
+# Parsing is only worth it once the output may have completed a value.
+_STRUCTURAL_CHARS = frozenset(',:[]{}"')
+
+
+class PartialJSONError(ValueError):
+    """Raised as soon as a streamed output can no longer become valid."""
+
+
+class PartialJSONValidator(Generic[T]):
+    """
+    Accumulates chunks of a JSON output, and validates what is known so far after each of them.
+    """
+
+    model_cls: type[T]
+
+    _buffer: list[str]
+    _partial: dict[str, Any]
+
+    def __init__(self, model_cls: type[T]):
+        self.model_cls = model_cls
+        self._buffer = []
+        self._partial = {}
+
+    @property
+    def partial(self) -> dict[str, Any]:
+        """Returns the output parsed so far. Its last entries may still change."""
+        return self._partial
+
+    @property
+    def text(self) -> str:
+        """Returns the output received so far."""
+        return "".join(self._buffer)
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Adds a chunk, and returns whether the parsed output may have changed.
+
+        Raises:
+            PartialJSONError: If the output can no longer become valid.
+        """
+        self._buffer.append(chunk)
+        if _STRUCTURAL_CHARS.isdisjoint(chunk):
+            return False
+        text = self.text
+        try:
+            partial = from_json(text, allow_partial="trailing-strings")
+        except ValueError as exc:
+            raise PartialJSONError(f"Invalid JSON: {exc}") from exc
+        if not isinstance(partial, dict):
+            raise PartialJSONError(f"Expected an object, got {text[:40]!r}.")
+        _check_partial(self.model_cls, partial, path="")
+        self._partial = partial
+        return True
+
+    def finish(self) -> T:
+        """Validates the complete output."""
+        return self.model_cls.model_validate_json(self.text)
+
+
+@lru_cache(maxsize=None)
+def _adapter(annotation: Any) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+def _check_complete(annotation: Any, value: Any, path: str):
+    try:
+        _adapter(annotation).validate_python(value)
+    except ValidationError as exc:
+        raise PartialJSONError(f"Invalid value at {path or 'root'}: {exc}") from exc
+
+
+def _check_partial(annotation: Any, value: Any, path: str):
+    # Checks a value which may still grow, i.e. the last one on the path being generated.
+    origin = get_origin(annotation)
+    if origin in (Union, UnionType):
+        args = get_args(annotation)
+        if value is None and type(None) in args:
+            return
+        errors = []
+        for arg in args:
+            try:
+                _check_partial(arg, value, path)
+                return
+            except PartialJSONError as exc:
+                errors.append(str(exc))
+        raise PartialJSONError("; ".join(errors))
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        if not isinstance(value, dict):
+            raise PartialJSONError(f"Expected an object at {path or 'root'}.")
+        items = list(value.items())
+        for i, (key, item) in enumerate(items):
+            field = annotation.model_fields.get(key)
+            if field is None:
+                continue
+            item_path = f"{path}.{key}" if path else key
+            if i + 1 < len(items):
+                _check_complete(field.annotation, item, item_path)
+            else:
+                _check_partial(field.annotation, item, item_path)
+        return
+
+    if origin is list:
+        if not isinstance(value, list):
+            raise PartialJSONError(f"Expected a list at {path}.")
+        (item_annotation,) = get_args(annotation)
+        for i, item in enumerate(value):
+            item_path = f"{path}[{i}]"
+            if i + 1 < len(value):
+                _check_complete(item_annotation, item, item_path)
+            else:
+                _check_partial(item_annotation, item, item_path)
+        return
+
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        if not isinstance(value, str) or not any(
+            str(member.value).startswith(value) for member in annotation
+        ):
+            raise PartialJSONError(f"Invalid {annotation.__name__} at {path}: {value!r}.")
+        return
+
+    if annotation is str and not isinstance(value, str):
+        raise PartialJSONError(f"Expected a string at {path}.")
+    # Other values, e.g. numbers, may be cut anywhere, and are checked once complete.
+
@@ -0,0 +1,58 @@
+"""Provides a registry of compiled chat prompt templates."""
+
+from collections import OrderedDict
+from typing import Sequence
+
+from langchain.prompts import ChatPromptTemplate
+
+PromptMessages = tuple[tuple[str, str], ...]
+PromptKey = tuple[PromptMessages, tuple[tuple[str, str], ...]]
+
+
+class PromptRegistry:
+    """
+    Compiles chat prompt templates once, and returns the same template afterwards.
+
+    Templates are keyed by their messages and partial variables, so any edit of the prompt set, or
+    a different background, compiles a new template, while unchanged prompts are shared across
+    turns and conversations. Since `SocraticChatModel` reuses its chains per template, shared
+    templates also skip building chains. Returned templates must not be mutated.
+    """
+
+    max_size: int
+    hits: int
+    misses: int
+
+    _templates: OrderedDict[PromptKey, ChatPromptTemplate]
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+
+    def get(self, messages: Sequence[tuple[str, str]], **partials: str) -> ChatPromptTemplate:
+        """Returns the template of the given (role, template) messages, with partials applied."""
+        key = (tuple(messages), tuple(sorted(partials.items())))
+        template = self._templates.get(key)
+        if template is not None:
+            self.hits += 1
+            self._templates.move_to_end(key)
+            return template
+
+        self.misses += 1
+        template = ChatPromptTemplate.from_messages(list(messages))
+        if partials:
+            template = template.partial(**partials)
+        self._templates[key] = template
+        if len(self._templates) > self.max_size:
+            self._templates.popitem(last=False)
+        return template
+
+
+prompt_registry = PromptRegistry()
+
+
+def compile_chat_prompt(messages: Sequence[tuple[str, str]], **partials: str) -> ChatPromptTemplate:
+    """Returns a template from the process-wide registry, compiling it on first use."""
+    return prompt_registry.get(messages, **partials)
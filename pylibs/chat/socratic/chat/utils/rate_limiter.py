@@ -0,0 +1,396 @@
+"""
+Provides a scheduler keeping LLM calls within the request and token rates of the provider.
+
+Without it, concurrent conversations fire calls independently, and all get 429s at once when the
+rates are exceeded. The scheduler holds calls in a priority queue instead, until token buckets for
+requests per minute and tokens per minute allow them. Buckets are kept in memory, or in a SQLite
+file to share the rates across the workers on a host, accessed from a worker thread so that
+waiting for the file lock never blocks the event loop. Each event loop has its own queue, e.g.
+with `asyncio.run` per request or in tests, while buckets are shared.
+"""
+
+import asyncio
+import heapq
+import os
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from dataclasses import field
+from enum import IntEnum
+from itertools import count
+from threading import Lock
+from time import monotonic
+from time import perf_counter
+from time import time
+from typing import Any
+from typing import Iterator
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+from .tokens import count_tokens
+
+
+class Priority(IntEnum):
+    """Priorities of LLM calls. Lower values are served first."""
+
+    INTERACTIVE = 0
+    BATCH = 10
+
+
+_priority_var = ContextVar[int]("_llm_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def with_llm_priority(priority: int) -> Iterator[None]:
+    """
+    Temporarily sets the priority of the LLM calls made within, e.g. `Priority.BATCH` for
+    automated runs, so that they yield to interactive conversations.
+
+    Args:
+        priority: The priority. Lower values are served first.
+
+    Yields:
+        None
+    """
+
+    saved_token = _priority_var.set(priority)
+    try:
+        yield
+    finally:
+        _priority_var.reset(saved_token)
+
+
+class TokenBucket:
+    """Holds up to `capacity` tokens, refilled at `rate` tokens per second."""
+
+    capacity: float
+    rate: float
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+
+    def try_take(self, amount: float) -> float:
+        """
+        Takes the given amount if available, and returns 0. Otherwise, takes nothing and returns
+        the number of seconds until the amount is available. Amounts are capped to the capacity.
+        """
+        raise NotImplementedError
+
+    def put(self, amount: float):
+        """Returns tokens to the bucket. A negative amount takes tokens, possibly going below 0."""
+        raise NotImplementedError
+
+    async def atry_take(self, amount: float) -> float:
+        """Same as `try_take`, run in a worker thread."""
+        return await asyncio.to_thread(self.try_take, amount)
+
+    async def aput(self, amount: float):
+        """Same as `put`, run in a worker thread."""
+        await asyncio.to_thread(self.put, amount)
+
+
+class InMemoryTokenBucket(TokenBucket):
+    """Keeps tokens in process memory."""
+
+    _tokens: float
+    _updated_at: float
+
+    def __init__(self, capacity: float, rate: float):
+        super().__init__(capacity, rate)
+        self._tokens = capacity
+        self._updated_at = monotonic()
+
+    def try_take(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def put(self, amount: float):
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    # Tokens are in memory, so there is no I/O to move off the event loop.
+
+    async def atry_take(self, amount: float) -> float:
+        return self.try_take(amount)
+
+    async def aput(self, amount: float):
+        self.put(amount)
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """Keeps tokens in a SQLite file, which can be shared by all workers on a host."""
+
+    name: str
+
+    _connection: sqlite3.Connection
+    _lock: Lock
+
+    def __init__(self, path: str, name: str, capacity: float, rate: float):
+        super().__init__(capacity, rate)
+        self.name = name
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._lock = Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def try_take(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        with self._transaction() as tokens:
+            if tokens[0] >= amount:
+                tokens[0] -= amount
+                return 0.0
+            return (amount - tokens[0]) / self.rate
+
+    def put(self, amount: float):
+        with self._transaction() as tokens:
+            tokens[0] = min(self.capacity, tokens[0] + amount)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[list[float]]:
+        # Yields the refilled tokens in a mutable list, and writes them back.
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time()
+                row = self._connection.execute(
+                    "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                stored, updated_at = row if row is not None else (self.capacity, now)
+                tokens = [min(self.capacity, stored + max(0.0, now - updated_at) * self.rate)]
+                yield tokens
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO token_buckets VALUES (?, ?, ?)",
+                    (self.name, tokens[0], now),
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+
+class RateLimiterStats:
+    """Tracks the queue of the scheduler."""
+
+    queue_depth: int
+    requests: int
+    waited_requests: int
+    total_wait_seconds: float
+    max_wait_seconds: float
+    estimated_tokens: int
+    used_tokens: int
+
+    def __init__(self):
+        self.queue_depth = 0
+        self.requests = 0
+        self.waited_requests = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.estimated_tokens = 0
+        self.used_tokens = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Returns all metrics."""
+        return {
+            "queue_depth": self.queue_depth,
+            "requests": self.requests,
+            "waited_requests": self.waited_requests,
+            "total_wait_seconds": self.total_wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+            "mean_wait_seconds": self.total_wait_seconds / max(1, self.requests),
+            "estimated_tokens": self.estimated_tokens,
+            "used_tokens": self.used_tokens,
+        }
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class _Queue:
+    # The waiters and the dispatcher of one event loop.
+    waiters: list[_Waiter] = field(default_factory=list)
+    dispatcher: Optional[asyncio.Task] = None
+
+
+class RateLimiter:
+    """
+    Admits LLM calls once both buckets allow them, in priority order, then first come first served.
+
+    Calls are admitted with an estimate of their tokens: the prompt tokens, counted with tiktoken
+    if installed, plus the requested maximum of completion tokens, or `completion_tokens` if
+    unset. Once a call completes, `settle` corrects the estimate with the actual usage, counted
+    with `count_used_tokens` if not reported, e.g. for streamed calls. Lower priorities wait as
+    long as higher priorities are queued.
+    """
+
+    request_bucket: Optional[TokenBucket]
+    token_bucket: Optional[TokenBucket]
+    completion_tokens: int
+    stats: RateLimiterStats
+
+    _queues: WeakKeyDictionary[asyncio.AbstractEventLoop, _Queue]
+    _seq: Iterator[int]
+
+    def __init__(
+        self,
+        request_bucket: Optional[TokenBucket],
+        token_bucket: Optional[TokenBucket],
+        completion_tokens: int = 500,
+    ):
+        self.request_bucket = request_bucket
+        self.token_bucket = token_bucket
+        self.completion_tokens = completion_tokens
+        self.stats = RateLimiterStats()
+        self._queues = WeakKeyDictionary()
+        self._seq = count()
+
+    def estimate_tokens(
+        self, message_dicts: list[dict[str, Any]], model: str, max_tokens: Optional[int]
+    ) -> int:
+        """Estimates the tokens of a call, counting the completion as its maximum."""
+        return _count_prompt_tokens(message_dicts, model) + (max_tokens or self.completion_tokens)
+
+    def count_used_tokens(
+        self, message_dicts: list[dict[str, Any]], model: str, completion: str
+    ) -> int:
+        """Counts the tokens of a call given its completion, for calls not reporting their usage."""
+        return _count_prompt_tokens(message_dicts, model) + count_tokens(completion, model)
+
+    async def acquire(self, tokens: int, priority: Optional[int] = None):
+        """
+        Waits until a call of the given tokens is admitted. The priority defaults to the one set
+        by `with_llm_priority`.
+        """
+        if priority is None:
+            priority = _priority_var.get()
+        self.stats.requests += 1
+        self.stats.estimated_tokens += tokens
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(loop)
+        if queue is None:
+            queue = self._queues[loop] = _Queue()
+        if not queue.waiters and await self._try_take(tokens) == 0:
+            return
+
+        start = perf_counter()
+        future = loop.create_future()
+        waiter = _Waiter(priority, next(self._seq), tokens, future)
+        heapq.heappush(queue.waiters, waiter)
+        self.stats.queue_depth += 1
+        if queue.dispatcher is None or queue.dispatcher.done():
+            queue.dispatcher = loop.create_task(self._dispatch(queue))
+        try:
+            await waiter.future
+        finally:
+            waited = perf_counter() - start
+            self.stats.waited_requests += 1
+            self.stats.total_wait_seconds += waited
+            self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+
+    async def settle(self, estimated: int, used: Optional[int]):
+        """Corrects the tokens taken for a completed call, given its actual usage if known."""
+        if used is None:
+            return
+        self.stats.used_tokens += used
+        if self.token_bucket is not None:
+            await self.token_bucket.aput(estimated - used)
+
+    async def _dispatch(self, queue: _Queue):
+        while queue.waiters:
+            waiter = queue.waiters[0]
+            if waiter.future.done():
+                # Cancelled while waiting.
+                heapq.heappop(queue.waiters)
+                self.stats.queue_depth -= 1
+                continue
+            wait = await self._try_take(waiter.tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            heapq.heappop(queue.waiters)
+            self.stats.queue_depth -= 1
+            waiter.future.set_result(None)
+
+    async def _try_take(self, tokens: int) -> float:
+        if self.request_bucket is not None:
+            wait = await self.request_bucket.atry_take(1)
+            if wait > 0:
+                return wait
+        if self.token_bucket is not None:
+            wait = await self.token_bucket.atry_take(tokens)
+            if wait > 0:
+                if self.request_bucket is not None:
+                    await self.request_bucket.aput(1)
+                return wait
+        return 0.0
+
+
+def _count_prompt_tokens(message_dicts: list[dict[str, Any]], model: str) -> int:
+    # Every message costs a few tokens of formatting on top of its content.
+    return sum(count_tokens(str(x.get("content") or ""), model) + 4 for x in message_dicts)
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_loaded = False
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    Returns the process-wide scheduler, or None if no rate is configured. Configured by:
+
+    - SOCRATIC_LLM_RPM and SOCRATIC_LLM_TPM, the allowed requests and tokens per minute;
+    - SOCRATIC_LLM_RATE_LIMIT_STORE, e.g. "sqlite:///path/to/buckets.db" to share the rates
+      across processes;
+    - SOCRATIC_LLM_COMPLETION_TOKENS, the estimate of completion tokens when no maximum is set.
+    """
+    global _limiter, _limiter_loaded  # pylint: disable=global-statement
+    if not _limiter_loaded:
+        _limiter = _rate_limiter_from_env()
+        _limiter_loaded = True
+    return _limiter
+
+
+def _rate_limiter_from_env() -> Optional[RateLimiter]:
+    rpm = os.getenv("SOCRATIC_LLM_RPM")
+    tpm = os.getenv("SOCRATIC_LLM_TPM")
+    if not rpm and not tpm:
+        return None
+    store = os.getenv("SOCRATIC_LLM_RATE_LIMIT_STORE", "memory")
+    if store != "memory" and not store.startswith("sqlite:///"):
+        raise ValueError(f"Unknown rate limit store {store}.")
+
+    def bucket(name: str, per_minute: Optional[str]) -> Optional[TokenBucket]:
+        if not per_minute:
+            return None
+        capacity = float(per_minute)
+        if store == "memory":
+            return InMemoryTokenBucket(capacity, capacity / 60)
+        return SQLiteTokenBucket(store.removeprefix("sqlite:///"), name, capacity, capacity / 60)
+
+    return RateLimiter(
+        bucket("requests", rpm),
+        bucket("tokens", tpm),
+        completion_tokens=int(os.getenv("SOCRATIC_LLM_COMPLETION_TOKENS", "500")),
+    )
@@ -0,0 +1,88 @@
+"""
+Provides incremental rendering of growing sequences, e.g. lists serialized into every prompt.
+
+A sequence serialized on every turn, while it only grows, need not be serialized from scratch each
+time. A `RenderCache` remembers the rendering of each item, found by its content, so a sequence
+only renders its new items. Items are matched by content rather than identity, since replays parse
+recorded results into new objects on every step.
+"""
+
+import json
+from typing import Callable
+from typing import Generic
+from typing import Hashable
+from typing import Iterable
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class RenderCache(Generic[T]):
+    """
+    Renders sequences by joining their rendered items. Items with the same `key_item` are rendered
+    once, so keys must capture everything rendered. The last `maxsize` renderings are kept.
+    """
+
+    render_item: Callable[[T], str]
+    key_item: Callable[[T], Hashable]
+    separator: str
+    maxsize: int
+    rendered_items: int
+
+    # In insertion order, so the oldest renderings are evicted first.
+    _renderings: dict[Hashable, str]
+
+    def __init__(
+        self,
+        render_item: Callable[[T], str],
+        key_item: Callable[[T], Hashable],
+        separator: str = "",
+        maxsize: int = 1024,
+    ):
+        self.render_item = render_item
+        self.key_item = key_item
+        self.separator = separator
+        self.maxsize = maxsize
+        self.rendered_items = 0
+        self._renderings = {}
+
+    def render(self, items: Iterable[T]) -> str:
+        """Returns the rendered items, joined by the separator."""
+        texts = []
+        for item in items:
+            key = self.key_item(item)
+            text = self._renderings.get(key)
+            if text is None:
+                text = self._renderings[key] = self.render_item(item)
+                self.rendered_items += 1
+                if len(self._renderings) > self.maxsize:
+                    del self._renderings[next(iter(self._renderings))]
+            texts.append(text)
+        return self.separator.join(texts)
+
+
+def _model_key(model: BaseModel) -> Hashable:
+    # Serialized by pydantic-core, which is several times faster than `json.dumps`.
+    return type(model), model.model_dump_json()
+
+
+class JSONListSerializer:
+    """
+    Serializes lists of models exactly as `json.dumps([x.model_dump() for x in items])`, reusing
+    the serialization of items serialized before, see `RenderCache`.
+    """
+
+    _cache: RenderCache[BaseModel]
+
+    def __init__(self, maxsize: int = 1024):
+        self._cache = RenderCache(lambda x: json.dumps(x.model_dump()), _model_key, ", ", maxsize)
+
+    @property
+    def rendered_items(self) -> int:
+        """Returns the number of items serialized so far, i.e. not reused."""
+        return self._cache.rendered_items
+
+    def __call__(self, items: Iterable[BaseModel]) -> str:
+        return f"[{self._cache.render(items)}]"
@@ -0,0 +1,94 @@
+"""Provides single-flight deduplication of concurrent identical calls."""
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable
+from typing import Callable
+from typing import Generic
+from typing import Hashable
+from typing import Iterator
+from typing import TypeVar
+
+V = TypeVar("V")
+
+_bypass_var = ContextVar[bool]("_single_flight_bypass", default=False)
+
+
+@contextmanager
+def without_single_flight() -> Iterator[None]:
+    """
+    Temporarily makes calls within run on their own, e.g. for hedged requests, which must not be
+    coalesced into the request they duplicate.
+
+    Yields:
+        None
+    """
+
+    saved_token = _bypass_var.set(True)
+    try:
+        yield
+    finally:
+        _bypass_var.reset(saved_token)
+
+
+@dataclass
+class _Flight(Generic[V]):
+    future: asyncio.Future[V]
+    waiters: int = 0
+
+
+class SingleFlight(Generic[V]):
+    """
+    Runs at most one call per key at a time. Callers arriving while a call with the same key is in
+    flight await its result instead of making their own call.
+
+    The call runs in its own task. A cancelled caller only cancels it if no other caller awaits
+    it. Only in-flight calls are shared: results are forgotten as soon as they complete, so
+    combine it with a cache to reuse them afterwards.
+    """
+
+    calls: int
+    coalesced: int
+
+    _in_flight: dict[Hashable, _Flight[V]]
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[V]]) -> V:
+        """Returns the result of `func`, or of the call in flight with the same key."""
+        if _bypass_var.get():
+            self.calls += 1
+            return await func()
+
+        flight = self._in_flight.get(key)
+        if flight is None or flight.future.get_loop() is not asyncio.get_running_loop():
+            self.calls += 1
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._in_flight[key] = flight
+            flight.future.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.future)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.future.done():
+                flight.future.cancel()
+
+    def as_dict(self) -> dict[str, int]:
+        """Returns the number of calls made, and of calls coalesced into them."""
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+    def _forget(self, key: Hashable, flight: _Flight[V]):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+        if not flight.future.cancelled():
+            # Avoid warnings about exceptions never retrieved when every caller went away.
+            flight.future.exception()
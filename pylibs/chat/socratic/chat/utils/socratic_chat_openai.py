@@ -1,7 +1,13 @@
 """Provides SocraticChatOpenAI."""
 
+import json
 import os
+from collections import OrderedDict
 from typing import Any
+from typing import AsyncGenerator
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
 from typing import Optional
 from typing import TypeVar
 from typing import cast
@@ -12,9 +18,15 @@ from langchain.callbacks import PromptLayerCallbackHandler
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import BaseMessage
+from langchain.schema.messages import AIMessage
+from langchain.schema.messages import AIMessageChunk
+from langchain.schema.output import ChatGeneration
+from langchain.schema.output import ChatGenerationChunk
 from langchain.schema.output import ChatResult
 from langchain.schema.output_parser import StrOutputParser
+from langchain.schema.runnable import Runnable
 from pydantic import BaseModel
+from pydantic import ValidationError
 
 try:
     import promptlayer
@@ -25,8 +37,29 @@ except ImportError:
 
 from ..event_logging import Event
 from ..event_logging import EventPhase
+from ..event_logging import LazyPayload
 from ..event_logging import event_model
 from ..event_logging import log_event
+from .call_policy import CallPolicy
+from .call_policy import LatencyTracker
+from .call_policy import call_with_policy
+from .fake_chat import FakeChatBackend
+from .fake_chat import fake_chat_backend_from_env
+from .llm_cache import DeferredResponseWrites
+from .llm_cache import LLMResponseCache
+from .llm_cache import defer_response_writes
+from .llm_cache import llm_request_key
+from .llm_cache import llm_response_cache_from_env
+from .model_routing import LLMModelEscalatedEvent
+from .model_routing import ModelRouter
+from .model_routing import current_model_tier
+from .model_routing import get_model_router
+from .openai_client import get_openai_client_pool
+from .partial_json import PartialJSONError
+from .partial_json import PartialJSONValidator
+from .rate_limiter import RateLimiter
+from .rate_limiter import get_rate_limiter
+from .single_flight import SingleFlight
 
 
 @event_model("chatgpt_call_start", phase=EventPhase.START)
@@ -37,7 +70,10 @@ class ChatGPTCallStartEvent(Event):
 
     llm_model_name: str
     llm_model_kwargs: dict[str, Any]
-    llm_input: list
+    # A list of messages, serialized lazily.
+    llm_input: LazyPayload
+    # Whether the response is served from the LLM response cache.
+    cached: bool = False
 
     def ignored_fields_for_str(self) -> list[str]:
         return super().ignored_fields_for_str() + ["llm_input"]
@@ -61,16 +97,44 @@ class ChatGPTCallEndEvent(Event):
 
     # renamed to make Pydantic happy
     llm_model_name: str
-    token_usage: ChatGPTTokenUsage
+    # Not reported for streamed calls.
+    token_usage: Optional[ChatGPTTokenUsage] = None
     system_fingerprint: Optional[str] = None
-    llm_output: list
+    # A list of messages, serialized lazily.
+    llm_output: LazyPayload
+    cached: bool = False
+
+    def ignored_fields_for_str(self) -> list[str]:
+        return super().ignored_fields_for_str() + ["llm_output"]
+
+
+@event_model("chatgpt_output_rejected")
+class ChatGPTOutputRejectedEvent(Event):
+    """
+    An event to track a streamed JSON output rejected as soon as it went off-schema.
+    """
+
+    llm_model_name: str
+    error: str
+    # The output generated so far, serialized lazily.
+    llm_output: LazyPayload
 
     def ignored_fields_for_str(self) -> list[str]:
         return super().ignored_fields_for_str() + ["llm_output"]
 
 
 class SocraticChatOpenAI(ChatOpenAI):
-    """A ChatOpenAI wrapper that logs token and time usage."""
+    """
+    A ChatOpenAI wrapper that logs token and time usage.
+
+    Calls are served from `response_cache` when given, streamed ones as a single chunk. Other
+    calls wait for `rate_limiter` to admit them when given. With `single_flight`, concurrent
+    identical non-streamed calls share one request, which is logged once.
+    """
+
+    response_cache: Optional[LLMResponseCache] = None
+    rate_limiter: Optional[RateLimiter] = None
+    single_flight: Optional[SingleFlight] = None
 
     @classmethod
     def is_lc_serializable(cls) -> bool:
@@ -85,31 +149,177 @@ class SocraticChatOpenAI(ChatOpenAI):
         **kwargs: Any,
     ) -> ChatResult:
         """Call ChatOpenAI agenerate."""
+        should_stream = stream if stream is not None else self.streaming
+        if should_stream:
+            # Streamed calls are logged by _astream.
+            return await super()._agenerate(messages, stop, run_manager, stream=stream, **kwargs)
+
+        request_key = None
+        if self.response_cache is not None or self.single_flight is not None:
+            request_key = self._request_key(messages, stop, kwargs)
+        if self.single_flight is None or request_key is None:
+            return await self._agenerate_once(messages, stop, run_manager, request_key, **kwargs)
+        return await self.single_flight.run(
+            request_key,
+            lambda: self._agenerate_once(messages, stop, run_manager, request_key, **kwargs),
+        )
+
+    async def _agenerate_once(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]],
+        run_manager: Optional[AsyncCallbackManagerForLLMRun],
+        request_key: Optional[str],
+        **kwargs: Any,
+    ) -> ChatResult:
+        cached_responses = None
+        if self.response_cache is not None and request_key is not None:
+            cached_responses = await self.response_cache.aget(request_key)
+
         call_id = uuid4()
         log_event(
             ChatGPTCallStartEvent(
                 id=str(call_id),
                 llm_model_name=self.model_name,
                 llm_model_kwargs=self.model_kwargs,
-                llm_input=[x.dict() for x in messages],
+                llm_input=LazyPayload(lambda: [x.dict() for x in messages]),
+                cached=cached_responses is not None,
             )
         )
 
-        generated_responses = await super()._agenerate(
-            messages, stop, run_manager, stream=stream, **kwargs
-        )
-        chatgpt_output = cast(dict[str, Any], generated_responses.llm_output)
+        if cached_responses is not None:
+            generated_responses = cached_responses
+        else:
+            estimated_tokens = await self._acquire_rate_limit(messages, stop)
+            generated_responses = await super()._agenerate(
+                messages, stop, run_manager, stream=False, **kwargs
+            )
+            if self.rate_limiter is not None:
+                token_usage = (generated_responses.llm_output or {}).get("token_usage") or {}
+                await self.rate_limiter.settle(estimated_tokens, token_usage.get("total_tokens"))
+            if self.response_cache is not None and request_key is not None:
+                await self.response_cache.aset(request_key, generated_responses)
+        # Responses recorded from streamed calls have no LLM output.
+        chatgpt_output = cast(dict[str, Any], generated_responses.llm_output or {})
         log_event(
             ChatGPTCallEndEvent(
                 id=str(call_id),
                 llm_model_name=self.model_name,
-                llm_output=[x.message.dict() for x in generated_responses.generations],
+                llm_output=LazyPayload(
+                    lambda: [x.message.dict() for x in generated_responses.generations]
+                ),
+                cached=cached_responses is not None,
                 **chatgpt_output,
             )
         )
 
         return generated_responses
 
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """Call ChatOpenAI astream."""
+        request_key = None
+        cached_responses = None
+        if self.response_cache is not None:
+            request_key = self._request_key(messages, stop, kwargs)
+            cached_responses = await self.response_cache.aget(request_key)
+
+        call_id = uuid4()
+        log_event(
+            ChatGPTCallStartEvent(
+                id=str(call_id),
+                llm_model_name=self.model_name,
+                llm_model_kwargs=self.model_kwargs,
+                llm_input=LazyPayload(lambda: [x.dict() for x in messages]),
+                cached=cached_responses is not None,
+            )
+        )
+
+        generation: Optional[ChatGenerationChunk] = None
+        if cached_responses is not None:
+            cached = cached_responses.generations[0]
+            generation = ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=cached.message.content,
+                    additional_kwargs=cached.message.additional_kwargs,
+                ),
+                generation_info=cached.generation_info,
+            )
+            yield generation
+            if run_manager:
+                await run_manager.on_llm_new_token(token=generation.text, chunk=generation)
+        else:
+            estimated_tokens = await self._acquire_rate_limit(messages, stop)
+            try:
+                async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                    generation = chunk if generation is None else generation + chunk
+                    yield chunk
+            finally:
+                # Streams report no usage, so it is counted, also for streams aborted early.
+                await self._settle_stream(messages, stop, estimated_tokens, generation)
+            # Only complete outputs are stored, so streams aborted early are not.
+            if self.response_cache is not None and request_key is not None and generation:
+                await self.response_cache.aset(request_key, self._to_result(generation))
+        log_event(
+            ChatGPTCallEndEvent(
+                id=str(call_id),
+                llm_model_name=self.model_name,
+                llm_output=LazyPayload(
+                    lambda: [] if generation is None else [generation.message.dict()]
+                ),
+                cached=cached_responses is not None,
+            )
+        )
+
+    def _request_key(
+        self, messages: list[BaseMessage], stop: Optional[list[str]], kwargs: dict[str, Any]
+    ) -> str:
+        # Streamed and non-streamed calls share keys, and so responses.
+        message_dicts, params = self._create_message_dicts(messages, stop)
+        params = {k: v for k, v in params.items() if k != "stream"}
+        return llm_request_key(message_dicts, {**params, **kwargs})
+
+    def _to_result(self, generation: ChatGenerationChunk) -> ChatResult:
+        # Like the results of streamed ChatOpenAI calls, it has no LLM output, so no token usage.
+        message = AIMessage(
+            content=generation.message.content,
+            additional_kwargs=generation.message.additional_kwargs,
+        )
+        info = generation.generation_info
+        return ChatResult(generations=[ChatGeneration(message=message, generation_info=info)])
+
+    async def _acquire_rate_limit(
+        self, messages: list[BaseMessage], stop: Optional[list[str]]
+    ) -> int:
+        # Returns the estimated tokens of the call, once admitted.
+        if self.rate_limiter is None:
+            return 0
+        message_dicts, params = self._create_message_dicts(messages, stop)
+        tokens = self.rate_limiter.estimate_tokens(
+            message_dicts, self.model_name, params.get("max_tokens")
+        )
+        await self.rate_limiter.acquire(tokens)
+        return tokens
+
+    async def _settle_stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]],
+        estimated_tokens: int,
+        generation: Optional[ChatGenerationChunk],
+    ):
+        if self.rate_limiter is None:
+            return
+        message_dicts, _ = self._create_message_dicts(messages, stop)
+        completion = "" if generation is None else generation.text
+        used = self.rate_limiter.count_used_tokens(message_dicts, self.model_name, completion)
+        await self.rate_limiter.settle(estimated_tokens, used)
+
     @property
     def _llm_type(self) -> str:
         return "socratic-openai-chat"
@@ -120,46 +330,286 @@ class SocraticChatOpenAI(ChatOpenAI):
 
 
 T = TypeVar("T", bound=BaseModel)
+U = TypeVar("U")
+
+
+# Shared by all chat models, since identical requests may come from different conversations.
+llm_single_flight = SingleFlight[ChatResult]()
+
+JSON_MODEL_KWARGS = {"response_format": {"type": "json_object"}}
+
+# Chains keep their prompts alive, so that prompt ids in cache keys are never reused.
+# Keyed by prompt id, model, client id, model kwargs and whether the chain streams.
+ChainKey = tuple[int, str, int, str, bool]
+ChainEntry = tuple[ChatPromptTemplate, Runnable]
 
 
 class SocraticChatModel:
-    """A convenient wrapper for both string and json output"""
+    """
+    A convenient wrapper for both string and json output
+
+    Calls go to OpenAI, unless a fake backend is configured, see `socratic.chat.utils.fake_chat`.
+    Responses are cached if SOCRATIC_LLM_CACHE is set, see `socratic.chat.utils.llm_cache`.
+    Concurrent identical requests are coalesced if SOCRATIC_LLM_SINGLE_FLIGHT is "1". They then
+    share one sample, even across conversations, so it is off by default.
+    `gen_string` and `gen_json` follow `policy`, see `socratic.chat.utils.call_policy`. Use
+    separate instances for chains needing different policies. With `stream_validation`,
+    `gen_json` streams outputs and aborts them as soon as they go off-schema, at the cost of
+    bypassing coalescing, which only applies to non-streamed calls. JSON outputs are only cached
+    once valid, so aborted and invalid outputs are not.
+    Unless `model` is given, each call uses the model tier of its chain, see
+    `socratic.chat.utils.model_routing`, and `gen_json` escalates invalid outputs up the tier.
+    Calls report their latency and transport errors to the router, which diverts models breaching
+    their SLO to their fallbacks. Streamed calls report the latency of the whole stream.
+    All instances share the clients of `socratic.chat.utils.openai_client`. Chains are reused per
+    prompt and model kwargs, so pass prompts built once rather than on every call.
+    """
 
-    model: str
+    model: Optional[str]
+    router: Optional[ModelRouter]
+    fake_backend: Optional[FakeChatBackend]
+    response_cache: Optional[LLMResponseCache]
+    policy: CallPolicy
+    single_flight: bool
+    stream_validation: bool
+    max_chains: int
     _to_string = StrOutputParser()
 
-    def __init__(self, model: str = "gpt-4-turbo-preview") -> None:
+    _chains: OrderedDict[ChainKey, ChainEntry]
+    _chat_models: dict[tuple[str, int, str, bool], SocraticChatOpenAI]
+    _latency_trackers: dict[str, LatencyTracker]
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        router: Optional[ModelRouter] = None,
+        fake_backend: Optional[FakeChatBackend] = None,
+        response_cache: Optional[LLMResponseCache] = None,
+        policy: Optional[CallPolicy] = None,
+        stream_validation: Optional[bool] = None,
+        max_chains: int = 256,
+    ) -> None:
         self.model = model
+        self.router = router
+        self.fake_backend = fake_backend or fake_chat_backend_from_env()
+        self.response_cache = response_cache or llm_response_cache_from_env()
+        self.policy = policy or CallPolicy.from_env()
+        self.single_flight = os.getenv("SOCRATIC_LLM_SINGLE_FLIGHT", "") == "1"
+        if stream_validation is None:
+            stream_validation = os.getenv("SOCRATIC_LLM_STREAM_VALIDATION", "") == "1"
+        self.stream_validation = stream_validation
+        self.max_chains = max_chains
+        self._chains = OrderedDict()
+        self._chat_models = {}
+        self._latency_trackers = {}
 
     def _get_callbacks(self):
         callbacks = []
-        if promptlayer.api_key:
+        if promptlayer is not None and promptlayer.api_key:
             callbacks.append(PromptLayerCallbackHandler())
 
         return callbacks
 
+    def _get_router(self) -> ModelRouter:
+        return self.router or get_model_router()
+
+    def _models(self) -> list[str]:
+        if self.model is not None:
+            return [self.model]
+        return self._get_router().models()
+
+    def _get_chain(
+        self,
+        prompt: ChatPromptTemplate,
+        model: str,
+        model_kwargs: dict[str, Any],
+        streaming: bool = False,
+    ) -> Runnable:
+        pool = get_openai_client_pool()
+        async_client = pool.async_client()
+        kwargs_key = json.dumps(model_kwargs, sort_keys=True)
+        key = (id(prompt), model, id(async_client), kwargs_key, streaming)
+        entry = self._chains.get(key)
+        if entry is not None:
+            pool.stats.chain_hits += 1
+            self._chains.move_to_end(key)
+            return entry[1]
+
+        pool.stats.chain_misses += 1
+        chat_model_key = (model, id(async_client), kwargs_key, streaming)
+        chat_model = self._chat_models.get(chat_model_key)
+        if chat_model is None:
+            chat_model = SocraticChatOpenAI(
+                model=model,
+                model_kwargs=model_kwargs,
+                streaming=streaming,
+                response_cache=self.response_cache,
+                rate_limiter=get_rate_limiter(),
+                single_flight=llm_single_flight if self.single_flight else None,
+                client=pool.sync_client().chat.completions,
+                async_client=async_client.chat.completions,
+            )
+            if len(self._chat_models) >= self.max_chains:
+                self._chat_models.clear()
+            self._chat_models[chat_model_key] = chat_model
+        chain = prompt | chat_model | self._to_string
+        self._chains[key] = (prompt, chain)
+        if len(self._chains) > self.max_chains:
+            self._chains.popitem(last=False)
+        return chain
+
+    def _call(self, attempt: Callable[[], Awaitable[U]], kind: str) -> Awaitable[U]:
+        tracker = self._latency_trackers.get(kind)
+        if tracker is None:
+            tracker = self._latency_trackers[kind] = LatencyTracker()
+        return call_with_policy(self.policy, attempt, tracker)
+
     async def gen_string(self, prompt: ChatPromptTemplate, **kwargs) -> str:
         """Generate a string."""
-        chat_model = SocraticChatOpenAI(model=self.model, callbacks=self._get_callbacks())
-        chain = prompt | chat_model | self._to_string
-        chain_output = await chain.ainvoke(input=kwargs)
-        assert isinstance(chain_output, str)
-        return chain_output
+
+        async def attempt() -> str:
+            if self.fake_backend is not None:
+                return await self.fake_backend.gen_string(prompt, **kwargs)
+            model = self._models()[0]
+            chain = self._get_chain(prompt, model, {})
+            with self._get_router().track(model):
+                chain_output = await chain.ainvoke(
+                    kwargs, config={"callbacks": self._get_callbacks()}
+                )
+            assert isinstance(chain_output, str)
+            return chain_output
+
+        return await self._call(attempt, "string")
+
+    async def stream_string(self, prompt: ChatPromptTemplate, **kwargs) -> AsyncIterator[str]:
+        """
+        Generate a string, yielding chunks as they arrive.
+
+        Nothing is requested until the iteration starts, so the result can be passed directly to
+        `post_assistant_reply`.
+        """
+        if self.fake_backend is not None:
+            async for chunk in self.fake_backend.stream_string(prompt, **kwargs):
+                yield chunk
+            return
+        model = self._models()[0]
+        chain = self._get_chain(prompt, model, {}, streaming=True)
+        with self._get_router().track(model):
+            async for chunk in chain.astream(kwargs, config={"callbacks": self._get_callbacks()}):
+                assert isinstance(chunk, str)
+                yield chunk
 
     async def gen_json(self, prompt: ChatPromptTemplate, model_cls: type[T], **kwargs) -> T:
-        """Generate a JSON."""
-        chat_model = SocraticChatOpenAI(
-            model=self.model,
-            model_kwargs={"response_format": {"type": "json_object"}},
-            callbacks=self._get_callbacks(),
+        """
+        Generate a JSON. Invalid outputs are escalated to the next model of the tier, if any.
+        Otherwise, they count as failed attempts, and may be retried.
+        """
+
+        async def attempt() -> T:
+            if self.fake_backend is not None:
+                return await self.fake_backend.gen_json(prompt, model_cls, **kwargs)
+            models = self._models()
+            for i, model in enumerate(models[:-1]):
+                try:
+                    return await self._gen_json_with(prompt, model, model_cls, kwargs)
+                except (ValidationError, PartialJSONError) as exc:
+                    log_event(
+                        LLMModelEscalatedEvent(
+                            id=str(uuid4()),
+                            tier=current_model_tier(),
+                            from_model=model,
+                            to_model=models[i + 1],
+                            error=f"{type(exc).__name__}: {exc}",
+                        )
+                    )
+            return await self._gen_json_with(prompt, models[-1], model_cls, kwargs)
+
+        return await self._call(attempt, model_cls.__name__)
+
+    async def _gen_json_with(
+        self, prompt: ChatPromptTemplate, model: str, model_cls: type[T], kwargs: dict[str, Any]
+    ) -> T:
+        # Outputs are only cached once valid.
+        with defer_response_writes() as responses:
+            if self.stream_validation:
+                validator = PartialJSONValidator(model_cls)
+                with self._get_router().track(model):
+                    async for _ in self._stream_json(prompt, model, validator, kwargs):
+                        pass
+                parsed_result = validator.finish()
+                await responses.commit()
+                return parsed_result
+            chain = self._get_chain(prompt, model, JSON_MODEL_KWARGS)
+            with self._get_router().track(model):
+                chain_output = await chain.ainvoke(
+                    kwargs, config={"callbacks": self._get_callbacks()}
+                )
+            assert isinstance(chain_output, str)
+            try:
+                parsed_result = model_cls.model_validate_json(chain_output)
+            except Exception as exc:
+                print("An error occured when parsing. Raw output:")
+                print(chain_output)
+                raise exc
+            await responses.commit()
+            return parsed_result
+
+    async def stream_json(
+        self, prompt: ChatPromptTemplate, model_cls: type[T], **kwargs
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Generate a JSON, yielding the object parsed so far as it grows, so that early fields can be
+        acted upon before the rest is generated. The output is validated incrementally, and the
+        last object yielded is the validated result, dumped. Failures are not retried.
+        """
+        if self.fake_backend is not None:
+            result = await self.fake_backend.gen_json(prompt, model_cls, **kwargs)
+            yield result.model_dump(mode="json")
+            return
+        validator = PartialJSONValidator(model_cls)
+        model = self._models()[0]
+        responses = DeferredResponseWrites()
+        partials = self._stream_json(prompt, model, validator, kwargs)
+        with self._get_router().track(model):
+            while True:
+                # Only defer writes while streaming, not while the caller handles partials.
+                with defer_response_writes(responses):
+                    partial = await anext(partials, None)
+                if partial is None:
+                    break
+                yield partial
+        result = validator.finish()
+        await responses.commit()
+        yield result.model_dump(mode="json")
+
+    async def _stream_json(
+        self,
+        prompt: ChatPromptTemplate,
+        model: str,
+        validator: PartialJSONValidator,
+        kwargs: dict[str, Any],
+    ) -> AsyncIterator[dict[str, Any]]:
+        chain = self._get_chain(prompt, model, JSON_MODEL_KWARGS, streaming=True)
+        stream = cast(
+            AsyncGenerator[str, None],
+            chain.astream(kwargs, config={"callbacks": self._get_callbacks()}),
         )
-        chain = prompt | chat_model | self._to_string
-        chain_output = await chain.ainvoke(input=kwargs)
-        assert isinstance(chain_output, str)
         try:
-            parsed_result = model_cls.model_validate_json(chain_output)
-            return parsed_result
-        except Exception as exc:
-            print("An error occured when parsing. Raw output:")
-            print(chain_output)
-            raise exc
+            async for chunk in stream:
+                assert isinstance(chunk, str)
+                if validator.feed(chunk):
+                    yield validator.partial
+        except ValueError as exc:
+            text = validator.text
+            log_event(
+                ChatGPTOutputRejectedEvent(
+                    id=str(uuid4()),
+                    llm_model_name=model,
+                    error=f"{type(exc).__name__}: {exc}",
+                    llm_output=LazyPayload(lambda: text),
+                )
+            )
+            raise
+        finally:
+            # Closing the stream stops the generation early when aborting.
+            await stream.aclose()
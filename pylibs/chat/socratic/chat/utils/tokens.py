@@ -0,0 +1,45 @@
+"""
+Provides local token counting, with tiktoken.
+
+tiktoken is a dependency of the package, but counting still works in environments lacking it.
+Tokens are then estimated at four characters each, so budgets and rate limits are only
+approximate: English text is usually close, while code and other languages may be well off.
+"""
+
+from functools import lru_cache
+from typing import Any
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_MODEL = "gpt-4"
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str) -> Optional[Any]:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Counts the tokens of a text. Counts are cached, since histories are rendered repeatedly."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """Returns the longest prefix of a text within the given number of tokens."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
@@ -28,13 +28,14 @@ def _is_json_safe_type_app(type_: type) -> bool:
     return False
 
 
-def _is_atomic_type(type_: type) -> bool:
+def is_atomic_type(type_: type) -> bool:
+    """Checks if the given type is a JSON scalar, i.e. is dumped and parsed as is."""
     return type_ in (int, float, str, bool, type(None))
 
 
 def is_json_safe(type_: Any) -> bool:
     """Checks if the given type can be serialized to JSON."""
-    if _is_atomic_type(type_):
+    if is_atomic_type(type_):
         return True
     if isinstance(type_, type) and issubclass(type_, Enum):
         return all(is_json_safe(type(item.value)) for item in type_)
@@ -45,7 +46,7 @@ def is_json_safe(type_: Any) -> bool:
 
 def dump_value(type_: Any, value: Any) -> Any:
     """Dynamically validates the value's type and dumps it to JSON."""
-    if _is_atomic_type(type_):
+    if is_atomic_type(type_):
         assert isinstance(value, type_)
         return value
     if isinstance(type_, type) and issubclass(type_, Enum):
@@ -79,7 +80,7 @@ def dump_value(type_: Any, value: Any) -> Any:
 
 def parse_value(type_: Any, value: Any) -> Any:
     """Converts JSON to a value of the given type."""
-    if _is_atomic_type(type_):
+    if is_atomic_type(type_):
         assert isinstance(value, type_)
         return value
     if isinstance(type_, type) and issubclass(type_, Enum):
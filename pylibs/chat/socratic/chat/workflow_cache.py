@@ -0,0 +1,297 @@
+"""
+Provides a content-addressed cache for workflow results, shared across conversations.
+
+Unlike the replay cache of an executor, which is keyed by call ids, this cache is keyed by what a
+workflow computes: its name, a version and its input request. Only use it for workflows that are
+pure functions of these, e.g. generating an opening question for a topic.
+
+Backends may do blocking I/O, so async callers use `aget` and `aset`, which run it in a worker
+thread instead of on the event loop.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import sha256
+from threading import Lock
+from time import time
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import Protocol
+
+from pydantic import BaseModel
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class WorkflowCacheBackend:
+    """Stores JSON-safe values by key. Expired entries must never be returned."""
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """
+        Returns whether the key is present, along with its value.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float]):
+        """
+        Stores a value, expiring after `ttl` seconds if given.
+        """
+        raise NotImplementedError
+
+    async def aget(self, key: str) -> tuple[bool, Any]:
+        """
+        Same as `get`, run in a worker thread.
+        """
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float]):
+        """
+        Same as `set`, run in a worker thread.
+        """
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+
+class InMemoryWorkflowCacheBackend(WorkflowCacheBackend):
+    """Keeps entries in process memory, evicting the least recently used ones."""
+
+    max_size: int
+
+    _entries: OrderedDict[str, tuple[Any, Optional[float]]]
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: Optional[float]):
+        expires_at = None if ttl is None else time() + ttl
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    # Entries are in memory, so there is no I/O to move off the event loop.
+
+    async def aget(self, key: str) -> tuple[bool, Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float]):
+        self.set(key, value, ttl)
+
+
+class SQLiteWorkflowCacheBackend(WorkflowCacheBackend):
+    """
+    Keeps entries in a SQLite file, which can be shared by all workers on a host.
+
+    Evicts the least recently used entries once there are more than `max_size`. Eviction sorts
+    the whole table, so it only runs every `eviction_interval` writes, by default 1% of
+    `max_size`, and each worker may exceed `max_size` by that many entries in between.
+    """
+
+    max_size: int
+    eviction_interval: int
+
+    _connection: sqlite3.Connection
+    _lock: Lock
+    _writes: int
+
+    def __init__(self, path: str, max_size: int = 100_000, eviction_interval: Optional[int] = None):
+        self.max_size = max_size
+        self.eviction_interval = eviction_interval or max(1, max_size // 100)
+        self._writes = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS workflow_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, "
+                "last_used REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        now = time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM workflow_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False, None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._connection.execute("DELETE FROM workflow_cache WHERE key = ?", (key,))
+                return False, None
+            self._connection.execute(
+                "UPDATE workflow_cache SET last_used = ? WHERE key = ?", (now, key)
+            )
+        return True, json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float]):
+        now = time()
+        expires_at = None if ttl is None else now + ttl
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO workflow_cache VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._writes += 1
+            if self._writes % self.eviction_interval != 0:
+                return
+            self._connection.execute(
+                "DELETE FROM workflow_cache WHERE key IN (SELECT key FROM workflow_cache "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+
+class RedisLikeClient(Protocol):
+    """The subset of a redis-py client used by the cache."""
+
+    def get(self, name: str) -> Any:
+        """Returns the value, or None."""
+
+    def set(self, name: str, value: str, ex: Optional[int] = None) -> Any:
+        """Stores the value, expiring after `ex` seconds if given."""
+
+
+class RedisWorkflowCacheBackend(WorkflowCacheBackend):
+    """
+    Keeps entries in Redis, or any server speaking its protocol, shared by all workers.
+
+    Expiration is delegated to the server, and so is LRU eviction, via its `maxmemory-policy`.
+    """
+
+    prefix: str
+
+    _client: RedisLikeClient
+
+    def __init__(self, client: RedisLikeClient, prefix: str = "socratic:workflow_cache:"):
+        self.prefix = prefix
+        self._client = client
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        value = self._client.get(self.prefix + key)
+        if value is None:
+            return False, None
+        return True, json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float]):
+        ex = None if ttl is None else max(1, int(ttl))
+        self._client.set(self.prefix + key, json.dumps(value), ex=ex)
+
+
+class WorkflowCache:
+    """
+    A cache policy for workflows, i.e. a backend along with a TTL and a version.
+
+    The version is part of every key. Bump it whenever the prompts change. It can also be a
+    function, evaluated on every call, for workflows depending on model config.
+    """
+
+    backend: WorkflowCacheBackend
+    ttl: Optional[float]
+    version: str | Callable[[], str]
+
+    def __init__(
+        self,
+        backend: WorkflowCacheBackend,
+        ttl: Optional[float] = None,
+        version: str | Callable[[], str] = "",
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.version = version
+
+    def key(self, namespace: str, request: BaseModel) -> str:
+        """
+        Returns the key for a workflow call.
+        """
+        version = self.version() if callable(self.version) else self.version
+        content = json.dumps([namespace, version, request.model_dump_json()])
+        return sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, namespace: str, request: BaseModel) -> tuple[bool, Any]:
+        """
+        Returns whether a dumped result is cached for the workflow call, along with it.
+        """
+        return self.backend.get(self.key(namespace, request))
+
+    async def aget(self, namespace: str, request: BaseModel) -> tuple[bool, Any]:
+        """
+        Same as `get`, without blocking the event loop.
+        """
+        return await self.backend.aget(self.key(namespace, request))
+
+    def set(self, namespace: str, request: BaseModel, result: Any):
+        """
+        Caches the dumped result of a workflow call.
+        """
+        self.backend.set(self.key(namespace, request), result, self.ttl)
+
+    async def aset(self, namespace: str, request: BaseModel, result: Any):
+        """
+        Same as `set`, without blocking the event loop.
+        """
+        await self.backend.aset(self.key(namespace, request), result, self.ttl)
+
+
+@lru_cache(maxsize=None)
+def cache_backend_from_url(url: str) -> WorkflowCacheBackend:
+    """
+    Returns the backend at the given URL, created once per process. Supported values:
+
+    - "memory"
+    - "sqlite:///path/to/cache.db"
+    - "redis://host:port/db", which requires the redis package
+    """
+    if url == "memory":
+        return InMemoryWorkflowCacheBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteWorkflowCacheBackend(url.removeprefix("sqlite:///"))
+    if url.startswith(("redis://", "rediss://")):
+        if redis is None:
+            raise ValueError("The redis package is required for a Redis cache.")
+        return RedisWorkflowCacheBackend(redis.Redis.from_url(url))
+    raise ValueError(f"Unknown cache {url}.")
+
+
+def workflow_cache_backend_from_env() -> Optional[WorkflowCacheBackend]:
+    """
+    Returns the backend configured by SOCRATIC_WORKFLOW_CACHE, if set, see
+    `cache_backend_from_url`. The backend is shared by all workflows.
+    """
+    url = os.getenv("SOCRATIC_WORKFLOW_CACHE")
+    if not url:
+        return None
+    return cache_backend_from_url(url)
+
+
+def workflow_cache_from_env(version: str | Callable[[], str] = "") -> Optional[WorkflowCache]:
+    """
+    Returns a cache using the configured backend, or None if caching is disabled.
+
+    The TTL in seconds is configured by SOCRATIC_WORKFLOW_CACHE_TTL, and is unlimited if unset.
+    """
+    backend = workflow_cache_backend_from_env()
+    if backend is None:
+        return None
+    ttl = os.getenv("SOCRATIC_WORKFLOW_CACHE_TTL")
+    return WorkflowCache(backend, ttl=None if ttl is None else float(ttl), version=version)
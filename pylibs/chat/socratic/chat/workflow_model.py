@@ -9,14 +9,16 @@ from inspect import signature
 from typing import Any
 from typing import Callable
 from typing import Iterator
+from typing import Optional
 
 from pydantic import BaseModel
 
 from socratic.chat.generation_scope import with_new_call
-from socratic.chat.utils.typing import dump_value
+from socratic.chat.utils.codec import ValueCodec
+from socratic.chat.utils.codec import get_codec
 from socratic.chat.utils.typing import get_return_type
-from socratic.chat.utils.typing import parse_value
 from socratic.chat.utils.typing import request_model_from_function
+from socratic.chat.workflow_cache import WorkflowCache
 
 _get_workflow_cache_var = ContextVar[Callable[[], tuple[bool, Any]]](
     "_get_workflow_cache", default=lambda: (False, None)
@@ -73,11 +75,11 @@ def with_on_workflow_done(
         _on_workflow_done_var.reset(saved_token)
 
 
-def _on_workflow_done(workflow: "WorkflowModel", input_request: BaseModel, result: Any):
+def _on_workflow_done(workflow: "WorkflowModel", input_request: BaseModel, dumped_result: Any):
     impl = _on_workflow_done_var.get()
     if impl is None:
         return
-    impl(workflow, input_request, dump_value(workflow.return_type, result))
+    impl(workflow, input_request, dumped_result)
 
 
 class WorkflowModel:
@@ -88,11 +90,16 @@ class WorkflowModel:
     doc: str
     request_model: type[BaseModel]
     return_type: Any
+    codec: ValueCodec
+    cache: Optional[WorkflowCache]
+    cache_namespace: str
 
     _params: list[Parameter]
 
-    def __init__(self, func: Callable):
+    def __init__(self, func: Callable, cache: Optional[WorkflowCache] = None):
         self.func = func
+        self.cache = cache
+        self.cache_namespace = f"{func.__module__}.{func.__qualname__}"
 
         self.name = func.__name__
         if func.__doc__ is None:
@@ -105,6 +112,7 @@ class WorkflowModel:
 
         self.request_model = request_model_from_function(func)
         self.return_type = get_return_type(func)
+        self.codec = get_codec(self.return_type)
 
     @property
     def is_async(self) -> bool:
@@ -122,9 +130,16 @@ class WorkflowModel:
         with with_new_call():
             fetched, result = _get_workflow_cache()
             if fetched:
-                return parse_value(self.return_type, result)
-            result = self.func(*args, **kwargs)
-            _on_workflow_done(self, self.build_input_request(args, kwargs), result)
+                return self.codec.parse(result)
+            input_request = self.build_input_request(args, kwargs)
+            cached, dumped_result = self._get_shared_cache(input_request)
+            if cached:
+                result = self.codec.parse(dumped_result)
+            else:
+                result = self.func(*args, **kwargs)
+                dumped_result = self.codec.dump(result)
+                self._set_shared_cache(input_request, dumped_result)
+            _on_workflow_done(self, input_request, dumped_result)
             return result
 
     async def async_call(self, *args, **kwargs) -> Any:
@@ -136,11 +151,38 @@ class WorkflowModel:
         with with_new_call():
             fetched, result = _get_workflow_cache()
             if fetched:
-                return parse_value(self.return_type, result)
-            result = await self.func(*args, **kwargs)
-            _on_workflow_done(self, self.build_input_request(args, kwargs), result)
+                return self.codec.parse(result)
+            input_request = self.build_input_request(args, kwargs)
+            cached, dumped_result = await self._aget_shared_cache(input_request)
+            if cached:
+                result = self.codec.parse(dumped_result)
+            else:
+                result = await self.func(*args, **kwargs)
+                dumped_result = self.codec.dump(result)
+                await self._aset_shared_cache(input_request, dumped_result)
+            _on_workflow_done(self, input_request, dumped_result)
             return result
 
+    def _get_shared_cache(self, input_request: BaseModel) -> tuple[bool, Any]:
+        # Results shared across conversations may come from older code, so they are always
+        # validated when parsed.
+        if self.cache is None:
+            return False, None
+        return self.cache.get(self.cache_namespace, input_request)
+
+    async def _aget_shared_cache(self, input_request: BaseModel) -> tuple[bool, Any]:
+        if self.cache is None:
+            return False, None
+        return await self.cache.aget(self.cache_namespace, input_request)
+
+    def _set_shared_cache(self, input_request: BaseModel, dumped_result: Any):
+        if self.cache is not None:
+            self.cache.set(self.cache_namespace, input_request, dumped_result)
+
+    async def _aset_shared_cache(self, input_request: BaseModel, dumped_result: Any):
+        if self.cache is not None:
+            await self.cache.aset(self.cache_namespace, input_request, dumped_result)
+
     def _match_arg(self, args: tuple[Any], kwargs: dict[str, Any]) -> dict[str, Any]:
         kwargs = kwargs.copy()
         for param, arg in zip(self._params, args):
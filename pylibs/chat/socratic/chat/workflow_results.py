@@ -0,0 +1,113 @@
+"""Provides WorkflowResults."""
+
+from typing import Any
+from typing import Optional
+from uuid import UUID
+
+CallPath = tuple[int, ...]
+
+DumpedWorkflowResults = dict[str, dict[str, Any]]
+
+
+def format_call_path(path: CallPath) -> str:
+    """Formats a call path as it is stored, e.g. "1/0"."""
+    return "/".join(str(x) for x in path)
+
+
+def parse_call_path(formatted: str) -> CallPath:
+    """Parses a stored call path."""
+    return tuple(int(x) for x in formatted.split("/"))
+
+
+def migrate_legacy_workflow_results(legacy: dict[str, Any]) -> DumpedWorkflowResults:
+    """
+    Converts flat results keyed by "<scope id>/<call path>" to the nested format. Used by the
+    chatserver migration nesting stored results.
+    """
+    dumped: DumpedWorkflowResults = {}
+    for key, value in legacy.items():
+        scope_id, formatted_path = key.split("/", 1)
+        dumped.setdefault(scope_id, {})[formatted_path] = value
+    return dumped
+
+
+class WorkflowResults:
+    """
+    Stores recorded workflow results, grouped by generation scope.
+
+    In memory, a result is keyed by its scope id and call path, i.e. the integer call stack
+    within the scope. When dumped, results are nested per scope, so the scope id is stored once
+    instead of prefixing every key:
+
+        {"<scope id>": {"0": ..., "1/0": ...}}
+
+    Loading a dump is cheap. Each scope is only converted when it is first accessed, so scopes
+    that a replay skips entirely are never converted.
+    """
+
+    _scopes: dict[UUID, dict[CallPath, Any]]
+    _pending: dict[UUID, list[dict[str, Any]]]
+
+    def __init__(self, dumped: Optional[DumpedWorkflowResults] = None):
+        self._scopes = {}
+        self._pending = {}
+        if dumped is not None:
+            self.load(dumped)
+
+    def load(self, dumped: DumpedWorkflowResults):
+        """
+        Adds dumped results, e.g. those stored with a message. Later loads take precedence.
+        """
+        for scope_id, results in dumped.items():
+            self._pending.setdefault(UUID(scope_id), []).append(results)
+
+    def get(self, scope_id: UUID, path: CallPath) -> tuple[bool, Any]:
+        """
+        Returns whether a result was recorded for the given call, along with the result.
+        """
+        if scope_id not in self._scopes and scope_id not in self._pending:
+            return False, None
+        scope = self._scope(scope_id)
+        if path not in scope:
+            return False, None
+        return True, scope[path]
+
+    def set(self, scope_id: UUID, path: CallPath, result: Any):
+        """
+        Records the result of the given call.
+        """
+        self._scope(scope_id)[path] = result
+
+    def copy(self) -> "WorkflowResults":
+        """
+        Returns a shallow copy.
+        """
+        copied = WorkflowResults()
+        copied._scopes = {k: v.copy() for k, v in self._scopes.items()}
+        copied._pending = {k: v.copy() for k, v in self._pending.items()}
+        return copied
+
+    def dump(self) -> DumpedWorkflowResults:
+        """
+        Dumps all results into the nested format.
+        """
+        return {
+            str(scope_id): {
+                format_call_path(path): result for path, result in self._scope(scope_id).items()
+            }
+            for scope_id in self._scopes.keys() | self._pending.keys()
+        }
+
+    def __len__(self) -> int:
+        return sum(len(self._scope(x)) for x in self._scopes.keys() | self._pending.keys())
+
+    def _scope(self, scope_id: UUID) -> dict[CallPath, Any]:
+        scope = self._scopes.get(scope_id)
+        if scope is None:
+            scope = self._scopes[scope_id] = {}
+        pending = self._pending.pop(scope_id, None)
+        if pending is not None:
+            for results in pending:
+                for formatted_path, result in results.items():
+                    scope[parse_call_path(formatted_path)] = result
+        return scope
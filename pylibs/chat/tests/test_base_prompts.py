@@ -0,0 +1,48 @@
+import os
+from typing import Optional
+
+from pydantic import BaseModel
+
+from socratic.chat.utils.base_prompts import BasePrompts
+from socratic.chat.utils.base_prompts import PromptStore
+
+
+class Goals(BaseModel):
+    initial: str
+
+
+class Prompts(BasePrompts):
+    persona: str
+    goals: Goals
+    background: Optional[str] = None
+
+
+def _write(path, persona: str, mtime_ns: int):
+    path.write_text(f"persona: {persona}\ngoals:\n  initial: learn\n", encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_loads_are_cached_copies(tmp_path):
+    path = tmp_path / "prompts.yml"
+    _write(path, "a professor", 10**18)
+    store = PromptStore()
+
+    first = store.load(Prompts, str(path))
+    first.background = "logic"
+    second = store.load(Prompts, str(path))
+    assert second.background is None
+    assert second.goals is first.goals
+
+
+def test_changed_files_are_reloaded(tmp_path):
+    path = tmp_path / "prompts.yml"
+    _write(path, "a professor", 10**18)
+    store = PromptStore()
+    first = store.load(Prompts, str(path))
+
+    # Touched without changes: the stored prompts are kept.
+    _write(path, "a professor", 2 * 10**18)
+    assert store.load(Prompts, str(path)).goals is first.goals
+
+    _write(path, "an interviewer", 3 * 10**18)
+    assert store.load(Prompts, str(path)).persona == "an interviewer"
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+from socratic.chat.utils.call_policy import CallPolicy
+from socratic.chat.utils.call_policy import LatencyTracker
+from socratic.chat.utils.call_policy import call_with_policy
+
+
+class Answer(BaseModel):
+    value: int
+
+
+def _policy(**kwargs) -> CallPolicy:
+    return CallPolicy(backoff_initial=0.001, **kwargs)
+
+
+@pytest.mark.asyncio()
+async def test_invalid_outputs_are_retried():
+    outputs = ['{"value": "x"}', '{"value": 3}']
+
+    async def attempt() -> Answer:
+        return Answer.model_validate_json(outputs.pop(0))
+
+    assert await call_with_policy(_policy(max_attempts=2), attempt) == Answer(value=3)
+
+
+@pytest.mark.asyncio()
+async def test_slow_attempts_time_out_and_are_retried():
+    delays = [1.0, 0.0]
+
+    async def attempt() -> int:
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return len(delays)
+
+    assert await call_with_policy(_policy(timeout=0.05, max_attempts=2), attempt) == 0
+
+
+@pytest.mark.asyncio()
+async def test_other_errors_are_not_retried():
+    calls = []
+
+    async def attempt() -> int:
+        calls.append(None)
+        raise KeyError("bug")
+
+    with pytest.raises(KeyError):
+        await call_with_policy(_policy(max_attempts=3), attempt)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio()
+async def test_stragglers_are_hedged():
+    delays = [1.0, 0.01]
+    tracker = LatencyTracker(min_samples=2)
+
+    async def attempt() -> float:
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    assert await call_with_policy(_policy(hedge_after=0.02), attempt, tracker) == 0.01
+
+    tracker.add(0.01)
+    delays = [1.0, 0.01]
+    # The quantile of recent latencies takes precedence over the fixed delay.
+    policy = _policy(hedge_after=10.0, hedge_quantile=0.95)
+    assert await asyncio.wait_for(call_with_policy(policy, attempt, tracker), 0.5) == 0.01
@@ -0,0 +1,132 @@
+import pytest
+
+from socratic.chat import ConversationModel
+from socratic.chat import StepExecutor
+from socratic.chat import get_user_reply
+from socratic.chat import post_assistant_reply
+
+model = ConversationModel("checkpoint-echo", lambda: None)
+
+entered_rounds: list[int] = []
+
+
+@model.chain
+async def shout(message: str) -> str:
+    """Shouts the message."""
+    return message.upper()
+
+
+@model.checkpoint
+async def echo_round(round_index: int) -> list[str]:
+    """Echos two user replies."""
+    entered_rounds.append(round_index)
+    replies: list[str] = []
+    for _ in range(2):
+        reply = await get_user_reply()
+        replies.append(reply)
+        await post_assistant_reply(await shout(reply))
+    return replies
+
+
+@model.entry
+async def entry() -> list[str]:
+    """Runs three rounds of echo."""
+    replies: list[str] = []
+    await post_assistant_reply("Hello.")
+    for round_index in range(3):
+        replies.extend(await echo_round(round_index))
+    await get_user_reply()
+    return replies
+
+
+@pytest.mark.asyncio()
+async def test_checkpoint_skips_completed_rounds():
+    entered_rounds.clear()
+    executor = StepExecutor(model, [], [], {})
+    inputs = ["a", "b", "c", "d", "e", "f", "bye"]
+    outputs = []
+
+    for user_reply in inputs:
+        outputs.append(await executor.run())
+        executor.chat_history.append(user_reply)
+    await executor.run()
+
+    assert outputs == ["Hello.", "A", "B", "C", "D", "E", "F"]
+    assert executor.has_ended
+    assert executor.get_result() == ["a", "b", "c", "d", "e", "f"]
+    # Each completed round is entered once per step until it finishes, and never again.
+    assert entered_rounds == [0, 0, 0, 1, 1, 1, 2, 2, 2]
+
+
+@pytest.mark.asyncio()
+async def test_checkpoint_new_workflow_results():
+    executor = StepExecutor(model, [], [], {})
+    for user_reply in ["a", "b"]:
+        await executor.run()
+        executor.chat_history.append(user_reply)
+    await executor.run()
+
+    # The checkpoint started in an earlier scope but is recorded by the latest step.
+    first_scope_results = executor.new_workflow_results.dump()[str(executor.scope_ids[0])]
+    assert len(first_scope_results) == 1
+    assert list(first_scope_results.values())[0]["result"] == ["a", "b"]
+
+
+legacy_model = ConversationModel("checkpoint-echo-legacy", lambda: None)
+shouted: list[str] = []
+entered_intros: list[str] = []
+
+
+@legacy_model.chain
+async def legacy_shout(message: str) -> str:
+    """Shouts the message."""
+    shouted.append(message)
+    return message.upper()
+
+
+async def legacy_round(intro: str) -> list[str]:
+    entered_intros.append(intro)
+    await post_assistant_reply(await legacy_shout(intro))
+    reply = await get_user_reply()
+    await post_assistant_reply(await legacy_shout(reply))
+    return [reply]
+
+
+@legacy_model.entry
+async def legacy_entry() -> None:
+    """Runs rounds, like the model before its rounds became checkpoints."""
+    for round_index in range(3):
+        await legacy_round(f"intro {round_index}")
+        await get_user_reply()
+
+
+@pytest.mark.asyncio()
+async def test_recordings_before_checkpoints_replay():
+    # Record a conversation with plain rounds.
+    executor = StepExecutor(legacy_model, [], [], {})
+    for user_reply in ["a", "b", "c"]:
+        await executor.run()
+        executor.chat_history.append(user_reply)
+    recorded_history = executor.chat_history.copy()
+
+    # Replay it once rounds are checkpoints, as after a deploy.
+    global legacy_round  # pylint: disable=global-statement
+    plain_round = legacy_round
+    legacy_round = legacy_model.checkpoint(plain_round)
+    try:
+        shouted.clear()
+        replay = StepExecutor(
+            legacy_model, executor.scope_ids, recorded_history, executor.workflow_results.dump()
+        )
+        assert await replay.run() == "C"
+        assert replay.chat_history == recorded_history + ["C"]
+        # Every workflow was replayed from the recording, except the new one.
+        assert shouted == ["c"]
+
+        # Rounds completed while replaying were recorded, so later steps skip them.
+        entered_intros.clear()
+        replay.chat_history.append("d")
+        await replay.run()
+        assert entered_intros == ["intro 2"]
+    finally:
+        legacy_round = plain_round
@@ -0,0 +1,86 @@
+from enum import Enum
+from typing import List
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from socratic.chat.utils.codec import get_codec
+from socratic.chat.utils.typing import dump_value
+from socratic.chat.utils.typing import parse_value
+
+
+class IntEnum(Enum):
+    VALUE1 = 1
+    VALUE2 = 2
+
+
+class StrEnum(Enum):
+    VALUE1 = "1"
+    VALUE2 = "2"
+
+
+class PersonModel(BaseModel):
+    name: str
+    age: int
+
+
+class TeamModel(BaseModel):
+    lead: Optional[PersonModel] = None
+    members: List[PersonModel]
+
+
+def test_codec_cached():
+    assert get_codec(list[PersonModel]) is get_codec(list[PersonModel])
+
+
+def test_dump():
+    assert get_codec(int).dump(3) == 3
+    assert get_codec(type(None)).dump(None) is None
+    assert get_codec(StrEnum).dump(StrEnum.VALUE1) == "1"
+    assert get_codec(PersonModel).dump(PersonModel(name="A", age=1)) == {"name": "A", "age": 1}
+    assert get_codec(list[IntEnum]).dump([x for x in IntEnum]) == [1, 2]
+    assert get_codec(list[int]).dump([1, 2]) == [1, 2]
+    with pytest.raises(AssertionError):
+        get_codec(list[int]).dump([1, "2"])
+    assert get_codec(dict[str, StrEnum]).dump({x.value: x for x in StrEnum}) == {
+        "1": "1",
+        "2": "2",
+    }
+
+    assert get_codec(int | str).dump("x") == "x"
+    with pytest.raises(ValueError):
+        get_codec(int | str).dump(3.14)
+    assert get_codec(Optional[PersonModel]).dump(None) is None
+
+
+def test_parse():
+    assert get_codec(int).parse(3) == 3
+    assert get_codec(IntEnum).parse(1) == IntEnum.VALUE1
+    assert get_codec(PersonModel).parse({"name": "A", "age": 1}) == PersonModel(name="A", age=1)
+    assert get_codec(list[PersonModel]).parse([{"name": "A", "age": 1}]) == [
+        PersonModel(name="A", age=1)
+    ]
+    assert get_codec(dict[str, StrEnum]).parse({"1": "1"}) == {"1": StrEnum.VALUE1}
+
+    assert get_codec(int | str).parse("x") == "x"
+    with pytest.raises(ValueError):
+        get_codec(int | str).parse(3.14)
+    assert get_codec(Optional[PersonModel]).parse(None) is None
+    assert get_codec(Optional[IntEnum]).parse(2) == IntEnum.VALUE2
+    with pytest.raises(ValueError):
+        get_codec(list[PersonModel]).parse([{"name": "A"}])
+
+
+def test_matches_dynamic_implementation():
+    type_ = dict[str, List[TeamModel]]
+    value = {
+        "x": [
+            TeamModel(lead=PersonModel(name="A", age=1), members=[PersonModel(name="B", age=2)]),
+            TeamModel(members=[]),
+        ]
+    }
+    codec = get_codec(type_)
+    dumped = codec.dump(value)
+    assert dumped == dump_value(type_, value)
+    assert codec.parse(dumped) == parse_value(type_, dumped) == value
@@ -54,3 +54,28 @@ async def test_steprun():
         executor.chat_history.append(inputs[i])
         i += 1
     assert executor.get_result() == 1
+
+
+@pytest.mark.asyncio()
+@with_timeout(2)
+async def test_steprun_keep_alive():
+    executor = StepExecutor(prime_counter, [], [], {}, keep_alive=True)
+
+    message = await executor.run(end_phrase="Terminate")
+    assert message == outputs[0]
+    assert executor.is_parked
+    executor.chat_history.append(inputs[0])
+    message = await executor.run()
+    assert message == outputs[1]
+
+    # A parked conversation can be discarded and replayed from its recorded results.
+    executor.close()
+    replay_executor = StepExecutor(
+        prime_counter,
+        executor.scope_ids,
+        executor.chat_history + [inputs[1]],
+        executor.workflow_results,
+    )
+    message = await replay_executor.run(end_phrase="Terminate")
+    assert message == outputs[2]
+    assert replay_executor.get_result() == 1
@@ -1,8 +1,14 @@
+import json
+
+from socratic.chat import event_logging
 from socratic.chat.event_logging import Event
 from socratic.chat.event_logging import EventPhase
+from socratic.chat.event_logging import LazyPayload
+from socratic.chat.event_logging import PayloadPolicy
 from socratic.chat.event_logging import _fill_event_metadata
 from socratic.chat.event_logging import event_model
 from socratic.chat.event_logging import parse_event_model
+from socratic.chat.event_logging import set_payload_policy
 
 
 @event_model("api_call_start", phase=EventPhase.START)
@@ -30,3 +36,39 @@ def test_str_repn():
     event = APICallStartEvent(id="foo", timestamp=0, input=1)
     _fill_event_metadata(event)
     assert str(event) == "[1970-01-01T00:00:00] START foo api_call_start: input=1"
+
+
+@event_model("api_call_end", phase=EventPhase.END)
+class APICallEndEvent(Event):
+    output: LazyPayload
+
+    def ignored_fields_for_str(self) -> list[str]:
+        return super().ignored_fields_for_str() + ["output"]
+
+
+def test_lazy_payloads():
+    computed = []
+
+    def compute() -> list:
+        computed.append(None)
+        return [{"content": "x" * 100}]
+
+    event = APICallEndEvent(id="foo", timestamp=0, output=LazyPayload(compute))
+    _fill_event_metadata(event)
+    assert str(event) == "[1970-01-01T00:00:00] END foo api_call_end: "
+    assert not computed
+    assert parse_event_model(json.loads(event.model_dump_json())) == event
+    assert len(computed) == 1
+
+
+def test_payload_policies(monkeypatch):
+    monkeypatch.setattr(event_logging, "_payload_policies", {})
+    set_payload_policy("api_call_end", PayloadPolicy(sample_rate=0.5, max_bytes=20))
+    events = []
+    for i in range(100):
+        events.append(APICallEndEvent(id=str(i), output=LazyPayload(lambda: ["x" * 100])))
+        _fill_event_metadata(events[-1])
+    outputs = [event.model_dump()["output"] for event in events]
+    assert 20 < sum(x is None for x in outputs) < 80
+    truncated = next(x for x in outputs if x is not None)
+    assert truncated["truncated"] and len(truncated["prefix"]) == 20
@@ -0,0 +1,87 @@
+import json
+import sqlite3
+from threading import Event as ThreadingEvent
+
+from socratic.chat import event_logging
+from socratic.chat.event_logging import Event
+from socratic.chat.event_logging import event_model
+from socratic.chat.event_logging import log_event
+from socratic.chat.event_logging import set_event_logging_handler
+from socratic.chat.event_sink import BatchedEventLogger
+from socratic.chat.event_sink import EventSink
+from socratic.chat.event_sink import JSONLEventSink
+from socratic.chat.event_sink import SQLiteEventSink
+
+
+@event_model("sink_test")
+class SinkTestEvent(Event):
+    value: int
+
+
+class BlockedSink(EventSink):
+    def __init__(self):
+        self.release = ThreadingEvent()
+        self.batches: list[list[Event]] = []
+
+    def write(self, events: list[Event]):
+        self.release.wait()
+        self.batches.append(events)
+
+
+def test_set_event_logging_handler(monkeypatch):
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", None)
+    events = []
+    set_event_logging_handler(events.append)
+    log_event(SinkTestEvent(id="a", value=1))
+    assert [x.value for x in events] == [1]
+
+
+def test_events_are_written_in_batches(tmp_path):
+    sink = JSONLEventSink(str(tmp_path / "events.jsonl"), max_bytes=1000, backup_count=1)
+    logger = BatchedEventLogger(sink, flush_interval=0.01)
+    for i in range(20):
+        event = SinkTestEvent(id=str(i), value=i)
+        event_logging._fill_event_metadata(event)  # pylint: disable=protected-access
+        logger(event)
+    logger.close()
+
+    assert logger.stats.as_dict()["written"] == 20
+    lines = []
+    for name in ["events.jsonl.1", "events.jsonl"]:
+        lines.extend((tmp_path / name).read_text().splitlines())
+    assert not (tmp_path / "events.jsonl.2").exists()
+    values = [json.loads(x)["value"] for x in lines]
+    assert values == list(range(20 - len(values), 20))
+
+
+def test_full_queues_drop_events():
+    sink = BlockedSink()
+    logger = BatchedEventLogger(sink, max_queue=2, flush_interval=0.01)
+    for i in range(10):
+        logger(SinkTestEvent(id=str(i), value=i))
+    sink.release.set()
+    logger.close()
+    written = [x.value for batch in sink.batches for x in batch]
+    assert logger.stats.enqueued == len(written)
+    assert logger.stats.dropped == 10 - len(written)
+    assert written[:2] == [0, 1]
+
+    sink = BlockedSink()
+    logger = BatchedEventLogger(sink, max_queue=2, policy="drop_oldest")
+    for i in range(10):
+        logger(SinkTestEvent(id=str(i), value=i))
+    sink.release.set()
+    logger.close()
+    assert [x.value for batch in sink.batches for x in batch][-2:] == [8, 9]
+
+
+def test_sqlite_sink(tmp_path):
+    path = tmp_path / "events.db"
+    logger = BatchedEventLogger(SQLiteEventSink(str(path)))
+    event = SinkTestEvent(id="a", value=1)
+    event_logging._fill_event_metadata(event)  # pylint: disable=protected-access
+    logger(event)
+    logger.flush()
+    rows = sqlite3.connect(path).execute("SELECT id, type, data FROM events").fetchall()
+    assert rows == [("a", "sink_test", event.model_dump_json())]
+    logger.close()
@@ -0,0 +1,66 @@
+from enum import Enum
+from typing import Optional
+
+import pytest
+from langchain.prompts import ChatPromptTemplate
+from pydantic import BaseModel
+from pydantic import model_validator
+
+from socratic.chat.utils.fake_chat import FakeChatBackend
+from socratic.chat.utils.fake_chat import FakeChatConfig
+
+prompt = ChatPromptTemplate.from_messages([("human", "Tell me about {topic}.")])
+
+
+class Step(str, Enum):
+    FIRST = "first"
+    SECOND = "second"
+    THIRD = "third"
+
+
+class PlannedStep(BaseModel):
+    step: Step
+    purpose: str
+
+
+class Decision(BaseModel):
+    done: bool
+    plan: list[PlannedStep]
+    reply: Optional[str] = None
+    scores: dict[str, int]
+
+    @model_validator(mode="after")
+    def check_reply(self) -> "Decision":
+        if self.done == (self.reply is not None):
+            raise ValueError("reply must be set unless done")
+        return self
+
+
+@pytest.mark.asyncio()
+async def test_gen_string_is_deterministic():
+    backend = FakeChatBackend(FakeChatConfig(tokens_mean=5))
+    first = await backend.gen_string(prompt, topic="knowledge")
+    assert first == await backend.gen_string(prompt, topic="knowledge")
+    assert len(first.split()) == 5
+    chunks = [x async for x in backend.stream_string(prompt, topic="knowledge")]
+    assert "".join(chunks) == first
+    assert len(chunks) == 5
+
+
+@pytest.mark.asyncio()
+async def test_gen_json_satisfies_validators():
+    backend = FakeChatBackend()
+    decisions = [await backend.gen_json(prompt, Decision, topic=str(i)) for i in range(20)]
+    assert {x.done for x in decisions} == {True, False}
+    for decision in decisions:
+        assert [x.step for x in decision.plan] == list(Step)
+        assert len(decision.scores) > 0
+
+
+@pytest.mark.asyncio()
+async def test_gen_json_fixed_fields():
+    config = FakeChatConfig(responses={"Decision": {"done": True, "reply": None}})
+    backend = FakeChatBackend(config)
+    for i in range(5):
+        decision = await backend.gen_json(prompt, Decision, topic=str(i))
+        assert decision.done and decision.reply is None
@@ -1,5 +1,8 @@
+import asyncio
 import uuid
 
+import pytest
+
 import socratic.chat.generation_scope as GS
 
 scope_id = uuid.UUID("12345678-1234-5678-1234-567812345678")
@@ -19,3 +22,36 @@ def test_generation_scope():
     GS.push_call()
     assert GS.current_call_id() == "12345678-1234-5678-1234-567812345678/1/1"
     GS.pop_call()
+
+
+async def record_call_ids(delays: list[float]) -> list[str]:
+    call_ids = []
+    for delay in delays:
+        with GS.with_new_call():
+            await asyncio.sleep(delay)
+            call_ids.append(GS.current_call_id())
+    return call_ids
+
+
+@pytest.mark.asyncio()
+async def test_gather():
+    GS.new_generation_scope(scope_id)
+    GS.push_call()
+    GS.pop_call()
+
+    # The branches interleave differently, but yield the same ids.
+    fast_first = await GS.gather(record_call_ids([0, 0.01]), record_call_ids([0.01, 0]))
+    GS.new_generation_scope(scope_id)
+    GS.push_call()
+    GS.pop_call()
+    slow_first = await GS.gather(record_call_ids([0.01, 0]), record_call_ids([0, 0.01]))
+
+    prefix = "12345678-1234-5678-1234-567812345678/1"
+    assert fast_first == slow_first == [
+        [f"{prefix}/0/0", f"{prefix}/0/1"],
+        [f"{prefix}/1/0", f"{prefix}/1/1"],
+    ]
+
+    with GS.with_new_call():
+        assert GS.current_call_id() == "12345678-1234-5678-1234-567812345678/2"
+    GS.reset_generation_scope()
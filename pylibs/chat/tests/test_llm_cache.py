@@ -0,0 +1,192 @@
+import pytest
+from langchain.chat_models import ChatOpenAI
+from langchain.prompts import ChatPromptTemplate
+from langchain.schema import HumanMessage
+from langchain.schema.messages import AIMessage
+from langchain.schema.messages import AIMessageChunk
+from langchain.schema.output import ChatGeneration
+from langchain.schema.output import ChatGenerationChunk
+from langchain.schema.output import ChatResult
+from pydantic import BaseModel
+from pydantic import ValidationError
+
+from socratic.chat import event_logging
+from socratic.chat.utils.llm_cache import LLMResponseCache
+from socratic.chat.utils.llm_cache import LLMResponseMissError
+from socratic.chat.utils.call_policy import CallPolicy
+from socratic.chat.utils.socratic_chat_openai import JSON_MODEL_KWARGS
+from socratic.chat.utils.socratic_chat_openai import SocraticChatModel
+from socratic.chat.utils.socratic_chat_openai import SocraticChatOpenAI
+from socratic.chat.workflow_cache import InMemoryWorkflowCacheBackend
+
+
+@pytest.fixture()
+def api_calls(monkeypatch):
+    calls = []
+
+    async def agenerate(_self, messages, *_args, **_kwargs):
+        calls.append(messages)
+        return ChatResult(
+            generations=[
+                ChatGeneration(
+                    message=AIMessage(content=f"Reply {len(calls)}."),
+                    generation_info={"finish_reason": "stop"},
+                )
+            ],
+            llm_output={
+                "token_usage": {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3},
+                "model_name": "gpt-4",
+            },
+        )
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ChatOpenAI, "_agenerate", agenerate)
+    return calls
+
+
+@pytest.fixture()
+def streamed_calls(monkeypatch):
+    calls = []
+
+    async def astream(_self, messages, *_args, **_kwargs):
+        calls.append(messages)
+        for token in ["Streamed ", f"{len(calls)}."]:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ChatOpenAI, "_astream", astream)
+    return calls
+
+
+@pytest.fixture()
+def events(monkeypatch):
+    logged = []
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", logged.append)
+    return logged
+
+
+@pytest.mark.asyncio()
+async def test_responses_are_cached(api_calls, events):
+    cache = LLMResponseCache(InMemoryWorkflowCacheBackend())
+    chat = SocraticChatOpenAI(model="gpt-4", response_cache=cache)
+
+    first = await chat.ainvoke([HumanMessage(content="Hi.")])
+    second = await chat.ainvoke([HumanMessage(content="Hi.")])
+    assert first.content == second.content == "Reply 1."
+    assert len(api_calls) == 1
+    assert [x.cached for x in events] == [False, False, True, True]
+    assert events[-1].token_usage.total_tokens == 3
+
+    await chat.ainvoke([HumanMessage(content="Hello.")])
+    await SocraticChatOpenAI(model="gpt-4", temperature=0, response_cache=cache).ainvoke(
+        [HumanMessage(content="Hi.")]
+    )
+    assert len(api_calls) == 3
+
+
+@pytest.mark.asyncio()
+async def test_replay_mode_never_calls_the_api(api_calls):
+    backend = InMemoryWorkflowCacheBackend()
+    recorder = SocraticChatOpenAI(model="gpt-4", response_cache=LLMResponseCache(backend))
+    await recorder.ainvoke([HumanMessage(content="Hi.")])
+
+    replay_cache = LLMResponseCache(backend, mode="replay")
+    player = SocraticChatOpenAI(model="gpt-4", response_cache=replay_cache)
+    assert (await player.ainvoke([HumanMessage(content="Hi.")])).content == "Reply 1."
+    with pytest.raises(LLMResponseMissError):
+        await player.ainvoke([HumanMessage(content="Bye.")])
+    assert len(api_calls) == 1
+
+
+@pytest.mark.asyncio()
+async def test_streamed_responses_are_cached(api_calls, streamed_calls, events):
+    backend = InMemoryWorkflowCacheBackend()
+    chat = SocraticChatOpenAI(model="gpt-4", response_cache=LLMResponseCache(backend))
+
+    first = [x.content async for x in chat.astream([HumanMessage(content="Hi.")])]
+    second = [x.content async for x in chat.astream([HumanMessage(content="Hi.")])]
+    assert first == ["Streamed ", "1."]
+    assert second == ["Streamed 1."]
+    assert [x.cached for x in events] == [False, False, True, True]
+
+    # Streamed and non-streamed calls share responses.
+    assert (await chat.ainvoke([HumanMessage(content="Hi.")])).content == "Streamed 1."
+    assert not api_calls
+    assert len(streamed_calls) == 1
+
+    player = SocraticChatOpenAI(
+        model="gpt-4", response_cache=LLMResponseCache(backend, mode="replay")
+    )
+    with pytest.raises(LLMResponseMissError):
+        async for _ in player.astream([HumanMessage(content="Bye.")]):
+            pass
+    assert len(streamed_calls) == 1
+
+
+class Answer(BaseModel):
+    value: int
+
+
+@pytest.fixture()
+def json_calls(monkeypatch):
+    outputs = []
+    calls = []
+
+    async def agenerate(_self, messages, *_args, **_kwargs):
+        calls.append(messages)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=outputs.pop(0)))],
+            llm_output={
+                "token_usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                "model_name": "gpt-4",
+            },
+        )
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ChatOpenAI, "_agenerate", agenerate)
+    return outputs, calls
+
+
+def _json_chat_model(cache: LLMResponseCache, max_attempts: int) -> SocraticChatModel:
+    chat_model = SocraticChatModel(
+        model="gpt-4",
+        response_cache=cache,
+        policy=CallPolicy(max_attempts=max_attempts, backoff_initial=0.001),
+    )
+    # Ignore SOCRATIC_LLM_BACKEND.
+    chat_model.fake_backend = None
+    return chat_model
+
+
+@pytest.mark.asyncio()
+async def test_invalid_outputs_are_not_cached(json_calls):
+    outputs, calls = json_calls
+    cache = LLMResponseCache(InMemoryWorkflowCacheBackend())
+    chat_model = _json_chat_model(cache, max_attempts=1)
+    prompt = ChatPromptTemplate.from_messages([("human", "Answer?")])
+
+    outputs.extend(['{"value": "x"}', '{"value": 3}'])
+    with pytest.raises(ValidationError):
+        await chat_model.gen_json(prompt, Answer)
+    assert await chat_model.gen_json(prompt, Answer) == Answer(value=3)
+    assert await chat_model.gen_json(prompt, Answer) == Answer(value=3)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio()
+async def test_retries_bypass_cached_responses(json_calls):
+    outputs, calls = json_calls
+    cache = LLMResponseCache(InMemoryWorkflowCacheBackend())
+    chat_model = _json_chat_model(cache, max_attempts=2)
+    prompt = ChatPromptTemplate.from_messages([("human", "Answer?")])
+
+    # An invalid output recorded outside gen_json, e.g. by an older version.
+    outputs.append('{"value": "x"}')
+    await chat_model._get_chain(prompt, "gpt-4", JSON_MODEL_KWARGS).ainvoke({})
+
+    outputs.append('{"value": 3}')
+    assert await chat_model.gen_json(prompt, Answer) == Answer(value=3)
+    assert len(calls) == 2
+    # The valid output replaced the invalid one.
+    assert await _json_chat_model(cache, max_attempts=1).gen_json(prompt, Answer) == Answer(value=3)
+    assert len(calls) == 2
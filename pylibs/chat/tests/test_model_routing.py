@@ -0,0 +1,92 @@
+import httpx
+import openai
+import pytest
+from langchain.prompts import ChatPromptTemplate
+from pydantic import BaseModel
+
+from socratic.chat import event_logging
+from socratic.chat.utils.model_routing import LLMModelEscalatedEvent
+from socratic.chat.utils.model_routing import ModelRouter
+from socratic.chat.utils.model_routing import with_model_tier
+from socratic.chat.utils.socratic_chat_openai import SocraticChatModel
+
+
+class Answer(BaseModel):
+    value: int
+
+
+class FakeChain:
+    def __init__(self, output: str):
+        self.output = output
+
+    async def ainvoke(self, _input, config=None):  # pylint: disable=unused-argument
+        return self.output
+
+
+def test_tiers_are_configurable(monkeypatch):
+    monkeypatch.setenv("SOCRATIC_LLM_TIERS", '{"fast": ["cheap"], "eval": ["strong"]}')
+    router = ModelRouter.from_env()
+    assert router.models("fast") == ["cheap"]
+    assert router.models() == router.models("default")
+    with with_model_tier("eval"):
+        assert router.models() == ["strong"]
+    with pytest.raises(ValueError):
+        router.models("unknown")
+
+
+@pytest.mark.asyncio()
+async def test_invalid_outputs_escalate(monkeypatch):
+    events = []
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", events.append)
+    outputs = {"cheap": '{"value": "x"}', "strong": '{"value": 3}'}
+    used = []
+
+    def get_chain(_prompt, model, *_args, **_kwargs):
+        used.append(model)
+        return FakeChain(outputs[model])
+
+    router = ModelRouter({"default": ["strong"], "fast": ["cheap", "strong"]})
+    chat_model = SocraticChatModel(router=router)
+    # Ignore SOCRATIC_LLM_BACKEND.
+    chat_model.fake_backend = None
+    monkeypatch.setattr(chat_model, "_get_chain", get_chain)
+    prompt = ChatPromptTemplate.from_messages([("human", "Answer?")])
+
+    assert await chat_model.gen_json(prompt, Answer) == Answer(value=3)
+    assert used == ["strong"]
+    with with_model_tier("fast"):
+        assert await chat_model.gen_json(prompt, Answer) == Answer(value=3)
+    assert used == ["strong", "cheap", "strong"]
+    escalations = [x for x in events if isinstance(x, LLMModelEscalatedEvent)]
+    assert [(x.from_model, x.to_model) for x in escalations] == [("cheap", "strong")]
+    assert escalations[0].tier == "fast"
+
+
+def test_models_breaching_their_slo_are_diverted(monkeypatch):
+    events = []
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", events.append)
+    router = ModelRouter(
+        {"default": ["primary"]}, fallbacks={"primary": "backup"}, slo=1.0, probe_interval=0.0
+    )
+    for _ in range(10):
+        with pytest.raises(openai.APIConnectionError):
+            with router.track("primary"):
+                raise openai.APIConnectionError(request=httpx.Request("POST", "http://test"))
+
+    # The first call is diverted, and the next one probes the primary.
+    assert router.models() == ["backup"]
+    assert router.models() == ["primary"]
+    with router.track("primary"):
+        pass
+    assert router.models() == ["primary"]
+    assert [x.diverted for x in events] == [True, False]
+    assert router.as_dict()["primary"]["samples"] == 0
+
+
+def test_hanging_calls_divert_traffic():
+    router = ModelRouter({"default": ["primary"]}, fallbacks={"primary": "backup"}, slo=0.0)
+    health = router._get_health("primary")  # pylint: disable=protected-access
+    for _ in range(health.min_samples):
+        health.start()
+    assert router.models() == ["backup"]
+    assert router.as_dict()["primary"]["in_flight"] == health.min_samples
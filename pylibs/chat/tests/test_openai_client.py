@@ -0,0 +1,82 @@
+import asyncio
+import json
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+from langchain.prompts import ChatPromptTemplate
+
+from socratic.chat.utils import openai_client
+from socratic.chat.utils.openai_client import OpenAIClientConfig
+from socratic.chat.utils.openai_client import OpenAIClientPool
+from socratic.chat.utils.socratic_chat_openai import SocraticChatModel
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps(
+            {
+                "id": "chatcmpl-0",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "gpt-4",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "Hello."},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture()
+def pool(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_API_BASE", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.delenv("SOCRATIC_LLM_BACKEND", raising=False)
+    pool = OpenAIClientPool(OpenAIClientConfig())
+    monkeypatch.setattr(openai_client, "_pool", pool)
+    yield pool
+    server.shutdown()
+    server.server_close()
+
+
+def test_one_client_per_loop(pool):
+    async def get_client():
+        client = pool.async_client()
+        assert client is pool.async_client()
+        return client
+
+    assert asyncio.run(get_client()) is not asyncio.run(get_client())
+
+
+@pytest.mark.asyncio()
+async def test_connections_and_chains_are_reused(pool):
+    prompt = ChatPromptTemplate.from_messages([("human", "Say hello to {name}.")])
+    chat_model = SocraticChatModel("gpt-4")
+    for name in ["Ann", "Bob", "Cy"]:
+        assert await chat_model.gen_string(prompt, name=name) == "Hello."
+
+    stats = pool.stats.as_dict()
+    assert stats["requests"] == 3
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 2
+    assert stats["chain_misses"] == 1
+    assert stats["chain_hits"] == 2
@@ -0,0 +1,97 @@
+from enum import Enum
+from typing import Optional
+
+import pytest
+from langchain.prompts import ChatPromptTemplate
+from pydantic import BaseModel
+
+from socratic.chat import event_logging
+from socratic.chat.utils.call_policy import CallPolicy
+from socratic.chat.utils.partial_json import PartialJSONError
+from socratic.chat.utils.partial_json import PartialJSONValidator
+from socratic.chat.utils.socratic_chat_openai import ChatGPTOutputRejectedEvent
+from socratic.chat.utils.socratic_chat_openai import SocraticChatModel
+
+
+class Segment(str, Enum):
+    INTRO = "intro"
+    DIRECTION_1 = "direction-1"
+
+
+class SegmentResult(BaseModel):
+    segment: Segment
+    summary: str
+
+
+class Termination(BaseModel):
+    should_conclude: bool
+    results: list[SegmentResult]
+    reason: Optional[str] = None
+
+
+VALID = '{"should_conclude": true, "results": [{"segment": "direction-1", "summary": "ok"}]}'
+
+
+def _chunks(text: str, size: int = 4) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_valid_outputs_are_parsed_incrementally():
+    validator = PartialJSONValidator(Termination)
+    partials = [dict(validator.partial) for chunk in _chunks(VALID) if validator.feed(chunk)]
+    assert any(x.get("should_conclude") is True and "results" not in x for x in partials)
+    assert validator.finish().results[0].segment == Segment.DIRECTION_1
+
+
+@pytest.mark.parametrize(
+    "output",
+    [
+        'Sure! {"should_conclude": true',
+        '{"should_conclude": "maybe", "results": [',
+        '{"should_conclude": true, "results": [{"segment": "dir", "summary": "a"}, {"segment": "e',
+        '{"should_conclude": true, "results": [{"segment": "direction-2"',
+    ],
+)
+def test_invalid_outputs_are_detected_early(output: str):
+    validator = PartialJSONValidator(Termination)
+    with pytest.raises(PartialJSONError):
+        for chunk in _chunks(output):
+            validator.feed(chunk)
+
+
+class FakeStreamingChain:
+    def __init__(self, outputs: list[str]):
+        self.outputs = outputs
+        self.consumed = 0
+
+    async def astream(self, _input, config=None):  # pylint: disable=unused-argument
+        for chunk in _chunks(self.outputs.pop(0)):
+            self.consumed += 1
+            yield chunk
+
+
+@pytest.mark.asyncio()
+async def test_gen_json_aborts_and_retries(monkeypatch):
+    invalid = '{"should_conclude": "maybe", "results": []' + " " * 400 + "}"
+    chain = FakeStreamingChain([invalid, VALID])
+    chat_model = SocraticChatModel(
+        policy=CallPolicy(max_attempts=2, backoff_initial=0.001),
+        stream_validation=True,
+    )
+    # Ignore SOCRATIC_LLM_BACKEND.
+    chat_model.fake_backend = None
+    monkeypatch.setattr(chat_model, "_get_chain", lambda *_args, **_kwargs: chain)
+    events: list[event_logging.Event] = []
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", events.append)
+    prompt = ChatPromptTemplate.from_messages([("human", "Terminate?")])
+
+    result = await chat_model.gen_json(prompt, Termination)
+    assert result.should_conclude
+    assert chain.consumed < len(_chunks(invalid)) / 2 + len(_chunks(VALID))
+    rejected = [x for x in events if isinstance(x, ChatGPTOutputRejectedEvent)]
+    assert len(rejected) == 1
+    assert invalid.startswith(rejected[0].llm_output.value)
+
+    chain.outputs = [VALID]
+    partials = [x async for x in chat_model.stream_json(prompt, Termination)]
+    assert partials[-1] == Termination.model_validate_json(VALID).model_dump(mode="json")
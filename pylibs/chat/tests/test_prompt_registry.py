@@ -0,0 +1,27 @@
+from socratic.chat.utils.prompt_registry import PromptRegistry
+
+
+def test_templates_are_compiled_once():
+    registry = PromptRegistry()
+    messages = [("system", "You know {persona_background}."), ("human", "Ask about {topic}.")]
+    template = registry.get(messages, persona_background="")
+    assert registry.get(messages, persona_background="") is template
+    assert registry.get(list(messages), persona_background="") is template
+    assert (registry.hits, registry.misses) == (2, 1)
+    assert template.input_variables == ["topic"]
+
+    other = registry.get(messages, persona_background="logic")
+    assert other is not template
+    assert "logic" in other.format_messages(topic="sets")[0].content
+
+
+def test_least_recently_used_templates_are_evicted():
+    registry = PromptRegistry(max_size=2)
+    first = registry.get([("human", "1")])
+    registry.get([("human", "2")])
+    assert registry.get([("human", "1")]) is first
+    registry.get([("human", "3")])
+    assert registry.get([("human", "1")]) is first
+    assert registry.misses == 3
+    registry.get([("human", "2")])
+    assert registry.misses == 4
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from langchain.chat_models import ChatOpenAI
+from langchain.schema import HumanMessage
+from langchain.schema.messages import AIMessageChunk
+from langchain.schema.output import ChatGenerationChunk
+
+from socratic.chat.utils.rate_limiter import InMemoryTokenBucket
+from socratic.chat.utils.rate_limiter import Priority
+from socratic.chat.utils.rate_limiter import RateLimiter
+from socratic.chat.utils.rate_limiter import SQLiteTokenBucket
+from socratic.chat.utils.rate_limiter import with_llm_priority
+from socratic.chat.utils.socratic_chat_openai import SocraticChatOpenAI
+
+
+@pytest.mark.asyncio()
+async def test_calls_are_admitted_by_priority():
+    limiter = RateLimiter(InMemoryTokenBucket(1, 20), None)
+    admitted = []
+
+    async def call(name: str, priority: int):
+        with with_llm_priority(priority):
+            await limiter.acquire(1)
+        admitted.append(name)
+
+    await call("first", Priority.BATCH)
+    batch = asyncio.create_task(call("batch", Priority.BATCH))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(call("interactive", Priority.INTERACTIVE))
+    assert limiter.stats.queue_depth == 1
+    await asyncio.gather(batch, interactive)
+
+    assert admitted == ["first", "interactive", "batch"]
+    stats = limiter.stats.as_dict()
+    assert stats["queue_depth"] == 0
+    assert stats["waited_requests"] == 2
+    assert stats["max_wait_seconds"] > 0
+
+
+@pytest.mark.asyncio()
+async def test_tokens_are_settled():
+    bucket = InMemoryTokenBucket(1000, 0.001)
+    limiter = RateLimiter(None, bucket)
+    await limiter.acquire(900)
+    assert bucket.try_take(200) > 0
+    await limiter.settle(900, 100)
+    assert bucket.try_take(200) == 0
+
+
+def test_sqlite_buckets_are_shared(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    first = SQLiteTokenBucket(path, "requests", 2, 0.001)
+    second = SQLiteTokenBucket(path, "requests", 2, 0.001)
+    assert first.try_take(1) == 0
+    assert second.try_take(1) == 0
+    assert first.try_take(1) > 0
+    second.put(1)
+    assert first.try_take(1) == 0
+
+
+@pytest.mark.asyncio()
+async def test_sqlite_buckets_admit_calls(tmp_path):
+    limiter = RateLimiter(SQLiteTokenBucket(str(tmp_path / "buckets.db"), "requests", 1, 20), None)
+    await asyncio.gather(limiter.acquire(1), limiter.acquire(1))
+    assert limiter.stats.waited_requests == 1
+
+
+def test_each_event_loop_has_its_own_queue():
+    limiter = RateLimiter(InMemoryTokenBucket(1, 20), None)
+    other_loop = asyncio.new_event_loop()
+
+    async def leave_call_queued():
+        await limiter.acquire(1)
+        other_loop.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+
+    async def call():
+        await asyncio.wait_for(limiter.acquire(1), 1)
+
+    try:
+        # The other loop stops running with a call still queued.
+        other_loop.run_until_complete(leave_call_queued())
+        asyncio.run(call())
+    finally:
+        for task in asyncio.all_tasks(other_loop):
+            task.cancel()
+        other_loop.run_until_complete(asyncio.sleep(0))
+        other_loop.close()
+
+
+@pytest.mark.asyncio()
+async def test_streamed_calls_are_settled(monkeypatch):
+    async def astream(*_args, **_kwargs):
+        for token in ["Hello", " there."]:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ChatOpenAI, "_astream", astream)
+    bucket = InMemoryTokenBucket(1000, 0.001)
+    limiter = RateLimiter(None, bucket, completion_tokens=500)
+    chat = SocraticChatOpenAI(model="gpt-4", rate_limiter=limiter)
+
+    assert [x.content async for x in chat.astream([HumanMessage(content="Hi.")])]
+    assert 0 < limiter.stats.used_tokens < 50
+    assert bucket.try_take(900) == 0
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from socratic.chat import ConversationModel
+from socratic.chat import StepExecutor
+from socratic.chat import get_user_reply
+from socratic.chat import post_assistant_reply
+from socratic.chat.schemas import Message
+from socratic.chat.schemas import MessageFormatter
+from socratic.chat.utils.render_cache import JSONListSerializer
+from socratic.chat.utils.render_cache import RenderCache
+
+
+def test_only_new_items_are_rendered():
+    cache = RenderCache[int](str, lambda x: x, separator=",")
+    items = [1, 2, 3]
+    assert cache.render(items) == "1,2,3"
+    items.append(4)
+    assert cache.render(items) == "1,2,3,4"
+    assert cache.rendered_items == 4
+    assert cache.render([1, 2]) == "1,2"
+    assert cache.render([1, 5]) == "1,5"
+    assert cache.render([]) == ""
+    assert cache.rendered_items == 5
+
+
+def test_oldest_renderings_are_evicted():
+    cache = RenderCache[int](str, lambda x: x, maxsize=2)
+    cache.render([1, 2, 3])
+    cache.render([3, 2, 1])
+    assert cache.rendered_items == 4
+
+
+def test_histories_render_like_before():
+    format_messages = MessageFormatter(human_name="Student", assistant_name="Professor")
+    history = [Message(is_assistant=True, message="Hello.")]
+    assert format_messages(history) == "Professor: Hello.\n"
+    history.append(Message(is_assistant=False, message="Hi."))
+    rebuilt = [Message.model_validate(x.model_dump()) for x in history]
+    assert format_messages(rebuilt) == "Professor: Hello.\nStudent: Hi.\n"
+
+
+def test_lists_serialize_like_json_dumps():
+    serialize_list = JSONListSerializer()
+    items = [Message(is_assistant=True, message="Hello.")]
+    for _ in range(3):
+        assert serialize_list(items) == json.dumps([x.model_dump() for x in items])
+        items.append(Message(is_assistant=False, message='"Hi"'))
+    assert serialize_list([]) == "[]"
+    assert serialize_list.rendered_items == 2
+
+
+def test_replaced_items_are_rendered_again():
+    serialize_list = JSONListSerializer()
+    items = [Message(is_assistant=True, message="Hello."), Message(is_assistant=False, message="")]
+    serialize_list(items)
+    items[1] = Message(is_assistant=False, message="Hi.")
+    assert serialize_list(items) == json.dumps([x.model_dump() for x in items])
+    assert serialize_list.rendered_items == 3
+
+
+model = ConversationModel("render-cache-echo", lambda: None)
+serialize_replies = JSONListSerializer()
+
+
+@model.chain
+async def quote(reply: str) -> Message:
+    """Quotes a user reply."""
+    return Message(is_assistant=False, message=reply)
+
+
+@model.chain
+async def summarize(quotes: list[Message]) -> str:
+    """Serializes every quote so far."""
+    return serialize_replies(quotes)
+
+
+@model.entry
+async def entry():
+    """Echos every quote so far."""
+    quotes: list[Message] = []
+    await post_assistant_reply("[]")
+    while True:
+        quotes.append(await quote(await get_user_reply()))
+        await post_assistant_reply(await summarize(quotes))
+
+
+@pytest.mark.asyncio()
+async def test_replayed_steps_reuse_serialized_items():
+    executor = StepExecutor(model, [], [], {})
+    await executor.run()
+    for reply in ["a", "b", "c"]:
+        executor.chat_history.append(reply)
+        # Every step replays the conversation, parsing the recorded quotes into new objects.
+        message = await executor.run()
+        assert message == json.dumps([x.model_dump() for x in _quotes(executor.chat_history)])
+    assert serialize_replies.rendered_items == 3
+
+
+def _quotes(chat_history: list[str]) -> list[Message]:
+    return [Message(is_assistant=False, message=x) for x in chat_history[1::2]]
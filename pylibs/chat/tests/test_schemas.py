@@ -0,0 +1,64 @@
+from socratic.chat import event_logging
+from socratic.chat.schemas import HistoryRenderedEvent
+from socratic.chat.schemas import Message
+from socratic.chat.schemas import MessageFormatter
+from socratic.chat.utils.tokens import count_tokens
+
+
+def _history(count: int) -> list[Message]:
+    return [
+        Message(is_assistant=i % 2 == 1, message=f"Message {i}. " + "Some words. " * 20)
+        for i in range(count)
+    ]
+
+
+def test_history_within_budget_is_kept_verbatim(monkeypatch):
+    events = []
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", events.append)
+    format_messages = MessageFormatter(human_name="Student", assistant_name="Professor")
+    history = _history(3)
+
+    text = format_messages(history)
+    assert text.startswith("Student: Message 0.")
+    assert format_messages(history, max_tokens=10_000) == text
+    assert [(x.verbatim_messages, x.clipped_messages, x.elided_messages) for x in events] == [
+        (3, 0, 0)
+    ]
+
+
+def test_older_messages_are_clipped_then_elided(monkeypatch):
+    events = []
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", events.append)
+    format_messages = MessageFormatter(
+        human_name="Student", assistant_name="Professor", clipped_message_tokens=20
+    )
+    history = _history(20)
+
+    rendered = format_messages.render(history, max_tokens=300)
+    assert rendered.tokens <= 300
+    assert rendered.tokens == count_tokens(rendered.text)
+    assert rendered.verbatim_messages >= 1
+    assert rendered.clipped_messages >= 1
+    assert rendered.elided_messages >= 1
+    assert sum(
+        [rendered.verbatim_messages, rendered.clipped_messages, rendered.elided_messages]
+    ) == len(history)
+    assert rendered.text.startswith(f"({rendered.elided_messages} earlier messages omitted)")
+    assert rendered.text.endswith(f"Professor: {history[-1].message}\n")
+    assert isinstance(events[-1], HistoryRenderedEvent)
+    assert events[-1].history_budget == 300
+    assert events[-1].history_tokens == rendered.tokens
+
+
+def test_last_message_is_always_kept(monkeypatch):
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", lambda _: None)
+    format_messages = MessageFormatter(human_name="Student", assistant_name="Professor")
+
+    rendered = format_messages.render(_history(2), max_tokens=1)
+    assert rendered.text == "(1 earlier message omitted)\nProfessor: Mess...\n"
+    assert (rendered.verbatim_messages, rendered.clipped_messages) == (0, 1)
+
+    # With room, it is clipped to the budget rather than to `clipped_message_tokens`.
+    long_message = Message(is_assistant=True, message="Some words. " * 100)
+    rendered = format_messages.render([long_message], max_tokens=200)
+    assert 150 < rendered.tokens <= 200
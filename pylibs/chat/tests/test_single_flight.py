@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from langchain.chat_models import ChatOpenAI
+from langchain.schema import HumanMessage
+from langchain.schema.messages import AIMessage
+from langchain.schema.output import ChatGeneration
+from langchain.schema.output import ChatResult
+
+from socratic.chat import event_logging
+from socratic.chat.utils.single_flight import SingleFlight
+from socratic.chat.utils.single_flight import without_single_flight
+from socratic.chat.utils.socratic_chat_openai import SocraticChatOpenAI
+
+
+@pytest.mark.asyncio()
+async def test_concurrent_calls_are_coalesced():
+    flight = SingleFlight[int]()
+    calls = []
+
+    async def compute() -> int:
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    results = await asyncio.gather(*[flight.run("key", compute) for _ in range(5)])
+    assert results == [1] * 5
+    assert await flight.run("key", compute) == 2
+    with without_single_flight():
+        bypassed = [flight.run("key", compute) for _ in range(2)]
+        assert await asyncio.gather(*bypassed) == [4, 4]
+    assert flight.as_dict() == {"calls": 4, "coalesced": 4}
+
+
+@pytest.mark.asyncio()
+async def test_calls_are_cancelled_with_their_last_caller():
+    flight = SingleFlight[str]()
+    finished = []
+
+    async def compute() -> str:
+        await asyncio.sleep(0.02)
+        finished.append(None)
+        return "done"
+
+    first = asyncio.create_task(flight.run("key", compute))
+    second = asyncio.create_task(flight.run("key", compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "done"
+
+    lonely = asyncio.create_task(flight.run("key", compute))
+    await asyncio.sleep(0)
+    lonely.cancel()
+    await asyncio.sleep(0.05)
+    assert len(finished) == 1
+
+
+@pytest.mark.asyncio()
+async def test_identical_llm_calls_are_coalesced(monkeypatch):
+    calls = []
+
+    async def agenerate(_self, messages, *_args, **_kwargs):
+        calls.append(messages)
+        await asyncio.sleep(0.01)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content="Hello."))],
+            llm_output={
+                "token_usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                "model_name": "gpt-4",
+            },
+        )
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ChatOpenAI, "_agenerate", agenerate)
+    events = []
+    monkeypatch.setattr(event_logging, "_current_event_logging_handler", events.append)
+    chat = SocraticChatOpenAI(model="gpt-4", single_flight=SingleFlight())
+
+    replies = await asyncio.gather(
+        chat.ainvoke([HumanMessage(content="Hi.")]),
+        chat.ainvoke([HumanMessage(content="Hi.")]),
+        chat.ainvoke([HumanMessage(content="Bye.")]),
+    )
+    assert [x.content for x in replies] == ["Hello."] * 3
+    assert len(calls) == 2
+    assert len(events) == 4
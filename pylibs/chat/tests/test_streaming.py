@@ -0,0 +1,91 @@
+from typing import AsyncIterator
+
+import pytest
+
+from socratic.chat import ContinuousExecutor
+from socratic.chat import ConversationModel
+from socratic.chat import StepEvent
+from socratic.chat import StepExecutor
+from socratic.chat import get_user_reply
+from socratic.chat import post_assistant_reply
+
+from .model_prime_counter import model as prime_counter
+
+model = ConversationModel("streaming-echo", lambda: None)
+
+started_streams: list[str] = []
+
+
+async def spell(message: str) -> AsyncIterator[str]:
+    started_streams.append(message)
+    for char in message:
+        yield char
+
+
+@model.entry
+async def entry() -> list[str]:
+    """Spells the greeting and every reply, until "bye"."""
+    posted = [await post_assistant_reply(spell("Hi"))]
+    while True:
+        reply = await get_user_reply()
+        if reply == "bye":
+            break
+        posted.append(await post_assistant_reply(spell(reply)))
+    posted.append(await post_assistant_reply("Bye."))
+    return posted
+
+
+async def collect(chunks: AsyncIterator[str]) -> list[str]:
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.asyncio()
+@pytest.mark.parametrize("keep_alive", [False, True])
+async def test_step_executor_stream(keep_alive: bool):
+    started_streams.clear()
+    executor = StepExecutor(model, [], [], {}, keep_alive=keep_alive)
+
+    assert await collect(executor.stream()) == ["H", "i"]
+    executor.chat_history.append("abc")
+    assert await collect(executor.stream()) == ["a", "b", "c"]
+    executor.chat_history.append("bye")
+    assert await collect(executor.stream()) == ["Bye."]
+
+    assert executor.chat_history == ["Hi", "abc", "abc", "bye", "Bye."]
+    assert executor.get_result() == ["Hi", "abc", "Bye."]
+    # Replays return recorded replies without starting their streams again.
+    assert started_streams == ["Hi", "abc"]
+
+
+@pytest.mark.asyncio()
+async def test_continuous_executor_chunks():
+    chunks: list[str] = []
+
+    async def on_assistant_chunk(chunk: str):
+        chunks.append(chunk)
+
+    inputs = ["ok", "bye"]
+    messages: list[str] = []
+    async with ContinuousExecutor(model, {}, on_assistant_chunk=on_assistant_chunk) as executor:
+        async for message in executor.assistant_messages():
+            messages.append(message)
+            if executor.has_ended:
+                break
+            await executor.post_reply(inputs.pop(0))
+
+    assert messages == ["Hi", "ok", "Bye."]
+    assert chunks == ["H", "i", "o", "k"]
+
+
+@pytest.mark.asyncio()
+async def test_step_executor_stream_events():
+    executor = StepExecutor(prime_counter, [], [], {})
+    assert [x async for x in executor.stream_events()] == [
+        StepEvent("chunk", "Enter an integer, and I will tell you if it is a prime number.")
+    ]
+    executor.chat_history.append("2")
+    assert [x async for x in executor.stream_events()] == [
+        StepEvent("workflow_done", "convert_to_int"),
+        StepEvent("workflow_done", "check_prime"),
+        StepEvent("chunk", "Integer 2 is a prime."),
+    ]
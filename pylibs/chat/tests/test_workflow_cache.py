@@ -0,0 +1,120 @@
+from typing import Any
+from typing import Optional
+
+import pytest
+
+from socratic.chat import ConversationModel
+from socratic.chat import StepExecutor
+from socratic.chat import get_user_reply
+from socratic.chat import post_assistant_reply
+from socratic.chat.workflow_cache import InMemoryWorkflowCacheBackend
+from socratic.chat.workflow_cache import RedisWorkflowCacheBackend
+from socratic.chat.workflow_cache import SQLiteWorkflowCacheBackend
+from socratic.chat.workflow_cache import WorkflowCache
+
+shared_cache = WorkflowCache(InMemoryWorkflowCacheBackend(), version="v1")
+
+model = ConversationModel("cached-greeter", lambda: None)
+
+greeted_names: list[str] = []
+
+
+@model.chain(cache=shared_cache)
+async def greet(name: str) -> str:
+    """Greets someone."""
+    greeted_names.append(name)
+    return f"Hello, {name}."
+
+
+@model.entry
+async def entry(name: str) -> None:
+    """Greets, then waits for a reply."""
+    await post_assistant_reply(await greet(name))
+    await get_user_reply()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values: dict[str, str] = {}
+        self.expirations: dict[str, Optional[int]] = {}
+
+    def get(self, name: str) -> Any:
+        return self.values.get(name)
+
+    def set(self, name: str, value: str, ex: Optional[int] = None) -> Any:
+        self.values[name] = value
+        self.expirations[name] = ex
+
+
+def test_in_memory_backend_evicts_least_recently_used():
+    backend = InMemoryWorkflowCacheBackend(max_size=2)
+    backend.set("a", 1, None)
+    backend.set("b", 2, None)
+    assert backend.get("a") == (True, 1)
+    backend.set("c", 3, None)
+    assert backend.get("b") == (False, None)
+    assert backend.get("a") == (True, 1)
+    assert backend.get("c") == (True, 3)
+
+
+def test_in_memory_backend_expires():
+    backend = InMemoryWorkflowCacheBackend()
+    backend.set("a", 1, -1)
+    assert backend.get("a") == (False, None)
+
+
+def test_sqlite_backend(tmp_path):
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteWorkflowCacheBackend(path, max_size=2)
+    backend.set("a", {"x": [1, 2]}, None)
+    backend.set("b", "b", None)
+    backend.set("expired", "expired", -1)
+    assert backend.get("expired") == (False, None)
+    backend.set("c", "c", None)
+
+    # Entries are shared by every connection to the same file.
+    other = SQLiteWorkflowCacheBackend(path, max_size=2)
+    assert other.get("a") == (False, None)
+    assert other.get("b") == (True, "b")
+    assert other.get("c") == (True, "c")
+
+
+@pytest.mark.asyncio()
+async def test_sqlite_backend_evicts_periodically(tmp_path):
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteWorkflowCacheBackend(path, max_size=2, eviction_interval=3)
+    for key in ["a", "b", "c"]:
+        await backend.aset(key, key, None)
+    assert await backend.aget("a") == (False, None)
+    await backend.aset("d", "d", None)
+    assert await backend.aget("b") == (True, "b")
+
+
+def test_redis_backend():
+    client = FakeRedis()
+    backend = RedisWorkflowCacheBackend(client)
+    backend.set("a", {"x": 1}, 0.5)
+    assert backend.get("a") == (True, {"x": 1})
+    assert backend.get("b") == (False, None)
+    assert client.expirations == {"socratic:workflow_cache:a": 1}
+
+
+@pytest.mark.asyncio()
+async def test_chain_cache_shared_across_conversations():
+    greeted_names.clear()
+    outputs = []
+    for name in ["Ada", "Ada", "Bob"]:
+        executor = StepExecutor(model, [], [], {})
+        outputs.append(await executor.run(name))
+        # Results served by the shared cache are still recorded for replay.
+        assert len(executor.new_workflow_results) == 1
+
+    assert outputs == ["Hello, Ada.", "Hello, Ada.", "Hello, Bob."]
+    assert greeted_names == ["Ada", "Bob"]
+
+
+def test_cache_key_depends_on_version():
+    greet_request = model.definitions[0].workflow_model.build_input_request(("Ada",), {})
+    other_cache = WorkflowCache(shared_cache.backend, version="v2")
+    assert shared_cache.key("greet", greet_request) != other_cache.key("greet", greet_request)
+    assert shared_cache.key("greet", greet_request) == shared_cache.key("greet", greet_request)
@@ -0,0 +1,48 @@
+import uuid
+
+from socratic.chat.workflow_results import WorkflowResults
+from socratic.chat.workflow_results import migrate_legacy_workflow_results
+
+scope_a = uuid.UUID("12345678-1234-5678-1234-567812345678")
+scope_b = uuid.UUID("87654321-4321-8765-4321-876543218765")
+
+
+def test_roundtrip():
+    results = WorkflowResults()
+    results.set(scope_a, (0,), "x")
+    results.set(scope_a, (1, 0), {"y": 1})
+    results.set(scope_b, (0,), None)
+
+    dumped = results.dump()
+    assert dumped == {
+        str(scope_a): {"0": "x", "1/0": {"y": 1}},
+        str(scope_b): {"0": None},
+    }
+
+    loaded = WorkflowResults(dumped)
+    assert loaded.get(scope_a, (1, 0)) == (True, {"y": 1})
+    assert loaded.get(scope_b, (0,)) == (True, None)
+    assert loaded.get(scope_b, (1,)) == (False, None)
+    assert loaded.get(uuid.uuid4(), (0,)) == (False, None)
+    assert len(loaded) == 3
+
+
+def test_load_merges_scopes():
+    results = WorkflowResults({str(scope_a): {"0": "x", "1": "y"}})
+    results.load({str(scope_a): {"1": "z", "2": "w"}})
+    assert results.dump() == {str(scope_a): {"0": "x", "1": "z", "2": "w"}}
+
+
+def test_copy():
+    results = WorkflowResults({str(scope_a): {"0": "x"}})
+    copied = results.copy()
+    copied.set(scope_a, (1,), "y")
+    assert results.get(scope_a, (1,)) == (False, None)
+
+
+def test_migrate_legacy():
+    legacy = {f"{scope_a}/0": "x", f"{scope_a}/1/0": "y", f"{scope_b}/0": "z"}
+    assert migrate_legacy_workflow_results(legacy) == {
+        str(scope_a): {"0": "x", "1/0": "y"},
+        str(scope_b): {"0": "z"},
+    }
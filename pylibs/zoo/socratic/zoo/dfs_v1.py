@@ -15,8 +15,11 @@ from socratic.chat.interface import post_assistant_reply
 from socratic.chat.schemas import Message
 from socratic.chat.schemas import MessageFormatter
 from socratic.chat.utils.base_prompts import BasePrompts
+from socratic.chat.utils.model_routing import FAST_TIER
+from socratic.chat.utils.prompt_registry import compile_chat_prompt
 from socratic.chat.utils.socratic_chat_openai import SocraticChatModel
 from socratic.chat.workflow import wprint
+from socratic.chat.workflow_cache import workflow_cache_from_env
 
 
 class DFSV1Prompts(BasePrompts):
@@ -26,6 +29,8 @@ class DFSV1Prompts(BasePrompts):
     current_group_termination_format: str
 
     background: Optional[str] = None
+    # Token budget of the history in transition prompts. Older messages are clipped or elided.
+    transition_history_max_tokens: Optional[int] = 1500
 
     class CurrentGroupGoals(BaseModel):
         initial: str
@@ -43,18 +48,20 @@ class DFSV1Prompts(BasePrompts):
     start_challenge: str
     end: str
 
-    def with_persona_prompt(self, human_prompt: str) -> ChatPromptTemplate:
-        """Returns an assembled prompt, with persona already prepended."""
-        base_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", self.persona),
-                ("human", human_prompt),
-            ]
+    def with_persona_prompt(self, human_prompt: str, **partials: str) -> ChatPromptTemplate:
+        """
+        Returns an assembled prompt, with persona already prepended and partials applied.
+
+        Prompts are compiled once per prompt set and background, and shared afterwards.
+        """
+        background = ""
+        if self.background is not None:
+            background = f"Here is some background info for the conversation:\n{self.background}"
+        return compile_chat_prompt(
+            [("system", self.persona), ("human", human_prompt)],
+            persona_background=background,
+            **partials,
         )
-        if self.background is None:
-            return base_prompt.partial(persona_background="")
-        background = f"Here is some background info for the conversation:\n{self.background}"
-        return base_prompt.partial(persona_background=background)
 
 
 model = ConversationModel[DFSV1Prompts]("dfs_v1", lambda: DFSV1Prompts.load_prompt(__file__))
@@ -80,7 +87,12 @@ class StringResponse(BaseModel):
     result: str
 
 
-@model.chain
+def _config_version() -> str:
+    # Prompts, including the background, are part of the config of each conversation.
+    return model.config.model_dump_json()
+
+
+@model.chain(cache=workflow_cache_from_env(version=_config_version))
 async def make_question(topic: str) -> str:
     """Generates a question on the given topic."""
     prompt = model.config.with_persona_prompt(model.config.ask_question)
@@ -92,7 +104,9 @@ async def start_direction(direction: str, history: List[Message]) -> str:
     """Transition to the given direction."""
     prompt = model.config.with_persona_prompt(model.config.start_direction)
     return await chat_model.gen_string(
-        prompt, history=format_messages(history), direction=direction
+        prompt,
+        history=format_messages(history, max_tokens=model.config.transition_history_max_tokens),
+        direction=direction,
     )
 
 
@@ -101,7 +115,9 @@ async def start_challenge(challenge: str, history: List[Message]) -> str:
     """Transition to the given challenge."""
     prompt = model.config.with_persona_prompt(model.config.start_challenge)
     return await chat_model.gen_string(
-        prompt, history=format_messages(history), challenge=challenge
+        prompt,
+        history=format_messages(history, max_tokens=model.config.transition_history_max_tokens),
+        challenge=challenge,
     )
 
 
@@ -116,8 +132,10 @@ class ChallengeGenerationResult(BaseModel):
 @model.chain
 async def generate_directions(history: List[Message], summary: str) -> List[str]:
     """Generates directions."""
-    prompt_base = model.config.with_persona_prompt(model.config.direction_generation)
-    prompt = prompt_base.partial(format_instructions=model.config.direction_generation_format)
+    prompt = model.config.with_persona_prompt(
+        model.config.direction_generation,
+        format_instructions=model.config.direction_generation_format,
+    )
     result = await chat_model.gen_json(
         prompt,
         DirectionGenerationResult,
@@ -130,8 +148,10 @@ async def generate_directions(history: List[Message], summary: str) -> List[str]
 @model.chain
 async def generate_challenges(history: List[Message], summary: str) -> List[str]:
     """Generates challenges."""
-    prompt_base = model.config.with_persona_prompt(model.config.challenge_generation)
-    prompt = prompt_base.partial(format_instructions=model.config.challenge_generation_format)
+    prompt = model.config.with_persona_prompt(
+        model.config.challenge_generation,
+        format_instructions=model.config.challenge_generation_format,
+    )
     result = await chat_model.gen_json(
         prompt,
         ChallengeGenerationResult,
@@ -155,13 +175,15 @@ class CurrentGroupTerminationResponse(BaseModel):
     not_achieved_reply: Optional[str] = None
 
 
-@model.chain
+@model.chain(tier=FAST_TIER)
 async def try_terminate_current_group(
     topic: str, current_group: List[Message], goal: str
 ) -> CurrentGroupTerminationResponse:
     """Determines if the current group can be terminated."""
-    prompt_base = model.config.with_persona_prompt(model.config.current_group_termination)
-    prompt = prompt_base.partial(format_instructions=model.config.current_group_termination_format)
+    prompt = model.config.with_persona_prompt(
+        model.config.current_group_termination,
+        format_instructions=model.config.current_group_termination_format,
+    )
     return await chat_model.gen_json(
         prompt,
         CurrentGroupTerminationResponse,
@@ -201,28 +223,37 @@ async def terminate_current_group(
 
 @model.chain
 async def evaluate(history: List[Message]) -> str:
-    """Evaluate the whole conversation."""
+    """Evaluate the whole conversation, posting the evaluation as it streams."""
     prompt = model.config.with_persona_prompt(model.config.end)
-    return await chat_model.gen_string(prompt, history=format_messages(history))
+    # Recorded whole, so replays return it without posting it again, like any recorded reply.
+    return await post_assistant_reply(
+        chat_model.stream_string(prompt, history=format_messages(history))
+    )
 
 
-async def _process_direction(direction: str, messages: list[Message]):
+@model.checkpoint
+async def _process_direction(direction: str, messages: List[Message]) -> List[Message]:
+    """Processes the given direction and its challenges. Returns the new messages."""
     wprint(f"To start direction: {direction}\n")
     direction_initial = await start_direction(history=messages, direction=direction)
     direction_group, direction_summary = await terminate_current_group(
         direction_initial, direction, model.config.current_group_goals.direction
     )
-    messages.extend(direction_group)
+    new_messages: List[Message] = list(direction_group)
 
     challenges = await generate_challenges(history=direction_group, summary=direction_summary)
     for challenge in challenges:
         wprint(f"To start challenge: {challenge}\n")
 
-        challenge_initial = await start_challenge(history=messages, challenge=challenge)
+        challenge_initial = await start_challenge(
+            history=messages + new_messages, challenge=challenge
+        )
         challenge_group, _ = await terminate_current_group(
             challenge_initial, challenge, model.config.current_group_goals.challenge
         )
-        messages.extend(challenge_group)
+        new_messages.extend(challenge_group)
+
+    return new_messages
 
 
 @model.entry
@@ -243,10 +274,9 @@ async def entry(
 
     directions = await generate_directions(history=initial_group, summary=initial_summary)
     for direction in directions:
-        await _process_direction(direction, messages)
+        messages.extend(await _process_direction(direction, messages))
 
-    evaluation = await evaluate(messages)
-    await post_assistant_reply(evaluation)
+    await evaluate(messages)
 
 
 if __name__ == "__main__":
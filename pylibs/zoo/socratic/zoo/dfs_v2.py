@@ -3,22 +3,27 @@
 # pylint: disable=missing-class-docstring
 import json
 from enum import Enum
+from typing import Awaitable
 from typing import List
 from typing import Optional
 
-from langchain.prompts import ChatPromptTemplate
 from pydantic import BaseModel
 from pydantic import model_validator
 
 from socratic.chat.conversation_model import ConversationModel
 from socratic.chat.entry import main
+from socratic.chat.generation_scope import gather
 from socratic.chat.interface import get_user_reply
 from socratic.chat.interface import post_assistant_reply
 from socratic.chat.schemas import Message
 from socratic.chat.schemas import MessageFormatter
 from socratic.chat.utils.base_prompts import BasePrompts
+from socratic.chat.utils.model_routing import FAST_TIER
+from socratic.chat.utils.render_cache import JSONListSerializer
+from socratic.chat.utils.prompt_registry import compile_chat_prompt
 from socratic.chat.utils.socratic_chat_openai import SocraticChatModel
 from socratic.chat.workflow import wprint
+from socratic.chat.workflow_cache import workflow_cache_from_env
 
 
 class DFSV2Prompts(BasePrompts):
@@ -33,6 +38,8 @@ class DFSV2Prompts(BasePrompts):
 prompts = DFSV2Prompts.load_prompt(__file__)
 model = ConversationModel[None]("dfs_v2", lambda: None)
 format_messages = MessageFormatter(human_name="Candidate", assistant_name="Interviewer")
+# Previous segments grow by one on every segment, and are serialized on every turn of it.
+serialize_segments = JSONListSerializer()
 chat_model = SocraticChatModel()
 
 
@@ -102,15 +109,10 @@ class MakePlanResult(BaseModel):
     question: str
 
 
-@model.chain
+@model.chain(cache=workflow_cache_from_env(version=prompts.model_dump_json()))
 async def make_plan(topic: str) -> MakePlanResult:
     """Creates the initial plan."""
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompts.persona),
-            ("human", prompts.make_plan),
-        ]
-    )
+    prompt = compile_chat_prompt([("system", prompts.persona), ("human", prompts.make_plan)])
     result = await chat_model.gen_json(prompt, MakePlanResult, topic=topic)
     assert [x.segment for x in result.plan] == list(SegmentID)
     return result
@@ -137,12 +139,7 @@ async def update_plan(
     last_segment: SegmentResult, chat_history: List[Message], previous_plan: List[SegmentPlan]
 ) -> PlanUpdate:
     """Updates the plan if needed."""
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompts.persona),
-            ("human", prompts.update_plan),
-        ]
-    )
+    prompt = compile_chat_prompt([("system", prompts.persona), ("human", prompts.update_plan)])
     result = await chat_model.gen_json(
         prompt,
         PlanUpdate,
@@ -178,25 +175,22 @@ class SegmentTermination(BaseModel):
         return self
 
 
-@model.chain
+@model.chain(tier=FAST_TIER)
 async def terminate_segment(
     segment_plan: SegmentPlan,
     chat_history: List[Message],
     previous_segments: List[SegmentResult],
 ) -> SegmentTermination:
     """Determines if the current segment can be terminated."""
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompts.persona),
-            ("human", prompts.segment_termination),
-        ]
+    prompt = compile_chat_prompt(
+        [("system", prompts.persona), ("human", prompts.segment_termination)]
     )
     return await chat_model.gen_json(
         prompt,
         SegmentTermination,
         segment_plan=segment_plan.model_dump_json(),
         chat_history=format_messages(chat_history),
-        previous_segments=json.dumps([item.model_dump() for item in previous_segments]),
+        previous_segments=serialize_segments(previous_segments),
     )
 
 
@@ -207,12 +201,7 @@ async def per_skill(
     filtered_history: List[List[Message]],
 ) -> SkillResult:
     """Evaluation per skill."""
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompts.persona),
-            ("human", prompts.per_skill),
-        ]
-    )
+    prompt = compile_chat_prompt([("system", prompts.persona), ("human", prompts.per_skill)])
 
     combined: List[str] = []
     for i, segment in enumerate(filtered_segments):
@@ -234,12 +223,7 @@ class EndResult(BaseModel):
 @model.chain
 async def end(evaluations_by_skill: List[SkillResult]) -> EndResult:
     """Final evaluation."""
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompts.persona),
-            ("human", prompts.end),
-        ]
-    )
+    prompt = compile_chat_prompt([("system", prompts.persona), ("human", prompts.end)])
     return await chat_model.gen_json(
         prompt,
         EndResult,
@@ -247,9 +231,15 @@ async def end(evaluations_by_skill: List[SkillResult]) -> EndResult:
     )
 
 
+class SegmentOutcome(BaseModel):
+    history: List[Message]
+    result: SegmentResult
+
+
+@model.checkpoint
 async def loop_segment(
     segment_plan: SegmentPlan, initial_question: str, previous_segments: List[SegmentResult]
-) -> List[Message]:
+) -> SegmentOutcome:
     """Finish the current segment."""
     history: List[Message] = [Message(is_assistant=True, message=initial_question)]
     while True:
@@ -264,14 +254,13 @@ async def loop_segment(
             continue
 
         assert result.result is not None
-        previous_segments.append(result.result)
-        return history
+        return SegmentOutcome(history=history, result=result.result)
 
 
 async def _make_final_result(
     segments: List[SegmentResult], segmented_history: List[List[Message]]
 ) -> EndResult:
-    evaluations_by_skill: List[SkillResult] = []
+    evaluations: list[Awaitable[SkillResult]] = []
     for skill in Skill:
         filtered_segments: List[SegmentResult] = []
         filtered_history: List[List[Message]] = []
@@ -280,9 +269,11 @@ async def _make_final_result(
                 continue
             filtered_segments.append(segment)
             filtered_history.append(segmented_history[i])
-        evaluation_per_skill = await per_skill(skill, filtered_segments, filtered_history)
-        evaluations_by_skill.append(evaluation_per_skill)
+        evaluations.append(per_skill(skill, filtered_segments, filtered_history))
 
+    # Skills are evaluated independently, so they can run concurrently.
+    evaluations_by_skill: List[SkillResult] = await gather(*evaluations)
+    for evaluation_per_skill in evaluations_by_skill:
         wprint(evaluation_per_skill.model_dump_json(indent=2))
 
     return await end(evaluations_by_skill)
@@ -310,8 +301,9 @@ async def entry():
             if updated_plan.updated_plan is not None:
                 plan[i:] = updated_plan.updated_plan
 
-        local_history = await loop_segment(plan[i], question, segments)
-        segmented_history.append(local_history)
+        outcome = await loop_segment(plan[i], question, segments)
+        segments.append(outcome.result)
+        segmented_history.append(outcome.history)
 
     final_result = await _make_final_result(segments, segmented_history)
     wprint(final_result.evaluation)
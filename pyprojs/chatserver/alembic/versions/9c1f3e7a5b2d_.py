@@ -0,0 +1,65 @@
+"""nest workflow_results per generation scope
+
+Revision ID: 9c1f3e7a5b2d
+Revises: 4357869ceb77
+Create Date: 2026-10-16 10:12:41.203117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from socratic.chat.workflow_results import migrate_legacy_workflow_results
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1f3e7a5b2d'
+down_revision: Union[str, None] = '4357869ceb77'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+conversation_message = sa.table(
+    'conversation_message',
+    sa.column('id', sa.UUID()),
+    sa.column('workflow_results', postgresql.JSON()),
+)
+
+
+def _flatten(nested: dict) -> dict:
+    return {
+        f'{scope_id}/{call_path}': value
+        for scope_id, results in nested.items()
+        for call_path, value in results.items()
+    }
+
+
+def _is_flat(workflow_results: dict) -> bool:
+    return any('/' in key for key in workflow_results)
+
+
+def _rewrite(convert, should_convert) -> None:
+    connection = op.get_bind()
+    # Streams the rows instead of loading every message at once.
+    rows = connection.execute(
+        sa.select(conversation_message.c.id, conversation_message.c.workflow_results)
+        .execution_options(yield_per=500)
+    )
+    for message_id, workflow_results in rows:
+        if not workflow_results or not should_convert(workflow_results):
+            continue
+        connection.execute(
+            conversation_message.update()
+            .where(conversation_message.c.id == message_id)
+            .values(workflow_results=convert(workflow_results))
+        )
+
+
+def upgrade() -> None:
+    _rewrite(migrate_legacy_workflow_results, _is_flat)
+
+
+def downgrade() -> None:
+    _rewrite(_flatten, lambda workflow_results: not _is_flat(workflow_results))
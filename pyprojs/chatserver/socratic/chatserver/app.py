@@ -1,11 +1,15 @@
 """FastAPI app."""
 
+import asyncio
 from dataclasses import dataclass
 import json
 import os
 from time import time
 from typing import Annotated
 from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
 from typing import Optional
 from uuid import UUID
 from uuid import uuid4
@@ -13,16 +17,27 @@ from uuid import uuid4
 from fastapi import Depends
 from fastapi import FastAPI
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.security import HTTPBearer
 from lru import LRU
 from pydantic import BaseModel
 from starlette.middleware.cors import CORSMiddleware
 
+from socratic.chat import StepEvent
 from socratic.chat import StepExecutor
 from socratic.chat.conversation_model import ConversationModel
+from socratic.chat.event_sink import configure_event_logging_from_env
 from socratic.chat.schemas import Message
-from socratic.chatserver.storage import get_repository, ConversationForest, MessagePack
+from socratic.chat.utils.model_routing import get_model_router
+from socratic.chat.utils.openai_client import get_openai_client_pool
+from socratic.chat.utils.rate_limiter import get_rate_limiter
+from socratic.chat.utils.single_flight import SingleFlight
+from socratic.chat.utils.socratic_chat_openai import llm_single_flight
+from socratic.chat.workflow_results import WorkflowResults
+from socratic.chatserver.executor_pool import ExecutorPool
+from socratic.chatserver.storage import get_repository, open_repository
+from socratic.chatserver.storage import ConversationForest, MessagePack, Repository
 from socratic.zoo import dfs_v1
 from socratic.zoo import dfs_v2
 
@@ -42,9 +57,11 @@ TOKEN = os.environ.get("SOCRATIC_CHATSERVER_TOKEN", None)
 if not TOKEN:
     raise RuntimeError("SOCRATIC_CHATSERVER_TOKEN environment variable must be set.")
 
-if not os.environ.get("OPENAI_API_KEY", None):
+if not os.environ.get("OPENAI_API_KEY", None) and os.environ.get("SOCRATIC_LLM_BACKEND") != "fake":
     raise RuntimeError("OPENAI_API_KEY environment variable must be set.")
 
+event_logger = configure_event_logging_from_env()
+
 
 def check_token(credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)]):
     """
@@ -99,35 +116,133 @@ class CreateConversationResponse(BaseModel):
 
 
 initial_message_memo = LRU(20)
+# Concurrent requests for an opening message not memoized yet share a single generation.
+initial_message_flight = SingleFlight[MessagePack]()
 
+executor_pool = ExecutorPool(
+    max_size=int(os.environ.get("SOCRATIC_EXECUTOR_POOL_SIZE", "100")),
+    max_idle_seconds=float(os.environ.get("SOCRATIC_EXECUTOR_IDLE_SECONDS", "600")),
+)
 
-@app.post("/new", dependencies=[Depends(check_token)])
-async def create_conversation(
-    request: CreateConversationRequest, repo=Depends(get_repository)
-) -> CreateConversationResponse:
+
+async def _stream_step(
+    executor: StepExecutor, input_params: dict[str, Any]
+) -> AsyncIterator[StepEvent]:
+    """Streams one step, and parks the executor in the pool if the conversation goes on."""
+    message_id = executor.next_scope_id
+    try:
+        async for event in executor.stream_events(**input_params):
+            yield event
+    except BaseException:
+        executor.close()
+        raise
+    executor_pool.put(message_id, executor)
+
+
+async def _run_step(executor: StepExecutor, input_params: dict[str, Any]):
+    """Runs one step, and parks the executor in the pool if the conversation goes on."""
+    async for _ in _stream_step(executor, input_params):
+        pass
+
+
+def _format_server_sent_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _format_step_event(event: StepEvent) -> str:
+    if event.kind == "chunk":
+        return _format_server_sent_event("chunk", {"text": event.data})
+    return _format_server_sent_event("progress", {"workflow": event.data})
+
+
+def _server_sent_events(events: AsyncIterator[str]) -> StreamingResponse:
     """
-    Create a new conversation.
+    Streams a step as server-sent events:
+
+    - "progress", with {"workflow": name}, whenever a workflow completes.
+    - "chunk", with {"text": chunk}, for every chunk of the assistant reply.
+    - "done", with the same response as the blocking endpoint, once the reply is persisted.
+    - "error", with {"detail": message}, if the step fails.
     """
-    model, input_params = _resolve_request(request)
 
+    async def wrapper() -> AsyncIterator[str]:
+        try:
+            async for event in events:
+                yield event
+        except Exception:
+            yield _format_server_sent_event("error", {"detail": "Internal Server Error"})
+            raise
+
+    return StreamingResponse(
+        wrapper(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _initial_message_memo_key(model: ConversationModel[Any], input_params: dict[str, Any]) -> str:
+    return f"{model}:{json.dumps(input_params)}"
+
+
+def _memoize_initial_message(
+    cache_key: str, message_id: UUID, executor: StepExecutor
+) -> MessagePack:
+    initial_message = MessagePack(
+        message_id,
+        time(),
+        Message(is_assistant=True, message=executor.chat_history[-1]),
+        executor.workflow_results.dump(),
+        False,
+    )
+    initial_message_memo[cache_key] = initial_message
+    return initial_message
+
+
+async def _create_initial_message(
+    model: ConversationModel[Any],
+    input_params: dict[str, Any],
+    cache_key: str,
+    on_event: Callable[[StepEvent], None],
+) -> MessagePack:
+    executor = StepExecutor(model, [], [], {}, keep_alive=True)
+    initial_message_id = executor.next_scope_id
+    async for event in _stream_step(executor, input_params):
+        on_event(event)
+    return _memoize_initial_message(cache_key, initial_message_id, executor)
+
+
+async def _get_initial_message(
+    model: ConversationModel[Any],
+    input_params: dict[str, Any],
+    on_event: Callable[[StepEvent], None] = lambda _: None,
+) -> tuple[MessagePack, bool]:
+    """
+    Returns the opening message, and whether it was generated for this request. Events are only
+    passed to `on_event` when it is.
+    """
     # Re-use the same opening message for the same input parameters to save cost.
-    cache_key = f"{model}:{json.dumps(input_params)}"
+    cache_key = _initial_message_memo_key(model, input_params)
     if cache_key in initial_message_memo:
-        initial_message = initial_message_memo[cache_key].copy()
-    else:
-        executor = StepExecutor(model, [], [], {})
-        initial_message_id = executor.next_scope_id
-        assistant_reply = await executor.run(**input_params)
-        initial_message = MessagePack(
-            initial_message_id,
-            time(),
-            Message(is_assistant=True, message=assistant_reply),
-            executor.workflow_results.copy(),
-            False,
-        )
-        initial_message_memo[cache_key] = initial_message
+        return initial_message_memo[cache_key].copy(), False
+
+    generated = False
+
+    def create() -> Awaitable[MessagePack]:
+        nonlocal generated
+        generated = True
+        return _create_initial_message(model, input_params, cache_key, on_event)
+
+    initial_message = await initial_message_flight.run(cache_key, create)
+    if not generated:
+        # The message id doubles as the id of the pooled executor, which only one may take.
+        return initial_message.copy(), False
+    return initial_message, True
+
 
-    forest = ConversationForest(request.name, input_params)
+def _add_conversation(
+    repo: Repository, request: CreateConversationRequest, initial_message: MessagePack
+) -> CreateConversationResponse:
+    forest = ConversationForest(request.name, request.request)
     repo.add_forest(forest)
     repo.add_message(forest.id, initial_message)
 
@@ -138,6 +253,46 @@ async def create_conversation(
     )
 
 
+@app.post("/new", dependencies=[Depends(check_token)])
+async def create_conversation(
+    request: CreateConversationRequest, repo=Depends(get_repository)
+) -> CreateConversationResponse:
+    """
+    Create a new conversation.
+    """
+    model, input_params = _resolve_request(request)
+    initial_message, _ = await _get_initial_message(model, input_params)
+    return _add_conversation(repo, request, initial_message)
+
+
+@app.post("/new/stream", dependencies=[Depends(check_token)])
+async def create_conversation_stream(request: CreateConversationRequest) -> StreamingResponse:
+    """
+    Create a new conversation, streaming the opening message as server-sent events.
+    """
+    model, input_params = _resolve_request(request)
+
+    async def events() -> AsyncIterator[str]:
+        queue = asyncio.Queue[Optional[StepEvent]]()
+        task = asyncio.ensure_future(_get_initial_message(model, input_params, queue.put_nowait))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (event := await queue.get()) is not None:
+                yield _format_step_event(event)
+            initial_message, generated = await task
+        finally:
+            task.cancel()
+        if not generated:
+            text = initial_message.message.message
+            yield _format_server_sent_event("chunk", {"text": text})
+
+        with open_repository() as repo:
+            response = _add_conversation(repo, request, initial_message)
+        yield _format_server_sent_event("done", response.model_dump(mode="json"))
+
+    return _server_sent_events(events())
+
+
 class ReplyConversationRequest(BaseModel):
     """
     Request for a user reply to a conversation.
@@ -157,13 +312,16 @@ class ReplyConversationResponse(BaseModel):
     message: str
 
 
-@app.post("/reply", dependencies=[Depends(check_token)])
-async def reply_conversation(
-    request: ReplyConversationRequest, repo=Depends(get_repository)
-) -> ReplyConversationResponse:
-    """
-    Add a user reply to a conversation.
-    """
+@dataclass
+class _PendingReply:
+    forest: ConversationForest
+    parent: MessagePack
+    executor: StepExecutor
+    message_id: UUID
+
+
+def _prepare_reply(request: ReplyConversationRequest, repo: Repository) -> _PendingReply:
+    """Persists the user reply, and returns an executor ready to run the next step."""
     forest = repo.forest_with_id(request.conversation_id)
     model = _resolve_model(forest.name)
     messages = forest.message_list_with_id(request.message_id)
@@ -174,38 +332,95 @@ async def reply_conversation(
     if parent.is_done:
         raise HTTPException(status_code=400, detail="Cannot reply to a complete conversation.")
 
+    executor = executor_pool.take(parent.id)
+
     parent = MessagePack(
         uuid4(), time(), Message(is_assistant=False, message=request.message), {}, False, parent.id
     )
     messages.append(parent)
     repo.add_message(forest.id, parent)
 
-    scope_ids = [x.id for x in messages if x.message.is_assistant]
-    chat_history = [x.message.message for x in messages]
-    workflow_results: dict[str, Any] = {}
-    for message in messages:
-        if not message.message.is_assistant:
-            continue
-        for k, v in message.workflow_results.items():
-            workflow_results[k] = v
-
-    executor = StepExecutor(
-        model, scope_ids=scope_ids, chat_history=chat_history, workflow_results=workflow_results
-    )
-    next_scope_id = executor.next_scope_id
-    await executor.run(**forest.input_params)
+    if executor is not None:
+        executor.chat_history.append(request.message)
+    else:
+        scope_ids = [x.id for x in messages if x.message.is_assistant]
+        chat_history = [x.message.message for x in messages]
+        workflow_results = WorkflowResults()
+        for message in messages:
+            if message.message.is_assistant:
+                workflow_results.load(message.workflow_results)
+
+        executor = StepExecutor(
+            model,
+            scope_ids=scope_ids,
+            chat_history=chat_history,
+            workflow_results=workflow_results,
+            keep_alive=True,
+        )
+    return _PendingReply(forest, parent, executor, executor.next_scope_id)
 
-    new_workflow_results = {
-        k: v for k, v in executor.workflow_results.items() if k.startswith(str(next_scope_id))
-    }
 
+def _add_assistant_reply(repo: Repository, pending: _PendingReply) -> ReplyConversationResponse:
+    executor = pending.executor
     message_pack = MessagePack(
-        next_scope_id,
+        pending.message_id,
         time(),
         Message(is_assistant=True, message=executor.chat_history[-1]),
-        new_workflow_results,
+        executor.new_workflow_results.dump(),
         executor.has_ended,
-        parent.id,
+        pending.parent.id,
     )
-    repo.add_message(forest.id, message_pack)
+    repo.add_message(pending.forest.id, message_pack)
     return ReplyConversationResponse(id=message_pack.id, message=message_pack.message.message)
+
+
+@app.post("/reply", dependencies=[Depends(check_token)])
+async def reply_conversation(
+    request: ReplyConversationRequest, repo=Depends(get_repository)
+) -> ReplyConversationResponse:
+    """
+    Add a user reply to a conversation.
+    """
+    pending = _prepare_reply(request, repo)
+    await _run_step(pending.executor, pending.forest.input_params)
+    return _add_assistant_reply(repo, pending)
+
+
+@app.post("/reply/stream", dependencies=[Depends(check_token)])
+async def reply_conversation_stream(
+    request: ReplyConversationRequest, repo=Depends(get_repository)
+) -> StreamingResponse:
+    """
+    Add a user reply to a conversation, streaming the assistant reply as server-sent events.
+    """
+    pending = _prepare_reply(request, repo)
+
+    async def events() -> AsyncIterator[str]:
+        async for event in _stream_step(pending.executor, pending.forest.input_params):
+            yield _format_step_event(event)
+        with open_repository() as stream_repo:
+            response = _add_assistant_reply(stream_repo, pending)
+        yield _format_server_sent_event("done", response.model_dump(mode="json"))
+
+    return _server_sent_events(events())
+
+
+@app.get("/stats", dependencies=[Depends(check_token)])
+async def read_stats() -> dict[str, Any]:
+    """
+    Report connection reuse of the shared OpenAI clients, the queue of the LLM rate limiter if
+    any, coalesced calls, the health of each model called, the event logging queue if any, and
+    the number of pooled executors.
+    """
+    rate_limiter = get_rate_limiter()
+    return {
+        "openai_client": get_openai_client_pool().stats.as_dict(),
+        "rate_limiter": None if rate_limiter is None else rate_limiter.stats.as_dict(),
+        "single_flight": {
+            "initial_message": initial_message_flight.as_dict(),
+            "llm": llm_single_flight.as_dict(),
+        },
+        "model_router": get_model_router().as_dict(),
+        "event_logger": None if event_logger is None else event_logger.stats.as_dict(),
+        "executor_pool_size": len(executor_pool),
+    }
@@ -0,0 +1,70 @@
+"""Provides a per-process pool of live executors."""
+
+from time import monotonic
+from typing import Optional
+from uuid import UUID
+
+from lru import LRU
+
+from socratic.chat import StepExecutor
+
+
+class ExecutorPool:
+    """
+    Keeps parked executors alive, keyed by the id of the assistant message they last posted.
+
+    A reply to that message resumes the executor directly instead of replaying the whole
+    conversation. The pool is bounded both in size and in idle time. Evicting an executor is
+    always safe: its results are persisted with every message, so a miss simply falls back to a
+    replay.
+    """
+
+    max_idle_seconds: float
+
+    _executors: LRU
+
+    def __init__(self, max_size: int, max_idle_seconds: float):
+        self.max_idle_seconds = max_idle_seconds
+        self._executors = LRU(max_size, callback=self._on_evict)
+
+    def __len__(self) -> int:
+        return len(self._executors)
+
+    def take(self, message_id: UUID) -> Optional[StepExecutor]:
+        """
+        Removes and returns the executor parked on the given message, if any.
+
+        The executor is removed so that concurrent replies to the same message cannot share it.
+        """
+        self._evict_idle()
+        entry = self._executors.pop(message_id, None)
+        if entry is None:
+            return None
+        executor, _ = entry
+        return executor
+
+    def put(self, message_id: UUID, executor: StepExecutor):
+        """
+        Parks an executor on the given message. Executors which are not parked are discarded.
+        """
+        self._evict_idle()
+        if not executor.is_parked:
+            return
+        self._executors[message_id] = (executor, monotonic())
+
+    def _evict_idle(self):
+        deadline = monotonic() - self.max_idle_seconds
+        while True:
+            item = self._executors.peek_last_item()
+            if item is None:
+                return
+            message_id, (executor, last_used) = item
+            if last_used > deadline:
+                return
+            del self._executors[message_id]
+            executor.close()
+
+    @staticmethod
+    def _on_evict(_message_id: UUID, entry: tuple[StepExecutor, float]):
+        executor, _ = entry
+        executor.close()
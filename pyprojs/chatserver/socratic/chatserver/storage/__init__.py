@@ -1,4 +1,6 @@
 import os
+from contextlib import contextmanager
+from typing import Iterator
 
 from socratic.chatserver.storage.base import ConversationForest, MessagePack, Repository
 from socratic.chatserver.storage.memory import InMemoryRepository
@@ -8,15 +10,23 @@ from socratic.chatserver.storage.postgres import setup_postgres, PostgresReposit
 memory_repo = InMemoryRepository()
 
 
-def get_repository() -> Repository:
+@contextmanager
+def open_repository() -> Iterator[Repository]:
     db_connection_url = os.getenv("SQLALCHEMY_DATABASE_URI")
     if db_connection_url:
+        setup_postgres(db_connection_url)
+        repo = PostgresRepository()
         try:
-            setup_postgres(db_connection_url)
-            repo = PostgresRepository()
             yield repo
         finally:
             repo.close()
         return
 
     yield memory_repo
+
+
+def get_repository() -> Iterator[Repository]:
+    # The repository is closed before a streaming response is sent. Streaming endpoints must
+    # use open_repository instead.
+    with open_repository() as repo:
+        yield repo
@@ -10,16 +10,23 @@ class MessagePack:
     id: UUID
     timestamp: float
     message: Message
-    workflow_results: dict[str, Any]
+    # Results recorded by this message, nested per generation scope. See WorkflowResults.
+    workflow_results: dict[str, dict[str, Any]]
     is_done: bool
     parent_id: Optional[UUID] = None
 
     def copy(self):
+        # The message id doubles as its generation scope id, so its own results move along.
+        new_id = uuid4()
+        workflow_results = {
+            str(new_id) if scope_id == str(self.id) else scope_id: results.copy()
+            for scope_id, results in self.workflow_results.items()
+        }
         return MessagePack(
-            uuid4(),
+            new_id,
             self.timestamp,
             self.message,
-            self.workflow_results.copy(),
+            workflow_results,
             self.is_done,
             self.parent_id,
         )